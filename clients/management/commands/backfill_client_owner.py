@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from django.db import transaction
 
 from clients.models import Client
+from progress.counters import recompute
 
 
 class Command(BaseCommand):
@@ -50,11 +51,15 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("Dry run only. No changes written."))
             return
 
+        previous_owners = set(qs.exclude(user__isnull=True).values_list("user_id", flat=True).distinct())
         updated = 0
         with transaction.atomic():
             for start in range(0, total, batch_size):
                 chunk = qs.order_by("id")[start:start + batch_size]
                 updated += chunk.update(user=user)
+            # QuerySet.update() sends no signals; refresh the progress counters it invalidated
+            for uid in previous_owners | {user.id}:
+                recompute(uid)
 
         self.stdout.write(self.style.SUCCESS(f"Updated {updated} client(s)."))
 
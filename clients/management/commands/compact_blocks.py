@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from clients.models import BlockItem, ClientBlock
+from clients.services.item_store import collect_refs, compact_block, expand_instances, store_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Move ClientBlock item payloads into the content-addressed BlockItem store (or back with --expand). "
+        "Use --prune to delete store items no block references any more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="Only process blocks of clients owned by this user id")
+        parser.add_argument("--expand", action="store_true", help="Inline items again (undo compaction)")
+        parser.add_argument("--prune", action="store_true", help="Delete unreferenced BlockItem rows afterwards")
+        parser.add_argument("--batch-size", type=int, default=200, help="Blocks per batch")
+        parser.add_argument("--dry-run", action="store_true", help="Report counts without writing")
+
+    def handle(self, *args, **options):
+        batch_size = int(options["batch_size"])
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+        qs = ClientBlock.objects.only("id", "block").order_by("id")
+        if options.get("user_id") is not None:
+            qs = qs.filter(client__user_id=options["user_id"])
+
+        total = qs.count()
+        self.stdout.write(f"{'Expanding' if options['expand'] else 'Compacting'} {total} block(s)")
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run only. No changes written."))
+            return
+
+        changed = 0
+        batch = []
+        for cb in qs.iterator(chunk_size=batch_size):
+            batch.append(cb)
+            if len(batch) >= batch_size:
+                changed += self._process(batch, options["expand"])
+                batch = []
+        if batch:
+            changed += self._process(batch, options["expand"])
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {changed} block(s)."))
+
+        if options["prune"]:
+            deleted = self._prune(batch_size)
+            self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} unreferenced item(s)."))
+
+    def _prune(self, batch_size: int) -> int:
+        # References live inside the block JSON, so SQL can't join them; scan once, then walk the
+        # store by primary key and delete at most batch_size digests per statement.
+        started = timezone.now()
+        live = set()
+        for data in ClientBlock.objects.values_list("block", flat=True).iterator(chunk_size=batch_size):
+            live |= collect_refs(data)
+
+        # Items stored after the scan began may belong to a block saved meanwhile: leave them for next run
+        store = BlockItem.objects.filter(created_at__lt=started).order_by("digest")
+        deleted = 0
+        last = ""
+        while True:
+            digests = list(store.filter(digest__gt=last).values_list("digest", flat=True)[:batch_size])
+            if not digests:
+                return deleted
+            last = digests[-1]
+            orphans = set(digests) - live
+            if not orphans:
+                continue
+            with transaction.atomic():
+                # A block saved since the scan can point at an existing item again: re-check those
+                for data in ClientBlock.objects.filter(updated_at__gte=started).values_list("block", flat=True):
+                    live |= collect_refs(data)
+                orphans -= live
+                if orphans:
+                    deleted += BlockItem.objects.filter(digest__in=orphans).delete()[0]
+
+    def _process(self, blocks, expand: bool) -> int:
+        dirty = []
+        items = {}
+        if expand:
+            expand_instances(blocks)
+        for cb in blocks:
+            new = cb.expanded_block() if expand else None
+            if not expand:
+                new, found = compact_block(cb.block)
+                items.update(found)
+            if new != cb.block:
+                cb.block = new
+                dirty.append(cb)
+        with transaction.atomic():
+            store_items(items)
+            # bulk_update leaves summary alone: it is computed from the expanded block either way
+            ClientBlock.objects.bulk_update(dirty, ["block"])
+        return len(dirty)
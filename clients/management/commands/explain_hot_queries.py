@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from clients.models import Client, ClientBlock
+from consults.models import Assessment, Consult, Message
+from emails.models import EmailLog
+
+
+def _canonical_queries(user_id, client_id, consult_id):
+    """(label, queryset) pairs mirroring the filters and ordering of the hot views."""
+    return [
+        ("clients list (ClientViewSet)",
+         Client.objects.filter(user_id=user_id).order_by("-created_at")[:50]),
+        ("active clients (ProgressView)",
+         Client.objects.filter(user_id=user_id, archived=False).order_by("-updated_at")[:1]),
+        ("consults list (ConsultViewSet)",
+         Consult.objects.filter(user_id=user_id).order_by("-created_at")[:50]),
+        ("consults by client (?client_id=)",
+         Consult.objects.filter(user_id=user_id, client_id=client_id).order_by("-created_at")[:50]),
+        ("consult messages",
+         Message.objects.filter(consult_id=consult_id).order_by("created_at")[:200]),
+        ("client blocks",
+         ClientBlock.objects.filter(client_id=client_id).order_by("-created_at")[:50]),
+        ("blocks count (ProgressView)",
+         ClientBlock.objects.filter(client__user_id=user_id, client__archived=False)),
+        ("email logs",
+         EmailLog.objects.order_by("-created_at")[:50]),
+        ("email logs by status",
+         EmailLog.objects.filter(status="failed").order_by("-created_at")[:50]),
+        ("assessment by consult",
+         Assessment.objects.filter(consult_id=consult_id)),
+        ("assessments (ProgressView)",
+         Assessment.objects.filter(consult__user_id=user_id).order_by("-created_at")[:1]),
+    ]
+
+
+def classify_plan(plan: str, vendor: str) -> str:
+    """'index' when every table access uses an index, 'partial' when some scan fully, 'none' otherwise."""
+    lines = [ln.strip() for ln in plan.splitlines() if ln.strip()]
+    if vendor == "sqlite":
+        indexed = [ln for ln in lines if "USING" in ln and ("INDEX" in ln or "PRIMARY KEY" in ln)]
+        full = [ln for ln in lines if ln.lstrip("|-` ").startswith("SCAN") and "USING" not in ln]
+    else:
+        indexed = [ln for ln in lines if "Index" in ln]
+        full = [ln for ln in lines if "Seq Scan" in ln]
+    if indexed and not full:
+        return "index"
+    if indexed:
+        return "partial"
+    return "none"
+
+
+def needs_sort(plan: str, vendor: str) -> bool:
+    if vendor == "sqlite":
+        return "TEMP B-TREE FOR ORDER BY" in plan
+    return any(ln.strip().startswith(("Sort", "->  Sort", "Incremental Sort")) or "  Sort  " in ln for ln in plan.splitlines())
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the canonical hot queries (client, consult, message, block, email log and assessment "
+        "lookups) on the configured database and report whether each one is served by an index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="User id to plug into the queries (default: first user)")
+        parser.add_argument("--verbose-plan", action="store_true", help="Print the full plan for every query")
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="PostgreSQL only: SET LOCAL enable_seqscan=off so tiny tables still show whether an index is usable",
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        user_id = options.get("user_id")
+        if user_id is None:
+            user_id = get_user_model().objects.order_by("pk").values_list("pk", flat=True).first() or 0
+        client_id = Client.objects.filter(user_id=user_id).values_list("pk", flat=True).first()
+        consult_id = Consult.objects.filter(user_id=user_id).values_list("pk", flat=True).first() or 0
+        if client_id is None:
+            client_id = "00000000000000000000000000000000"
+
+        self.stdout.write(f"Backend: {vendor}")
+        missing = 0
+        with transaction.atomic():
+            if options["no_seqscan"] and vendor == "postgresql":
+                with connection.cursor() as cur:
+                    cur.execute("SET LOCAL enable_seqscan = off")
+            for label, qs in _canonical_queries(user_id, client_id, consult_id):
+                plan = qs.explain()
+                verdict = classify_plan(plan, vendor)
+                style = {"index": self.style.SUCCESS, "partial": self.style.WARNING}.get(verdict, self.style.ERROR)
+                if verdict != "index":
+                    missing += 1
+                sort = " +sort" if needs_sort(plan, vendor) else ""
+                self.stdout.write(style(f"[{verdict:>7}{sort:6}] {label}"))
+                if options["verbose_plan"] or verdict != "index":
+                    for ln in plan.splitlines():
+                        self.stdout.write(f"                {ln}")
+        if missing:
+            self.stdout.write(self.style.WARNING(f"{missing} query shape(s) not fully index-backed."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All canonical queries use indexes."))
@@ -9,6 +9,7 @@ from django.db import transaction
 from django.utils import timezone
 
 from clients.models import Client
+from progress.counters import recompute
 
 
 def _parse_map(s: str) -> Dict[str, str]:
@@ -152,6 +153,7 @@ class Command(BaseCommand):
 
         to_reassign: Dict[int, int] = {}  # client_id -> user_id
         to_archive: list[int] = []
+        touched_owners: set = set()  # counters to recompute after the bulk updates
 
         # Iterate and classify
         for c in qs.iterator():
@@ -172,14 +174,17 @@ class Command(BaseCommand):
             if (not is_active(c) or (require_contact and no_contact)) and not target_owner_id:
                 if archive_flag:
                     to_archive.append(c.id)
+                    touched_owners.add(c.user_id)
                 continue
 
             if target_owner_id and (owner_null or process_all or (owner_id is not None) or owner_username):
                 # Only reassign if selection criteria matched and we have a target
                 if c.user_id != target_owner_id:
                     to_reassign[c.id] = target_owner_id
+                    touched_owners.update((c.user_id, target_owner_id))
             elif archive_flag:
                 to_archive.append(c.id)
+                touched_owners.add(c.user_id)
 
         self.stdout.write(f"Matched {total} candidates: reassign={len(to_reassign)}, archive={len(to_archive)}")
         if dry:
@@ -207,6 +212,9 @@ class Command(BaseCommand):
                 for start in range(0, len(to_archive), batch_size):
                     ids = to_archive[start:start + batch_size]
                     archived += Client.objects.filter(id__in=ids).update(archived=True)
+            # QuerySet.update() sends no signals; refresh the progress counters it invalidated
+            for uid in touched_owners - {None}:
+                recompute(uid)
 
         self.stdout.write(self.style.SUCCESS(f"Reassigned {updated}, archived {archived}"))
 
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from clients.models import Client
+from clients.services.profile_sync import rebuild_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild normalized ClientProfile rows in bulk. Use after queryset .update() calls, "
+        "which bypass the post_save signals. Unchanged profiles (same fingerprint) are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", type=str, help="Only rebuild clients owned by this username")
+        parser.add_argument("--user-id", type=int, help="Only rebuild clients owned by this user id")
+        parser.add_argument("--client-id", action="append", default=[], help="Client id to rebuild (repeatable)")
+        parser.add_argument("--missing-only", action="store_true", help="Only build clients that have no profile yet")
+        parser.add_argument("--include-archived", action="store_true", help="Also rebuild archived clients")
+        parser.add_argument("--batch-size", type=int, default=500, help="Clients per rebuild batch")
+        parser.add_argument("--dry-run", action="store_true", help="Show how many clients match without writing")
+
+    def handle(self, *args, **options):
+        username = options.get("username")
+        user_id = options.get("user_id")
+        client_ids = options.get("client_id") or []
+        batch_size = int(options.get("batch_size") or 500)
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be positive")
+
+        qs = Client.objects.all()
+        if username:
+            User = get_user_model()
+            try:
+                user_id = User.objects.get(username=username).id
+            except User.DoesNotExist:
+                raise CommandError("User not found")
+        if user_id is not None:
+            qs = qs.filter(user_id=user_id)
+        if client_ids:
+            qs = qs.filter(id__in=client_ids)
+        if not options.get("include_archived"):
+            qs = qs.filter(archived=False)
+        if options.get("missing_only"):
+            qs = qs.filter(profile__isnull=True)
+
+        ids = list(qs.order_by("id").values_list("id", flat=True))
+        if not ids:
+            self.stdout.write(self.style.SUCCESS("No clients to rebuild."))
+            return
+
+        self.stdout.write(f"Rebuilding profiles for {len(ids)} client(s)")
+        if options.get("dry_run"):
+            self.stdout.write(self.style.WARNING("Dry run only. No changes written."))
+            return
+
+        counts = rebuild_profiles(ids, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['created']}, updated {counts['updated']}, unchanged {counts['unchanged']}."
+        ))
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from clients.services.search import fts_enabled, reindex_all
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the SQLite FTS5 client search table (clients_client_fts) from the clients table. "
+        "Needed after queryset .update() calls that change names, email, phone or gym. "
+        "PostgreSQL uses trigram indexes maintained by the database and needs no reindex."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Clients per insert batch")
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write(self.style.WARNING("FTS5 search table not present on this database; nothing to do."))
+            return
+        total = reindex_all(batch_size=int(options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} client(s)."))
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('clients', '0005_client_archived'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientprofile',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
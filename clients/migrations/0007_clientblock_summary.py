@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def backfill_summaries(apps, schema_editor):
+    from clients.services.block_stats import compute_block_summary
+
+    ClientBlock = apps.get_model('clients', 'ClientBlock')
+    batch = []
+    for cb in ClientBlock.objects.only('id', 'block').iterator(chunk_size=500):
+        cb.summary = compute_block_summary(cb.block)
+        batch.append(cb)
+        if len(batch) >= 500:
+            ClientBlock.objects.bulk_update(batch, ['summary'])
+            batch = []
+    if batch:
+        ClientBlock.objects.bulk_update(batch, ['summary'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('clients', '0006_clientprofile_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientblock',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
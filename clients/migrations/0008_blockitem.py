@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_clientblock_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockItem',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
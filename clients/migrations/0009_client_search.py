@@ -0,0 +1,53 @@
+from django.db import migrations
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'preferred_name', 'email', 'phone', 'gym_name')
+
+
+def create_search_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for f in SEARCH_FIELDS:
+            # Matches Django's icontains SQL: UPPER("col"::text) LIKE UPPER(%s)
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS clients_client_{f}_trgm '
+                f'ON clients_client USING gin ((UPPER({f}::text)) gin_trgm_ops)'
+            )
+    elif conn.vendor == 'sqlite':
+        from django.db import OperationalError
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS clients_client_fts USING fts5("
+                "client_id UNINDEXED, body, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains
+            return
+        from clients.services.search import search_body
+        Client = apps.get_model('clients', 'Client')
+        rows = [(c.pk.hex, search_body(c)) for c in Client.objects.only('id', *SEARCH_FIELDS).iterator()]
+        if rows:
+            with conn.cursor() as cur:
+                cur.executemany('INSERT INTO clients_client_fts (client_id, body) VALUES (%s, %s)', rows)
+
+
+def drop_search_indexes(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == 'postgresql':
+        for f in SEARCH_FIELDS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS clients_client_{f}_trgm')
+    elif conn.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS clients_client_fts')
+
+
+class Migration(migrations.Migration):
+    # CREATE EXTENSION / virtual tables are not transactional everywhere
+    atomic = False
+
+    dependencies = [
+        ('clients', '0008_blockitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0009_client_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['user', 'archived', 'created_at'], name='client_user_arch_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientblock',
+            index=models.Index(fields=['client', 'created_at'], name='clientblock_client_created_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_phone_digits_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return  # SQLite indexes the digits in the FTS5 body (migration 0009)
+    from clients.services.search import PHONE_SEPARATORS
+
+    expr = 'phone'
+    for sep in PHONE_SEPARATORS:
+        expr = f"REPLACE({expr}, '{sep}', '')"
+    # Matches Django's icontains SQL over search.phone_digits(): UPPER(<expr>::text) LIKE UPPER(%s)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS clients_client_phone_digits_trgm '
+        f'ON clients_client USING gin ((UPPER(({expr})::text)) gin_trgm_ops)'
+    )
+
+
+def drop_phone_digits_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS clients_client_phone_digits_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_phone_digits_index, drop_phone_digits_index),
+    ]
@@ -70,6 +70,12 @@ class Client(TimeStampedUUIDModel):
     likes_notes = models.TextField(blank=True)
     dislikes_notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # Roster and ProgressView: WHERE user_id = ? [AND archived = ?] ORDER BY created_at DESC
+            models.Index(fields=["user", "archived", "created_at"], name="client_user_arch_created_idx"),
+        ]
+
     def __str__(self):
         return self.preferred_name or f"{self.first_name} {self.last_name}"
 
@@ -99,13 +105,62 @@ class ClientEquipment(TimeStampedUUIDModel):
 class ClientProfile(models.Model):
     client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='profile')
     profile = models.JSONField()  # normalized, generator-ready
+    fingerprint = models.CharField(max_length=64, blank=True)  # sha256 of profile; skips no-op rebuilds
     updated_at = models.DateTimeField(default=timezone.now)
 
 
+class BlockItem(models.Model):
+    """Shared exercise item payload, addressed by the sha256 of its canonical JSON."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return (self.payload or {}).get("name") or self.digest[:12]
+
+
 class ClientBlock(TimeStampedUUIDModel):
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='blocks')
     name = models.CharField(max_length=160, blank=True)
     block = models.JSONField(default=dict, blank=True)
+    summary = models.JSONField(default=dict, blank=True)  # days/items/total_sets/patterns; see refresh_summary()
+
+    class Meta:
+        indexes = [
+            # Block listings: WHERE client_id = ? ORDER BY created_at DESC
+            models.Index(fields=["client", "created_at"], name="clientblock_client_created_idx"),
+        ]
+
+    def set_item_lookup(self, lookup):
+        self._item_lookup = lookup
+
+    def expanded_block(self):
+        """Block JSON with item store references resolved; plain blocks are returned as-is."""
+        # Local import: services import models
+        from .services.item_store import collect_refs, expand_block, load_items
+        refs = collect_refs(self.block)
+        if not refs:
+            return self.block
+        lookup = getattr(self, "_item_lookup", None) or {}
+        missing = refs - lookup.keys()
+        if missing:
+            lookup = {**lookup, **load_items(missing)}
+            self._item_lookup = lookup
+        return expand_block(self.block, lookup)
+
+    def refresh_summary(self):
+        from .services.block_stats import compute_block_summary
+        self.summary = compute_block_summary(self.expanded_block())
+
+    def save(self, *args, **kwargs):
+        from .services.item_store import compact_instances
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "block" in update_fields:
+            self.refresh_summary()
+            compact_instances([self])
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"summary"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name or f"Block {self.id}"
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+
+class CSVTextParser(parsers.BaseParser):
+    """Accept a raw ``text/csv`` request body and hand it to the view as a string."""
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding") or "utf-8"
+        try:
+            return stream.read().decode(encoding)
+        except UnicodeDecodeError:
+            raise ParseError(f"CSV body is not valid {encoding}; save the file as UTF-8 and retry.")
@@ -1,27 +1,50 @@
 # serializers.py
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Client, ClientInjury, ClientPreference, ClientEquipment, ClientBlock
 
 
 class ClientInjurySerializer(serializers.ModelSerializer):
+    # Writable so nested updates can match incoming rows to existing ones
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = ClientInjury
         exclude = ('client',)  # <— don't require client from the request
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
 
 
 class ClientPreferenceSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = ClientPreference
         exclude = ('client',)
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
 
 
 class ClientEquipmentSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = ClientEquipment
         exclude = ('client',)
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+
+# (serializer field / related_name, model)
+NESTED_RELATIONS = (
+    ('injuries', ClientInjury),
+    ('preferences', ClientPreference),
+    ('equipment', ClientEquipment),
+)
+
+
+def new_child(model, client, attrs):
+    """Build an unsaved nested row; client-supplied ids are ignored on insert."""
+    return model(client=client, **{k: v for k, v in attrs.items() if k != 'id'})
 
 
 class ClientSerializer(serializers.ModelSerializer):
@@ -35,21 +58,107 @@ class ClientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', 'updated_at', 'user')
 
     def create(self, validated_data):
-        injuries = validated_data.pop('injuries', [])
-        prefs = validated_data.pop('preferences', [])
-        equip = validated_data.pop('equipment', [])
-        client = Client.objects.create(**validated_data)
-        for i in injuries:
-            ClientInjury.objects.create(client=client, **i)
-        for p in prefs:
-            ClientPreference.objects.create(client=client, **p)
-        for e in equip:
-            ClientEquipment.objects.create(client=client, **e)
+        nested = {name: validated_data.pop(name, []) for name, _ in NESTED_RELATIONS}
+        # One transaction so the deferred profile rebuild sees the nested rows
+        with transaction.atomic():
+            client = Client.objects.create(**validated_data)
+            for name, model in NESTED_RELATIONS:
+                if nested[name]:
+                    model.objects.bulk_create([new_child(model, client, attrs) for attrs in nested[name]])
         return client
 
+    def update(self, instance, validated_data):
+        # Relations omitted from the payload are left untouched; a provided list replaces the set
+        nested = {name: validated_data.pop(name) for name, _ in NESTED_RELATIONS if name in validated_data}
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            for name, model in NESTED_RELATIONS:
+                if name in nested:
+                    self._sync_children(instance, name, model, nested[name])
+        return instance
+
+    def _sync_children(self, instance, name, model, items):
+        """
+        Diff incoming rows against existing ones by id: bulk_create rows without a known id,
+        bulk_update matched rows, and delete the rest with one filtered query.
+        """
+        existing = {obj.id: obj for obj in getattr(instance, name).all()}
+        to_create, to_update, keep, changed = [], [], set(), set()
+        errors = {}
+        now = timezone.now()
+        for idx, attrs in enumerate(items):
+            obj = existing.get(attrs.get('id'))
+            if attrs.get('id') is not None and obj is None:
+                errors[idx] = {'id': ['Unknown id for this client.']}
+                continue
+            if obj is None:
+                obj = new_child(model, instance, attrs)
+                try:
+                    # Partial payloads skip required-field checks; enforce them for inserts
+                    obj.clean_fields(exclude=['id', 'client', 'created_at', 'updated_at'])
+                except DjangoValidationError as e:
+                    errors[idx] = e.message_dict
+                    continue
+                to_create.append(obj)
+                continue
+            keep.add(obj.id)
+            dirty = False
+            for field, value in attrs.items():
+                if field != 'id' and getattr(obj, field) != value:
+                    setattr(obj, field, value)
+                    changed.add(field)
+                    dirty = True
+            if dirty:
+                obj.updated_at = now
+                to_update.append(obj)
+        if errors:
+            raise serializers.ValidationError({name: errors})
+
+        if to_create:
+            model.objects.bulk_create(to_create)
+        if to_update:
+            model.objects.bulk_update(to_update, sorted(changed | {'updated_at'}))
+        stale = set(existing) - keep
+        if stale:
+            model.objects.filter(client=instance, id__in=stale).delete()
+
+
+CLIENT_SUMMARY_FIELDS = (
+    'id', 'first_name', 'last_name', 'preferred_name', 'email', 'phone',
+    'gym_name', 'archived', 'trains_with_me', 'days_per_week', 'goals',
+    'created_at', 'updated_at',
+)
+
+
+class ClientSummarySerializer(serializers.ModelSerializer):
+    """Read-only roster row: identity/contact columns plus annotated activity counts."""
+    block_count = serializers.IntegerField(read_only=True)
+    consult_count = serializers.IntegerField(read_only=True)
+    last_block_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Client
+        fields = CLIENT_SUMMARY_FIELDS + ('block_count', 'consult_count', 'last_block_at')
+        read_only_fields = fields
+
 
 class ClientBlockSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClientBlock
-        fields = ("id", "name", "created_at", "updated_at", "block")
-        read_only_fields = ("id", "created_at", "updated_at")
+        fields = ("id", "name", "created_at", "updated_at", "summary", "block")
+        read_only_fields = ("id", "created_at", "updated_at", "summary")
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Item store references are an internal storage detail; clients always see full items
+        data["block"] = instance.expanded_block()
+        return data
+
+
+class ClientBlockListSerializer(serializers.ModelSerializer):
+    """Block listing row without the JSON payload; fetch the full block from block_detail."""
+
+    class Meta:
+        model = ClientBlock
+        fields = ("id", "name", "created_at", "updated_at", "summary")
+        read_only_fields = fields
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Tuple
+
+
+def _days(data: Any) -> Dict[str, List[Dict[str, Any]]]:
+    if isinstance(data, dict):
+        pairs = data.items()
+    elif isinstance(data, list):
+        pairs = ((f"Day {i}", arr) for i, arr in enumerate(data, start=1))
+    else:
+        return {}
+    return {day: [it for it in arr if isinstance(it, dict)] for day, arr in pairs if isinstance(arr, list)}
+
+
+def _item_key(it: Dict[str, Any]) -> str:
+    return str(it.get("name") or it.get("exercise") or "").strip().lower()
+
+
+def _field_changes(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for k in old.keys() | new.keys():
+        if old.get(k) != new.get(k):
+            out[k] = {"from": old.get(k), "to": new.get(k)}
+    return dict(sorted(out.items()))
+
+
+def _diff_day(a_items: List[Dict[str, Any]], b_items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Align by exercise name; repeated names pair up in order of appearance. O(len(a) + len(b)).
+    pool: Dict[str, Deque[Tuple[int, Dict[str, Any]]]] = defaultdict(deque)
+    for i, it in enumerate(a_items):
+        pool[_item_key(it)].append((i, it))
+    added, changed = [], []
+    for j, it in enumerate(b_items):
+        bucket = pool.get(_item_key(it))
+        if not bucket:
+            added.append({"b_index": j, "item": it})
+            continue
+        i, old = bucket.popleft()
+        fields = _field_changes(old, it)
+        if fields or i != j:
+            changed.append({
+                "name": it.get("name") or it.get("exercise"),
+                "a_index": i,
+                "b_index": j,
+                "fields": fields,
+            })
+    removed = sorted(
+        ({"a_index": i, "item": it} for bucket in pool.values() for i, it in bucket),
+        key=lambda r: r["a_index"],
+    )
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def diff_blocks(a: Any, b: Any) -> Dict[str, Any]:
+    """
+    Day- and item-aligned structural diff from block ``a`` to block ``b``.
+    Days match by label; items match by exercise name. A changed entry lists every field
+    whose value differs (sets, reps, rest_s, ...) and is also reported when only the position moved.
+    """
+    a_days, b_days = _days(a), _days(b)
+    days = []
+    totals = {"added": 0, "removed": 0, "changed": 0}
+    labels = list(a_days) + [d for d in b_days if d not in a_days]
+    for label in labels:
+        if label not in b_days:
+            entry = {"day": label, "status": "removed", "added": [], "changed": [],
+                     "removed": [{"a_index": i, "item": it} for i, it in enumerate(a_days[label])]}
+        elif label not in a_days:
+            entry = {"day": label, "status": "added", "removed": [], "changed": [],
+                     "added": [{"b_index": j, "item": it} for j, it in enumerate(b_days[label])]}
+        else:
+            entry = {"day": label, **_diff_day(a_days[label], b_days[label])}
+            entry["status"] = "changed" if (entry["added"] or entry["removed"] or entry["changed"]) else "unchanged"
+        for k in totals:
+            totals[k] += len(entry[k])
+        days.append(entry)
+    return {"days": days, "stats": totals}
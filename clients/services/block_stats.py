@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from .export import iter_entries
+
+
+def compute_block_summary(data: Any) -> Dict[str, Any]:
+    """
+    Small, list-friendly digest of a block payload, stored next to the JSON at save time
+    so block listings never have to load or decode the full block.
+    """
+    days = set()
+    items = 0
+    total_sets = 0
+    patterns: Dict[str, int] = {}
+    for day, it in iter_entries(data):
+        days.add(day)
+        items += 1
+        sets = it.get("sets")
+        if isinstance(sets, (int, float)) and not isinstance(sets, bool):
+            total_sets += int(sets)
+        mp = it.get("movement_pattern")
+        if mp:
+            patterns[mp] = patterns.get(mp, 0) + 1
+    return {
+        "days": len(days),
+        "items": items,
+        "total_sets": total_sets,
+        "patterns": dict(sorted(patterns.items())),
+    }
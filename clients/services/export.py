@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import csv
+import json
+import zipfile
+from html import escape
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+CSV_HEADER = ["Day", "Exercise", "Movement Pattern", "Sets", "Reps", "Rest (s)", "Notes", "Equipment"]
+
+FORMATS = {
+    # fmt: (content type, file extension)
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "html": ("text/html; charset=utf-8", "html"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+class _Echo:
+    """File-like whose write() hands the formatted row straight back (see Django's streaming CSV docs)."""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkSink:
+    """Write-only sink for zipfile; collects bytes until the generator drains them."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def iter_entries(data: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (day, item) pairs for both block shapes: {"Day 1": [...]} and [[...], ...]."""
+    if isinstance(data, dict):
+        days: Iterable[Tuple[str, Any]] = data.items()
+    elif isinstance(data, list):
+        days = ((f"Day {i}", arr) for i, arr in enumerate(data, start=1))
+    else:
+        return
+    for day, arr in days:
+        if isinstance(arr, list):
+            for it in arr:
+                if isinstance(it, dict):
+                    yield day, it
+
+
+def _row(day: str, it: Dict[str, Any]) -> List[Any]:
+    return [
+        day,
+        it.get("name") or it.get("exercise") or "Exercise",
+        it.get("movement_pattern") or "",
+        it.get("sets") or "",
+        it.get("reps") or "",
+        it.get("rest_s") or it.get("rest") or "",
+        it.get("notes") or "",
+        it.get("equipment") or "",
+    ]
+
+
+def iter_csv(data: Any) -> Iterator[str]:
+    w = csv.writer(_Echo())
+    yield w.writerow(CSV_HEADER)
+    for day, it in iter_entries(data):
+        yield w.writerow(_row(day, it))
+
+
+def iter_html(data: Any, title: str) -> Iterator[str]:
+    t = escape(title)
+    yield (
+        f"<!doctype html><html><head><meta charset='utf-8'><title>{t}</title>"
+        "<style>body{font-family:system-ui,Arial;padding:16px}table{border-collapse:collapse;width:100%}td,th{border:1px solid #e5e7eb;padding:6px;font-size:12px}th{background:#f8fafc}</style>"
+        f"</head><body><h1>{t}</h1><table><thead><tr><th>Day</th><th>Exercise</th><th>Pattern</th><th>Sets</th><th>Reps</th><th>Rest(s)</th><th>Notes</th></tr></thead><tbody>"
+    )
+    for day, it in iter_entries(data):
+        cells = _row(day, it)[:7]
+        yield "<tr>" + "".join(f"<td>{escape(str(c))}</td>" for c in cells) + "</tr>"
+    yield "</tbody></table></body></html>"
+
+
+def iter_ndjson(data: Any) -> Iterator[str]:
+    for day, it in iter_entries(data):
+        yield json.dumps({"day": day, **it}, default=str) + "\n"
+
+
+def iter_export(data: Any, fmt: str, title: str) -> Iterator[str]:
+    if fmt == "html":
+        return iter_html(data, title)
+    if fmt == "ndjson":
+        return iter_ndjson(data)
+    return iter_csv(data)
+
+
+def iter_zip(members: Iterable[Tuple[str, Any, str]], fmt: str) -> Iterator[bytes]:
+    """
+    Stream a zip archive of exported blocks. ``members`` yields (arcname, block JSON, title).
+    Output is flushed after every row, so memory stays bounded by one row plus zip headers.
+    """
+    sink = _ChunkSink()
+    # Unseekable sink: zipfile writes data descriptors instead of seeking back
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, data, title in members:
+            with zf.open(arcname, mode="w", force_zip64=True) as member:
+                for piece in iter_export(data, fmt, title):
+                    member.write(piece.encode("utf-8"))
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Dict, List, Tuple
+
+from django.db import transaction
+
+from progress.counters import record_clients_created
+
+from ..models import Client
+from ..serializers import NESTED_RELATIONS, ClientSerializer, new_child
+from .profile_sync import mark_profiles_dirty
+from .search import index_clients
+
+
+# CSV cells for these columns hold JSON (e.g. goals='["Strength"]', equipment='[{...}]')
+JSON_COLUMNS = {"goals", "preferred_days", "injuries", "preferences", "equipment"}
+
+
+def parse_csv_rows(text: str) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """
+    Parse a CSV roster into row dicts. Blank cells are dropped so model defaults apply.
+    Returns (rows, errors) where errors maps row index -> {column: [message]}.
+    """
+    rows: List[Dict[str, Any]] = []
+    errors: Dict[int, Dict[str, Any]] = {}
+    reader = csv.DictReader(io.StringIO(text))
+    for idx, raw in enumerate(reader):
+        row: Dict[str, Any] = {}
+        for k, v in raw.items():
+            key = (k or "").strip()
+            val = (v or "").strip()
+            if not key or val == "":
+                continue
+            if key in JSON_COLUMNS:
+                try:
+                    row[key] = json.loads(val)
+                except ValueError:
+                    errors.setdefault(idx, {})[key] = ["Invalid JSON."]
+                    continue
+            else:
+                row[key] = val
+        rows.append(row)
+    return rows, errors
+
+
+def import_clients(
+    user,
+    rows: List[Dict[str, Any]],
+    partial: bool = False,
+    batch_size: int = 500,
+    parse_errors: Dict[int, Dict[str, Any]] | None = None,
+) -> Dict[str, Any]:
+    """
+    Validate every row up front, then insert clients and nested rows with bulk_create in one transaction.
+    With partial=False any invalid row aborts the import; with partial=True valid rows are still written.
+    Profiles are built in one batch once the transaction commits.
+    Returns {"created": [ids], "errors": [{"row": i, "errors": {...}}]}.
+    """
+    parse_errors = parse_errors or {}
+    validated: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for i, row in enumerate(rows):
+        ser = ClientSerializer(data=row)
+        ok = ser.is_valid()
+        row_errors = {**(ser.errors if not ok else {}), **parse_errors.get(i, {})}
+        if row_errors:
+            errors.append({"row": i, "errors": row_errors})
+        else:
+            validated.append(ser.validated_data)
+    if errors and not partial:
+        return {"created": [], "errors": errors}
+
+    clients: List[Client] = []
+    children: Dict[str, List[Any]] = {name: [] for name, _ in NESTED_RELATIONS}
+    for data in validated:
+        data = dict(data)
+        nested = {name: data.pop(name, []) for name, _ in NESTED_RELATIONS}
+        client = Client(user=user, **data)  # UUID pk is assigned here, so children can point at it pre-insert
+        clients.append(client)
+        for name, model in NESTED_RELATIONS:
+            children[name].extend(new_child(model, client, attrs) for attrs in nested[name])
+
+    if not clients:
+        return {"created": [], "errors": errors}
+
+    ids = [c.id for c in clients]
+    with transaction.atomic():
+        Client.objects.bulk_create(clients, batch_size=batch_size)
+        index_clients(clients)  # bulk_create skips the post_save that maintains search
+        record_clients_created(user.pk, clients)
+        for name, model in NESTED_RELATIONS:
+            if children[name]:
+                model.objects.bulk_create(children[name], batch_size=batch_size)
+        # bulk_create skips post_save, so queue the profiles explicitly; they are built after commit,
+        # and a failed rebuild is logged without failing the committed import
+        mark_profiles_dirty(ids)
+
+    return {"created": [str(i) for i in ids], "errors": errors}
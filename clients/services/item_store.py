@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+
+REF_KEY = "$ref"
+
+# Prescription fields vary per block instance and stay inline; everything else
+# (name, pattern, equipment, notes, cues, ...) is shared and stored once by hash.
+INSTANCE_FIELDS = frozenset({
+    "sets", "reps", "rest_s", "rest", "rpe", "tempo", "load", "load_kg", "weight",
+    "duration_min", "duration_s",
+})
+
+
+def compact_storage_enabled() -> bool:
+    return getattr(settings, "CLIENT_BLOCK_STORAGE", "inline") == "compact"
+
+
+def item_digest(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _map_items(data: Any, fn):
+    """Apply fn to every item dict in a dict- or list-shaped block, returning a new block."""
+    if isinstance(data, dict):
+        return {day: [fn(it) if isinstance(it, dict) else it for it in arr] if isinstance(arr, list) else arr
+                for day, arr in data.items()}
+    if isinstance(data, list):
+        return [[fn(it) if isinstance(it, dict) else it for it in arr] if isinstance(arr, list) else arr
+                for arr in data]
+    return data
+
+
+def _iter_items(data: Any) -> Iterable[Dict[str, Any]]:
+    days = data.values() if isinstance(data, dict) else data if isinstance(data, list) else []
+    for arr in days:
+        if isinstance(arr, list):
+            for it in arr:
+                if isinstance(it, dict):
+                    yield it
+
+
+def collect_refs(data: Any) -> Set[str]:
+    return {it[REF_KEY] for it in _iter_items(data) if isinstance(it.get(REF_KEY), str)}
+
+
+def compact_block(data: Any) -> Tuple[Any, Dict[str, Dict[str, Any]]]:
+    """
+    Replace each item's shared fields with a reference. Returns (compact block, {digest: payload})
+    for the items that need to exist in the store. Already-compact items are left as they are.
+    """
+    items: Dict[str, Dict[str, Any]] = {}
+
+    def fn(it: Dict[str, Any]) -> Dict[str, Any]:
+        if REF_KEY in it:
+            return it
+        shared = {k: v for k, v in it.items() if k not in INSTANCE_FIELDS}
+        if not shared:
+            return it
+        digest = item_digest(shared)
+        items[digest] = shared
+        return {REF_KEY: digest, **{k: v for k, v in it.items() if k in INSTANCE_FIELDS}}
+
+    return _map_items(data, fn), items
+
+
+def expand_block(data: Any, lookup: Dict[str, Dict[str, Any]]) -> Any:
+    """Inverse of compact_block. Unknown references are left in place rather than dropped."""
+
+    def fn(it: Dict[str, Any]) -> Dict[str, Any]:
+        ref = it.get(REF_KEY)
+        if ref is None or ref not in lookup:
+            return it
+        return {**lookup[ref], **{k: v for k, v in it.items() if k != REF_KEY}}
+
+    return _map_items(data, fn)
+
+
+def load_items(digests: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    from ..models import BlockItem
+
+    digests = list(digests)
+    if not digests:
+        return {}
+    return dict(BlockItem.objects.filter(digest__in=digests).values_list("digest", "payload"))
+
+
+def store_items(items: Dict[str, Dict[str, Any]]) -> None:
+    from ..models import BlockItem
+
+    if items:
+        BlockItem.objects.bulk_create(
+            [BlockItem(digest=d, payload=p) for d, p in items.items()],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+def expand_instances(blocks: List[Any]) -> None:
+    """Prime expanded payloads for many ClientBlock rows with a single item lookup."""
+    refs: Set[str] = set()
+    for b in blocks:
+        refs |= collect_refs(b.block)
+    lookup = load_items(refs)
+    for b in blocks:
+        b.set_item_lookup(lookup)
+
+
+def compact_instances(blocks: List[Any], force: Optional[bool] = None) -> None:
+    """
+    Compact unsaved ClientBlock instances in place (for bulk_create) and store their
+    items with one insert. No-op unless compact storage is enabled or ``force`` is set.
+    """
+    if not (compact_storage_enabled() if force is None else force):
+        return
+    items: Dict[str, Dict[str, Any]] = {}
+    for b in blocks:
+        b.block, new = compact_block(b.block)
+        items.update(new)
+        # The payloads are already in hand; serializing the saved block needs no lookup query
+        b.set_item_lookup(new)
+    store_items(items)
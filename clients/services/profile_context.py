@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import ClientProfile
+from .profile_sync import profile_fingerprint, rebuild_profiles
+
+
+CACHE_PREFIX = "clients:profilectx:"
+
+logger = logging.getLogger(__name__)
+
+
+def _names(values: Any, limit: int = 12) -> str:
+    items = [str(v) for v in (values or []) if v]
+    more = len(items) - limit
+    return ", ".join(items[:limit]) + (f" (+{more} more)" if more > 0 else "")
+
+
+def render_profile_context(profile: Dict[str, Any]) -> str:
+    """
+    Compact prompt text for a normalized profile. Only deviations are spelled out: movement
+    weights at the 1.0 default and empty lists are omitted.
+    """
+    p = profile or {}
+    head = [
+        p.get("skill_level"),
+        f"{p['days_per_week']} days/wk" if p.get("days_per_week") else None,
+        f"{p['session_length_min']} min sessions" if p.get("session_length_min") else None,
+        f"RPE {p['target_rpe']}" if p.get("target_rpe") else None,
+        f"location {p['location']}" if p.get("location") else None,
+        f"space {p['space_max']}" if p.get("space_max") else None,
+        f"impact max {p['impact_max']}" if p.get("impact_max") else None,
+    ]
+    lines: List[str] = ["Client profile: " + "; ".join(h for h in head if h)]
+    if p.get("equipment_allowed"):
+        lines.append("Equipment: " + _names(p["equipment_allowed"]))
+    joints = [j for j, key in (("knees", "require_knee_friendly"), ("shoulders", "require_shoulder_friendly"),
+                               ("back", "require_back_friendly")) if p.get(key)]
+    if joints:
+        lines.append("Needs friendly options for: " + ", ".join(joints))
+    weights = p.get("movement_weights") or {}
+    more = sorted((k for k, w in weights.items() if w > 1.0), key=lambda k: -weights[k])
+    less = sorted((k for k, w in weights.items() if w < 1.0), key=lambda k: weights[k])
+    if more:
+        lines.append("Emphasize: " + ", ".join(f"{k} {weights[k]:g}" for k in more))
+    if less:
+        lines.append("Deprioritize: " + ", ".join(f"{k} {weights[k]:g}" for k in less))
+    if p.get("liked_exercises"):
+        lines.append("Likes: " + _names(p["liked_exercises"]))
+    if p.get("disliked_exercises"):
+        lines.append("Avoid: " + _names(p["disliked_exercises"]))
+    return "\n".join(lines)
+
+
+def client_profile_context(client_id) -> Optional[str]:
+    """
+    Rendered profile context for a client, cached by profile fingerprint so repeated turns cost
+    one indexed lookup and no rendering until the profile changes. Builds the stored profile on
+    first use; if that fails the consult runs without profile context.
+    """
+    if client_id is None:
+        return None
+    qs = ClientProfile.objects.filter(client_id=client_id).values_list("fingerprint", "profile")
+    row = qs.first()
+    if row is None:
+        # No stored profile yet. The consult still goes ahead without one if building it fails.
+        try:
+            rebuild_profiles([client_id])
+        except Exception as e:
+            logger.warning("Profile build failed for client %s: %s", client_id, e)
+            return None
+        row = qs.first()
+        if row is None:
+            return None
+    fp, profile = row
+    if fp:
+        text = cache.get(CACHE_PREFIX + fp)
+        if text is not None:
+            return text
+    text = render_profile_context(profile)
+    # Rows written before fingerprints existed carry an empty one
+    key = CACHE_PREFIX + (fp or profile_fingerprint(profile))
+    cache.set(key, text, getattr(settings, "CLIENT_PROFILE_CONTEXT_TTL", 7 * 24 * 3600))
+    return text
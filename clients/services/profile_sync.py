@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Client, ClientProfile
+from .profile_normalizer import normalize_client_profile
+
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def profile_fingerprint(data: Dict[str, Any]) -> str:
+    """Stable hash of a normalized profile, used to skip no-op writes."""
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _pending() -> set:
+    if not hasattr(_state, "pending"):
+        _state.pending = set()
+    return _state.pending
+
+
+def _flush_pending() -> None:
+    pending = _pending()
+    ids = list(pending)
+    pending.clear()
+    if not ids:
+        return
+    try:
+        rebuild_profiles(ids)
+    except Exception as e:
+        # Never break the committed write; the plan endpoint rebuilds on demand
+        logger.warning("Deferred profile rebuild failed for %d client(s): %s", len(ids), e)
+
+
+def mark_profile_dirty(client_id) -> None:
+    """
+    Schedule a profile rebuild for ``client_id`` once the current transaction commits.
+    Repeated marks inside one transaction coalesce into a single rebuild per client.
+    Outside a transaction the rebuild runs immediately.
+    """
+    mark_profiles_dirty([client_id])
+
+
+def mark_profiles_dirty(client_ids: Iterable) -> None:
+    """mark_profile_dirty for many clients (bulk writes), rebuilt in one batch after commit."""
+    client_ids = [i for i in client_ids if i is not None]
+    if not client_ids:
+        return
+    pending = _pending()
+    conn = transaction.get_connection()
+    # A rollback discards our hook but leaves ids behind; re-register in that case.
+    registered = any(func is _flush_pending for _, func, _ in conn.run_on_commit)
+    fresh = not pending
+    pending.update(client_ids)
+    if fresh or not registered:
+        transaction.on_commit(_flush_pending)
+
+
+def rebuild_profiles(client_ids: Iterable, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Recompute ClientProfile rows for the given clients in bulk.
+    Rows whose fingerprint is unchanged are left untouched.
+    Returns counts: {"created", "updated", "unchanged"}.
+    """
+    ids = list(dict.fromkeys(client_ids))
+    counts = {"created": 0, "updated": 0, "unchanged": 0}
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        clients = (
+            Client.objects.filter(id__in=chunk)
+            .prefetch_related("equipment", "preferences")
+        )
+        existing = {p.client_id: p for p in ClientProfile.objects.filter(client_id__in=chunk)}
+        to_create: List[ClientProfile] = []
+        to_update: List[ClientProfile] = []
+        now = timezone.now()
+        for client in clients:
+            data = normalize_client_profile(client)
+            fp = profile_fingerprint(data)
+            obj = existing.get(client.id)
+            if obj is None:
+                to_create.append(ClientProfile(client=client, profile=data, fingerprint=fp, updated_at=now))
+            elif obj.fingerprint != fp:
+                obj.profile = data
+                obj.fingerprint = fp
+                obj.updated_at = now
+                to_update.append(obj)
+            else:
+                counts["unchanged"] += 1
+        if to_create:
+            ClientProfile.objects.bulk_create(to_create, ignore_conflicts=True)
+            counts["created"] += len(to_create)
+        if to_update:
+            ClientProfile.objects.bulk_update(to_update, ["profile", "fingerprint", "updated_at"])
+            counts["updated"] += len(to_update)
+    return counts
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ProgressionScheme:
+    """
+    How one block becomes the next. Defaults reproduce the original block_next rule:
+    +1 set (clamped 2-6) on the first two items of each day that have numeric sets.
+    """
+
+    sets_step: int = 1
+    sets_min: int = 2
+    sets_max: int = 6
+    reps_step: int = 0
+    reps_min: int = 1
+    reps_max: int = 30
+    rest_step_s: int = 0  # negative shortens rest
+    rest_min_s: int = 15
+    rest_max_s: int = 300
+    items_per_day: int = 2  # 0 = every item
+    deload_every: int = 0  # every Nth step is a deload; 0 disables
+    deload_sets_factor: float = 0.6
+
+    @classmethod
+    def from_params(cls, params: Optional[Dict[str, Any]]) -> "ProgressionScheme":
+        """
+        Build from request data; unknown keys are ignored, bad values (including fractional
+        integers and min > max ranges) raise ValueError, which the view answers with 400.
+        """
+        kwargs: Dict[str, Any] = {}
+        for f in fields(cls):
+            if params and params.get(f.name) not in (None, ""):
+                cast = float if f.type in ("float", float) else _strict_int
+                try:
+                    kwargs[f.name] = cast(params[f.name])
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid value for {f.name}.")
+        scheme = cls(**kwargs)
+        if scheme.items_per_day < 0 or scheme.deload_every < 0:
+            raise ValueError("items_per_day and deload_every must be >= 0.")
+        if not 0 < scheme.deload_sets_factor <= 1:
+            raise ValueError("deload_sets_factor must be in (0, 1].")
+        for lo, hi in (("sets_min", "sets_max"), ("reps_min", "reps_max"), ("rest_min_s", "rest_max_s")):
+            if getattr(scheme, lo) > getattr(scheme, hi):
+                raise ValueError(f"{lo} must not exceed {hi}.")
+        return scheme
+
+
+def _strict_int(value: Any) -> int:
+    """int() without silent truncation: 3, "3" and 3.0 pass; 2.5, "2.5" and booleans don't."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    return int(value)
+
+
+def _is_num(x: Any) -> bool:
+    return isinstance(x, (int, float)) and not isinstance(x, bool)
+
+
+def _clamp(v: float, lo: float, hi: float) -> int:
+    return int(max(lo, min(hi, v)))
+
+
+def _iter_days(data: Any):
+    """Yield (day label, items list) for dict- and list-shaped blocks (mutable references)."""
+    if isinstance(data, dict):
+        for day, arr in data.items():
+            if isinstance(arr, list):
+                yield day, arr
+    elif isinstance(data, list):
+        for i, arr in enumerate(data, start=1):
+            if isinstance(arr, list):
+                yield f"Day {i}", arr
+
+
+def _set_field(it: Dict[str, Any], field: str, new: Any, day: str, idx: int, changes: List[Dict[str, Any]]) -> None:
+    old = it.get(field)
+    if new != old:
+        it[field] = new
+        changes.append({
+            "day": day,
+            "index": idx,
+            "name": it.get("name") or it.get("exercise") or "Exercise",
+            "field": field,
+            "from": old,
+            "to": new,
+        })
+
+
+def progress_block(data: Any, scheme: ProgressionScheme) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Return (next block, changes). The input block is not modified."""
+    out = copy.deepcopy(data)
+    changes: List[Dict[str, Any]] = []
+    for day, items in _iter_days(out):
+        touched = 0
+        for idx, it in enumerate(items):
+            if not isinstance(it, dict) or not _is_num(it.get("sets")):
+                continue
+            if scheme.items_per_day and touched >= scheme.items_per_day:
+                break
+            touched += 1
+            _set_field(it, "sets", _clamp(it["sets"] + scheme.sets_step, scheme.sets_min, scheme.sets_max), day, idx, changes)
+            if scheme.reps_step and _is_num(it.get("reps")):
+                _set_field(it, "reps", _clamp(it["reps"] + scheme.reps_step, scheme.reps_min, scheme.reps_max), day, idx, changes)
+            if scheme.rest_step_s and _is_num(it.get("rest_s")):
+                _set_field(it, "rest_s", _clamp(it["rest_s"] + scheme.rest_step_s, scheme.rest_min_s, scheme.rest_max_s), day, idx, changes)
+    return out, changes
+
+
+def deload_block(data: Any, scheme: ProgressionScheme) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Scale sets down on every item for a recovery week."""
+    out = copy.deepcopy(data)
+    changes: List[Dict[str, Any]] = []
+    for day, items in _iter_days(out):
+        for idx, it in enumerate(items):
+            if isinstance(it, dict) and _is_num(it.get("sets")):
+                new = max(1, round(it["sets"] * scheme.deload_sets_factor))
+                _set_field(it, "sets", new, day, idx, changes)
+    return out, changes
+
+
+def progress_many(data: Any, scheme: ProgressionScheme, steps: int) -> List[Dict[str, Any]]:
+    """
+    Compute ``steps`` successive blocks in memory. A deload step is derived from the last
+    loading block and does not reset progress: the following step continues from that block.
+    Returns [{"block", "changes", "deload"}] in order.
+    """
+    results: List[Dict[str, Any]] = []
+    base = data
+    for step in range(1, steps + 1):
+        if scheme.deload_every and step % scheme.deload_every == 0:
+            block, changes = deload_block(base, scheme)
+            results.append({"block": block, "changes": changes, "deload": True})
+            continue
+        base, changes = progress_block(base, scheme)
+        results.append({"block": base, "changes": changes, "deload": False})
+    return results
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable, List
+
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Replace
+
+
+SEARCH_FIELDS = ("first_name", "last_name", "preferred_name", "email", "phone", "gym_name")
+# Stripped from phones for the trigram path, mirroring the digits-only token FTS5 indexes
+PHONE_SEPARATORS = (" ", "-", ".", "(", ")", "+", "/")
+FTS_TABLE = "clients_client_fts"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_fts_checked: dict = {}
+
+
+def _tokens(q: str) -> List[str]:
+    return _TOKEN_RE.findall((q or "").lower())[:8]
+
+
+def _digits(s: str) -> str:
+    return "".join(ch for ch in s or "" if ch.isdigit())
+
+
+def search_body(client) -> str:
+    """Text indexed for one client. Phone digits are added unseparated so '5550100' matches '555-0100'."""
+    parts = [getattr(client, f, "") or "" for f in SEARCH_FIELDS]
+    parts.append(_digits(client.phone))
+    return " ".join(p for p in parts if p)
+
+
+def phone_digits():
+    """phone without separators; expression of the trigram index from migration 0011."""
+    expr = F("phone")
+    for sep in PHONE_SEPARATORS:
+        expr = Replace(expr, Value(sep), Value(""))
+    return expr
+
+
+def fts_enabled() -> bool:
+    """True when running on SQLite and the FTS5 table created by migration 0009 exists."""
+    if connection.vendor != "sqlite":
+        return False
+    name = str(connection.settings_dict.get("NAME"))
+    if name not in _fts_checked:
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_checked[name] = cur.fetchone() is not None
+    return _fts_checked[name]
+
+
+def index_clients(clients: Iterable) -> None:
+    """Upsert FTS rows for the given clients (no-op outside SQLite/FTS5)."""
+    clients = list(clients)
+    if not clients or not fts_enabled():
+        return
+    with connection.cursor() as cur:
+        cur.executemany(f"DELETE FROM {FTS_TABLE} WHERE client_id = %s", [(c.pk.hex,) for c in clients])
+        cur.executemany(
+            f"INSERT INTO {FTS_TABLE} (client_id, body) VALUES (%s, %s)",
+            [(c.pk.hex, search_body(c)) for c in clients],
+        )
+
+
+def unindex_client(client_id) -> None:
+    if not fts_enabled():
+        return
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE} WHERE client_id = %s", [client_id.hex])
+
+
+def reindex_all(batch_size: int = 1000) -> int:
+    """Rebuild the FTS table from scratch; returns rows indexed."""
+    from ..models import Client
+
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {FTS_TABLE}")
+    total = 0
+    batch = []
+    for c in Client.objects.only("id", *SEARCH_FIELDS).iterator(chunk_size=batch_size):
+        batch.append(c)
+        if len(batch) >= batch_size:
+            index_clients(batch)
+            total += len(batch)
+            batch = []
+    index_clients(batch)
+    return total + len(batch)
+
+
+def search_clients(qs, q: str):
+    """
+    Filter a Client queryset by a free-text query; every token must prefix-match (SQLite FTS5)
+    or appear in (PostgreSQL trigram-indexed ILIKE) one of the name, email, phone or gym fields.
+    On both paths a run of digits also matches the phone with its separators removed.
+    """
+    tokens = _tokens(q)
+    if not tokens:
+        return qs
+    if fts_enabled():
+        # Tokens are \w+ only, so quoting each one keeps FTS5 query syntax out of user input
+        match = " AND ".join(f'"{t}"*' for t in tokens)
+        return qs.filter(pk__in=RawSQL(f"SELECT client_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    # PostgreSQL: UPPER(col) LIKE UPPER('%tok%') is served by the gin_trgm_ops indexes from
+    # migrations 0009 (fields) and 0011 (phone digits)
+    if any(t.isdigit() for t in tokens):
+        qs = qs.alias(phone_digits=phone_digits())
+    for t in tokens:
+        cond = Q()
+        for f in SEARCH_FIELDS:
+            cond |= Q(**{f"{f}__icontains": t})
+        if t.isdigit():
+            cond |= Q(phone_digits__icontains=t)
+        qs = qs.filter(cond)
+    return qs
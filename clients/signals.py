@@ -1,21 +1,37 @@
 from __future__ import annotations
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-import logging
-from .models import Client, ClientProfile
-from .services.profile_normalizer import normalize_client_profile
+from .models import Client, ClientEquipment, ClientPreference
+from .services.profile_sync import mark_profile_dirty
+from .services.search import index_clients, unindex_client
 
 
 @receiver(post_save, sender=Client)
-def build_profile_on_client_save(sender, instance: Client, created: bool, **kwargs):
-    data = normalize_client_profile(instance)
-    try:
-        obj, _ = ClientProfile.objects.get_or_create(client=instance, defaults={"profile": data})
-        if not _:
-            obj.profile = data
-            obj.save(update_fields=["profile", "updated_at"])
-    except Exception as e:
-        # Avoid crashing saves due to profile issues; endpoint will auto-create if missing
-        logging.getLogger(__name__).warning("Client profile build failed: %s", e)
+def build_profile_on_client_save(sender, instance: Client, created: bool, raw: bool = False, **kwargs):
+    # Deferred to commit so nested equipment/preferences are visible and repeated saves coalesce
+    if raw:
+        return
+    mark_profile_dirty(instance.pk)
+
+
+@receiver(post_save, sender=Client)
+def index_client_on_save(sender, instance: Client, **kwargs):
+    # Same transaction as the save, so a rollback also drops the index row
+    index_clients([instance])
+
+
+@receiver(post_delete, sender=Client)
+def unindex_client_on_delete(sender, instance: Client, **kwargs):
+    unindex_client(instance.pk)
+
+
+@receiver(post_save, sender=ClientEquipment)
+@receiver(post_save, sender=ClientPreference)
+@receiver(post_delete, sender=ClientEquipment)
+@receiver(post_delete, sender=ClientPreference)
+def mark_profile_on_child_change(sender, instance, raw: bool = False, **kwargs):
+    if raw:
+        return
+    mark_profile_dirty(instance.client_id)
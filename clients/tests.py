@@ -1,5 +1,15 @@
+import io
+import json
+import zipfile
+from unittest import mock
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from .models import Client
@@ -46,5 +56,559 @@ class ClientOwnershipTests(APITestCase):
         token2 = self._jwt("bob", "pass1234")
         res = self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token2}")
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, [])
+        self.assertEqual(res.data["results"], [])
+
+
+
+class ProfileRebuildTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="carol", password="pass1234")
+        self.client.force_authenticate(self.user)
+
+    def test_profile_built_once_after_nested_create(self):
+        from .models import ClientProfile
+        payload = {
+            "first_name": "Jane",
+            "last_name": "Doe",
+            "age_group": "25-34",
+            "equipment": [{"location": "Gym", "category": "Dumbbells"}],
+            "preferences": [{"kind": "Exercise", "value": "Burpees", "sentiment": "Hard No"}],
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.post(reverse('clients-list'), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(callbacks), 1)
+        prof = ClientProfile.objects.get(client_id=res.data['id'])
+        self.assertEqual(prof.profile["equipment_allowed"], ["Dumbbells"])
+        self.assertEqual(prof.profile["disliked_exercises"], ["Burpees"])
+        self.assertTrue(prof.fingerprint)
+
+    def test_unchanged_fingerprint_skips_write(self):
+        from .services.profile_sync import rebuild_profiles
+        with self.captureOnCommitCallbacks(execute=True):
+            c = Client.objects.create(user=self.user, first_name="A", last_name="B", age_group="25-34")
+        c.refresh_from_db()
+        stamp = c.profile.updated_at
+        self.assertEqual(rebuild_profiles([c.id]), {"created": 0, "updated": 0, "unchanged": 1})
+        Client.objects.filter(id=c.id).update(days_per_week=5)
+        self.assertEqual(rebuild_profiles([c.id])["updated"], 1)
+        c.profile.refresh_from_db()
+        self.assertEqual(c.profile.profile["days_per_week"], 5)
+        self.assertGreater(c.profile.updated_at, stamp)
+
+
+class ClientListingTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="dave", password="pass1234")
+        self.client.force_authenticate(self.user)
+        for n in range(3):
+            c = Client.objects.create(user=self.user, first_name=f"C{n}", last_name="X", age_group="25-34")
+            c.equipment.create(location="Gym", category="Dumbbells")
+            c.preferences.create(kind="Exercise", value="Row", sentiment="Like")
+
+    def test_full_list_query_count_is_constant(self):
+        # clients + one prefetch per nested relation, independent of roster size
+        with self.assertNumQueries(4):
+            res = self.client.get(reverse('clients-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 3)
+        self.assertEqual(len(res.data["results"][0]["equipment"]), 1)
+
+    def test_summary_view_annotates_counts(self):
+        from .models import ClientBlock
+        c = Client.objects.get(first_name="C0")
+        ClientBlock.objects.create(client=c, name="W1", block={})
+        ClientBlock.objects.create(client=c, name="W2", block={})
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse('clients-list'), {"view": "summary"})
+        row = next(r for r in res.data["results"] if r["id"] == str(c.id))
+        self.assertEqual(row["block_count"], 2)
+        self.assertEqual(row["consult_count"], 0)
+        self.assertIsNotNone(row["last_block_at"])
+        self.assertNotIn("equipment", row)
+
+    def test_list_pages_by_cursor_with_optional_count(self):
+        base = timezone.now()
+        for i, c in enumerate(Client.objects.order_by("first_name")):
+            Client.objects.filter(pk=c.pk).update(created_at=base - timedelta(minutes=i))
+        url = reverse('clients-list')
+        res = self.client.get(url, {"limit": 2, "view": "summary"})
+        self.assertEqual([r["first_name"] for r in res.data["results"]], ["C0", "C1"])
+        self.assertNotIn("count", res.data)
+        res = self.client.get(res.data["next"])
+        self.assertEqual([r["first_name"] for r in res.data["results"]], ["C2"])
+        self.assertIsNone(res.data["next"])
+        res = self.client.get(url, {"limit": 1, "with_count": 1, "view": "summary"})
+        self.assertEqual(res.data["count"], 3)
+
+
+class ClientImportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="erin", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.url = reverse('clients-bulk-import')
+
+    def test_json_import_bulk_creates_with_nested_and_profiles(self):
+        from .models import ClientProfile
+        rows = [
+            {"first_name": f"P{i}", "last_name": "Q", "age_group": "25-34",
+             "equipment": [{"location": "Gym", "category": "Kettlebells"}]}
+            for i in range(5)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 5)
+        self.assertEqual(Client.objects.filter(user=self.user).count(), 5)
+        profiles = ClientProfile.objects.filter(client__user=self.user)
+        self.assertEqual(profiles.count(), 5)
+        self.assertEqual(profiles.first().profile["equipment_allowed"], ["Kettlebells"])
+
+    def test_failed_profile_rebuild_keeps_import(self):
+        rows = [{"first_name": "R", "last_name": "B", "age_group": "25-34"}]
+        with mock.patch("clients.services.profile_sync.rebuild_profiles", side_effect=RuntimeError("boom")), \
+                self.assertLogs("clients.services.profile_sync", "WARNING"), \
+                self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Client.objects.filter(user=self.user).count(), 1)
+
+    def test_invalid_row_aborts_unless_partial(self):
+        rows = [
+            {"first_name": "Ok", "last_name": "Row", "age_group": "25-34"},
+            {"first_name": "Bad", "last_name": "Row", "age_group": "nope"},
+        ]
+        res = self.client.post(self.url, rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["errors"][0]["row"], 1)
+        self.assertIn("age_group", res.data["errors"][0]["errors"])
+        self.assertFalse(Client.objects.exists())
+
+        res = self.client.post(self.url + "?partial=1", rows, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 1)
+
+    def test_csv_import_with_json_columns(self):
+        body = (
+            "first_name,last_name,age_group,goals,preferences\n"
+            'Ann,Lee,35-44,"[""Strength""]","[{""kind"": ""Exercise"", ""value"": ""Row"", ""sentiment"": ""Like""}]"\n'
+            "Bo,Kim,18-24,,\n"
+        )
+        res = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        ann = Client.objects.get(first_name="Ann")
+        self.assertEqual(ann.goals, ["Strength"])
+        self.assertEqual(ann.preferences.count(), 1)
+
+    def test_non_utf8_csv_is_rejected(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        body = "first_name,last_name,age_group\nJos\u00e9,P\u00e9rez,25-34\n".encode("latin-1")
+        res = self.client.post(self.url, {"file": SimpleUploadedFile("c.csv", body, content_type="text/csv")},
+                               format="multipart")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("UTF-8", res.data["detail"])
+        res = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Client.objects.exists())
+
+
+class ClientNestedUpdateTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="fay", password="pass1234")
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj = Client.objects.create(user=self.user, first_name="N", last_name="U", age_group="25-34")
+            self.keep = self.obj.equipment.create(location="Gym", category="Dumbbells")
+            self.drop = self.obj.equipment.create(location="Home", category="Bands")
+        self.url = reverse('clients-detail', args=[self.obj.id])
+
+    def test_patch_diffs_children_by_id(self):
+        payload = {"equipment": [
+            {"id": str(self.keep.id), "category": "Kettlebells"},
+            {"location": "Gym", "category": "Barbell"},
+        ]}
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.data)
+        self.assertEqual(len(callbacks), 1)
+        cats = sorted(e["category"] for e in res.data["equipment"])
+        self.assertEqual(cats, ["Barbell", "Kettlebells"])
+        self.keep.refresh_from_db()
+        self.assertEqual(self.keep.category, "Kettlebells")
+        self.assertFalse(self.obj.equipment.filter(id=self.drop.id).exists())
+        self.obj.profile.refresh_from_db()
+        self.assertEqual(self.obj.profile.profile["equipment_allowed"], ["Barbell", "Kettlebells"])
+
+    def test_query_count_independent_of_list_size(self):
+        def patch(n):
+            items = [{"location": "Gym", "category": f"Cat{i}"} for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.patch(self.url, {"equipment": items}, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+        self.assertEqual(patch(2), patch(20))
+
+    def test_unknown_child_id_rejected(self):
+        other = Client.objects.create(user=self.user, first_name="O", last_name="T", age_group="25-34")
+        foreign = other.equipment.create(location="Gym", category="Rower")
+        res = self.client.patch(self.url, {"equipment": [{"id": str(foreign.id), "category": "X"}]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.category, "Rower")
+
+    def test_new_child_on_patch_requires_fields(self):
+        res = self.client.patch(self.url, {"equipment": [{"category": "Sled"}]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("location", str(res.data))
+
+
+class BlockExportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="gus", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="Ex", last_name="Port", age_group="25-34")
+        self.block = self.obj.blocks.create(name="Week 1", block={
+            "Day 1": [{"name": "Squat", "sets": 3, "reps": 5}, {"name": "<b>Row</b>", "sets": 3}],
+            "Day 2": [{"name": "Hinge", "sets": 4}],
+        })
+        self.obj.blocks.create(name="Week 2", block=[[{"name": "Press", "sets": 2}]])
+
+    def _export(self, fmt):
+        url = f"/api/clients/{self.obj.id}/blocks/{self.block.id}/export/"
+        res = self.client.get(url, {"format": fmt})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode("utf-8")
+
+    def test_streams_csv_html_and_ndjson(self):
+        csv_body = self._export("csv")
+        self.assertEqual(len(csv_body.strip().splitlines()), 4)
+        self.assertIn("Day 2,Hinge", csv_body)
+        html = self._export("html")
+        self.assertIn("&lt;b&gt;Row&lt;/b&gt;", html)
+        self.assertTrue(html.endswith("</html>"))
+        lines = [json.loads(x) for x in self._export("ndjson").splitlines()]
+        self.assertEqual([x["day"] for x in lines], ["Day 1", "Day 1", "Day 2"])
+
+    def test_client_and_coach_archives(self):
+        res = self.client.get(f"/api/clients/{self.obj.id}/blocks/archive/")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        zf = zipfile.ZipFile(io.BytesIO(b"".join(res.streaming_content)))
+        self.assertEqual(len(zf.namelist()), 2)
+        self.assertTrue(all(n.endswith(".csv") for n in zf.namelist()))
+
+        res = self.client.get("/api/clients/archive/", {"format": "ndjson"})
+        zf = zipfile.ZipFile(io.BytesIO(b"".join(res.streaming_content)))
+        self.assertEqual(len(zf.namelist()), 2)
+        self.assertTrue(all("/" in n for n in zf.namelist()))
+        week2 = next(n for n in zf.namelist() if "Week_2" in n)
+        self.assertEqual(json.loads(zf.read(week2))["name"], "Press")
+
+
+class BlockListingTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="hal", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="Bl", last_name="Ock", age_group="25-34")
+        base = timezone.now()
+        for n in range(5):
+            self.obj.blocks.create(name=f"W{n}", created_at=base + timedelta(minutes=n), block={
+                "Day 1": [{"name": "Squat", "movement_pattern": "Squat", "sets": 3}],
+                "Day 2": [{"name": "Row", "movement_pattern": "Horizontal Pull", "sets": n}],
+            })
+
+    def test_summary_precomputed_and_refreshed(self):
+        b = self.obj.blocks.get(name="W4")
+        self.assertEqual(b.summary, {"days": 2, "items": 2, "total_sets": 7,
+                                     "patterns": {"Horizontal Pull": 1, "Squat": 1}})
+        b.block = {"Day 1": []}
+        b.save(update_fields=["block"])
+        b.refresh_from_db()
+        self.assertEqual(b.summary["items"], 0)
+
+    def test_list_omits_payload_and_pages_by_cursor(self):
+        url = f"/api/clients/{self.obj.id}/blocks/"
+        res = self.client.get(url, {"limit": 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["name"] for r in res.data["results"]], ["W4", "W3"])
+        self.assertNotIn("block", res.data["results"][0])
+        self.assertEqual(res.data["results"][0]["summary"]["days"], 2)
+        seen = [r["name"] for r in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            seen += [r["name"] for r in res.data["results"]]
+        self.assertEqual(seen, ["W4", "W3", "W2", "W1", "W0"])
+        self.assertEqual(self.client.get(url, {"cursor": "garbage"}).status_code, status.HTTP_404_NOT_FOUND)
+        from coachapp.pagination import KeysetPagination
+        tampered = KeysetPagination.encode_cursor(timezone.now(), "not-a-uuid")
+        self.assertEqual(self.client.get(url, {"cursor": tampered}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BlockProgressionTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="ivy", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="Pr", last_name="Og", age_group="25-34")
+        self.block = self.obj.blocks.create(name="Base", block={
+            "Day 1": [
+                {"name": "Squat", "sets": 3, "reps": 5, "rest_s": 120},
+                {"name": "Row", "sets": 3, "reps": 8, "rest_s": 90},
+                {"name": "Plank", "sets": 2},
+            ],
+        })
+
+    def test_next_keeps_original_rule(self):
+        res = self.client.post(f"/api/clients/{self.obj.id}/blocks/{self.block.id}/next/", {}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([it["sets"] for it in res.data["block"]["Day 1"]], [4, 4, 2])
+
+    def test_progress_steps_with_deload_in_one_insert(self):
+        url = f"/api/clients/{self.obj.id}/blocks/{self.block.id}/progress/?steps=4"
+        body = {"reps_step": 1, "deload_every": 3, "items_per_day": 1}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(url, body, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED, res.data)
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        blocks = res.data["blocks"]
+        self.assertEqual([b["deload"] for b in blocks], [False, False, True, False])
+        squat = [b["block"]["Day 1"][0] for b in blocks]
+        self.assertEqual([s["sets"] for s in squat], [4, 5, 3, 6])
+        self.assertEqual([s["reps"] for s in squat], [6, 7, 7, 8])
+        self.assertEqual({c["field"] for c in blocks[0]["changes"]}, {"sets", "reps"})
+        self.assertEqual(self.obj.blocks.count(), 5)
+
+    def test_progress_rejects_bad_input(self):
+        url = f"/api/clients/{self.obj.id}/blocks/{self.block.id}/progress/"
+        self.assertEqual(self.client.post(url + "?steps=0", {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {"sets_step": "x"}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {"sets_step": 1.5}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {"reps_step": "2.5"}, format='json').status_code, 400)
+        res = self.client.post(url, {"sets_min": 5, "sets_max": 3}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn("sets_min", res.data["detail"])
+        self.assertEqual(self.obj.blocks.count(), 1)
+        self.assertEqual(self.client.post(url, {"sets_step": 2.0}, format='json').status_code, 201)
+
+    def test_progress_rejects_non_integer_steps(self):
+        url = f"/api/clients/{self.obj.id}/blocks/{self.block.id}/progress/"
+        for query, body in (("?steps=1.5", {}), ("", {"steps": 1.5}), ("", {"steps": [2]})):
+            res = self.client.post(url + query, body, format='json')
+            self.assertEqual(res.status_code, 400, (query, body))
+            self.assertEqual(res.data["detail"], "Invalid steps.")
+        self.assertEqual(self.obj.blocks.count(), 1)
+
+    def test_other_coach_cannot_progress_blocks(self):
+        intruder = get_user_model().objects.create_user(username="mallory", password="pass1234")
+        self.client.force_authenticate(intruder)
+        base = f"/api/clients/{self.obj.id}/blocks/{self.block.id}"
+        self.assertEqual(self.client.post(f"{base}/progress/?steps=3", {}, format='json').status_code, 404)
+        self.assertEqual(self.client.post(f"{base}/next/", {}, format='json').status_code, 404)
+        self.assertEqual(self.obj.blocks.count(), 1)
+
+
+@override_settings(CLIENT_BLOCK_STORAGE="compact")
+class BlockItemStoreTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="jo", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="It", last_name="Em", age_group="25-34")
+        self.payload = {"Day 1": [
+            {"name": "Goblet Squat", "movement_pattern": "Squat", "notes": "Brace", "sets": 3, "reps": 8},
+            {"name": "Goblet Squat", "movement_pattern": "Squat", "notes": "Brace", "sets": 2, "reps": 12},
+        ]}
+
+    def test_blocks_store_refs_and_expand_transparently(self):
+        from .models import BlockItem, ClientBlock
+        res = self.client.post(f"/api/clients/{self.obj.id}/plan/save/", {"name": "W1", "plan": self.payload}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["block"], self.payload)
+        self.obj.blocks.create(name="W2", block=self.payload)
+        self.assertEqual(BlockItem.objects.count(), 1)
+        stored = ClientBlock.objects.get(name="W1").block["Day 1"][0]
+        self.assertEqual(set(stored), {"$ref", "sets", "reps"})
+        self.assertEqual(ClientBlock.objects.get(name="W1").summary["total_sets"], 5)
+        detail = self.client.get(f"/api/clients/{self.obj.id}/blocks/{res.data['id']}/")
+        self.assertEqual(detail.data["block"], self.payload)
+
+    def test_compact_blocks_command_round_trip(self):
+        from django.core.management import call_command
+        from .models import BlockItem
+        with self.settings(CLIENT_BLOCK_STORAGE="inline"):
+            b = self.obj.blocks.create(name="Old", block=self.payload)
+        call_command("compact_blocks", stdout=io.StringIO())
+        b.refresh_from_db()
+        self.assertIn("$ref", b.block["Day 1"][0])
+        call_command("compact_blocks", "--expand", "--prune", stdout=io.StringIO())
+        b.refresh_from_db()
+        self.assertEqual(b.block, self.payload)
+        self.assertFalse(BlockItem.objects.exists())
+
+    def test_prune_deletes_orphans_in_batches_and_keeps_live_items(self):
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from django.utils import timezone
+        from .models import BlockItem
+        self.obj.blocks.create(name="Live", block=self.payload)
+        live = set(BlockItem.objects.values_list("digest", flat=True))
+        old = timezone.now() - timedelta(hours=1)
+        BlockItem.objects.bulk_create([BlockItem(digest=f"{i:064x}", payload={"name": f"x{i}"}, created_at=old) for i in range(5)])
+        BlockItem.objects.filter(digest__in=live).update(created_at=old)
+        # Stored while the prune runs: not visible to the scan, so it must survive
+        BlockItem.objects.create(digest="f" * 64, payload={"name": "new"}, created_at=timezone.now() + timedelta(minutes=1))
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("compact_blocks", "--prune", "--batch-size", "2", stdout=io.StringIO())
+        self.assertEqual(set(BlockItem.objects.values_list("digest", flat=True)), live | {"f" * 64})
+        deletes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("DELETE") and "blockitem" in q["sql"]]
+        # Five orphans at two per chunk: no single statement lists them all
+        self.assertGreaterEqual(len(deletes), 3)
+
+
+class BlockDiffTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username="kim", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="Di", last_name="Ff", age_group="25-34")
+        self.a = self.obj.blocks.create(name="A", block={
+            "Day 1": [{"name": "Squat", "sets": 3, "reps": 5}, {"name": "Row", "sets": 3}],
+            "Day 2": [{"name": "Hinge", "sets": 3}],
+        })
+        self.b = self.obj.blocks.create(name="B", block={
+            "Day 1": [{"name": "Squat", "sets": 4, "reps": 5}, {"name": "Press", "sets": 3}],
+            "Day 3": [{"name": "Carry", "sets": 2}],
+        })
+        self.url = f"/api/clients/{self.obj.id}/blocks/diff/"
+
+    def test_day_and_item_aligned_diff(self):
+        res = self.client.get(self.url, {"a": self.a.id, "b": self.b.id})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        days = {d["day"]: d for d in res.data["days"]}
+        self.assertEqual(days["Day 2"]["status"], "removed")
+        self.assertEqual(days["Day 3"]["status"], "added")
+        d1 = days["Day 1"]
+        self.assertEqual(d1["changed"][0]["fields"], {"sets": {"from": 3, "to": 4}})
+        self.assertEqual(d1["added"][0]["item"]["name"], "Press")
+        self.assertEqual(d1["removed"][0]["item"]["name"], "Row")
+        self.assertEqual(res.data["stats"], {"added": 2, "removed": 2, "changed": 1})
+
+    def test_diff_cached_until_block_changes(self):
+        self.client.get(self.url, {"a": self.a.id, "b": self.b.id})
+        with self.assertNumQueries(2):  # owned client, block stamps
+            self.client.get(self.url, {"a": self.a.id, "b": self.b.id})
+        self.b.block = self.a.block
+        self.b.save()
+        res = self.client.get(self.url, {"a": self.a.id, "b": self.b.id})
+        self.assertEqual(res.data["stats"], {"added": 0, "removed": 0, "changed": 0})
+
+    def test_bad_and_foreign_ids(self):
+        self.assertEqual(self.client.get(self.url, {"a": "x", "b": self.b.id}).status_code, 400)
+        other = Client.objects.create(user=self.user, first_name="O", last_name="T", age_group="25-34")
+        foreign = other.blocks.create(name="F", block={})
+        self.assertEqual(self.client.get(self.url, {"a": self.a.id, "b": foreign.id}).status_code, 404)
+
+    def test_other_coach_cannot_read_diff(self):
+        self.client.get(self.url, {"a": self.a.id, "b": self.b.id})  # warm the cache
+        intruder = get_user_model().objects.create_user(username="snoop", password="pass1234")
+        self.client.force_authenticate(intruder)
+        self.assertEqual(self.client.get(self.url, {"a": self.a.id, "b": self.b.id}).status_code, 404)
+
+
+class ClientSearchTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="lee", password="pass1234")
+        self.client.force_authenticate(self.user)
+        Client.objects.create(user=self.user, first_name="Jane", last_name="Doe", email="jane@example.com",
+                              phone="555-0100", gym_name="Iron Temple", age_group="25-34")
+        Client.objects.create(user=self.user, first_name="John", last_name="Smith", age_group="25-34")
+        other = get_user_model().objects.create_user(username="max", password="pass1234")
+        Client.objects.create(user=other, first_name="Janet", last_name="Other", age_group="25-34")
+
+    def _names(self, q):
+        res = self.client.get(reverse('clients-list'), {"q": q})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(r["first_name"] for r in res.data["results"])
+
+    def test_prefix_search_across_fields_scoped_to_owner(self):
+        from .services.search import fts_enabled
+
+        # FTS5 on SQLite and the trigram ILIKE path (PostgreSQL, or SQLite without FTS5) must agree
+        for fts in ((True, False) if fts_enabled() else (False,)):
+            with self.subTest(fts=fts), mock.patch("clients.services.search.fts_enabled", return_value=fts):
+                self.assertEqual(self._names("jan"), ["Jane"])
+                self.assertEqual(self._names("iron tem"), ["Jane"])
+                self.assertEqual(self._names("5550100"), ["Jane"])
+                self.assertEqual(self._names("555 0100"), ["Jane"])
+                self.assertEqual(self._names("smi"), ["John"])
+                self.assertEqual(self._names("jo do"), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        c = Client.objects.get(first_name="John")
+        c.gym_name = "Harbor Gym"
+        c.save()
+        self.assertEqual(self._names("harb"), ["John"])
+        c.delete()
+        self.assertEqual(self._names("harb"), [])
+
+
+class HotQueryIndexTests(APITestCase):
+    def test_canonical_queries_are_index_backed(self):
+        from django.core.management import call_command
+        out = io.StringIO()
+        call_command("explain_hot_queries", stdout=out)
+        self.assertIn("All canonical queries use indexes.", out.getvalue())
+
+
+class ProfileContextTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username="quinn", password="pass1234")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj = Client.objects.create(user=self.user, first_name="Pro", last_name="File", age_group="25-34")
+            self.obj.equipment.create(location="Gym", category="Dumbbells")
+            self.obj.preferences.create(kind="Movement Pattern", value="Squat", sentiment="Like")
+
+    def test_compact_text_cached_on_fingerprint(self):
+        from .services.profile_context import client_profile_context
+        text = client_profile_context(self.obj.pk)
+        self.assertIn("Equipment: Dumbbells", text)
+        self.assertIn("Emphasize: Squat 1.2", text)
+        self.assertNotIn("Hinge", text)  # default weights are omitted
+        self.assertNotIn("{", text)
+        with self.assertNumQueries(1):
+            self.assertEqual(client_profile_context(self.obj.pk), text)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.obj.preferences.create(kind="Exercise", value="Burpee", sentiment="Dislike")
+        self.assertIn("Avoid: Burpee", client_profile_context(self.obj.pk))
+
+    def test_failed_first_build_falls_back_to_no_context(self):
+        from .models import ClientProfile
+        from .services.profile_context import client_profile_context
+        ClientProfile.objects.filter(client=self.obj).delete()
+        with mock.patch("clients.services.profile_context.rebuild_profiles", side_effect=RuntimeError("boom")), \
+                self.assertLogs("clients.services.profile_context", level="WARNING"):
+            self.assertIsNone(client_profile_context(self.obj.pk))
 
+    def test_row_without_fingerprint_is_read_once(self):
+        from .models import ClientProfile
+        from .services.profile_context import client_profile_context
+        ClientProfile.objects.filter(client=self.obj).update(fingerprint="")
+        with self.assertNumQueries(1):
+            self.assertIn("Equipment: Dumbbells", client_profile_context(self.obj.pk))
@@ -1,14 +1,86 @@
+import json
 import logging
-from rest_framework import viewsets, status, permissions, throttling
+import uuid
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import viewsets, status, permissions, throttling, parsers, negotiation
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from coachapp.pagination import KeysetPagination
+from consults.models import Consult
+from progress.counters import record_blocks_created
 from .models import Client, ClientProfile, ClientBlock
-from .serializers import ClientSerializer, ClientBlockSerializer
+from .parsers import CSVTextParser
+from .serializers import (
+    CLIENT_SUMMARY_FIELDS,
+    ClientSerializer,
+    ClientSummarySerializer,
+    ClientBlockSerializer,
+    ClientBlockListSerializer,
+)
 
 from .services.profile_normalizer import normalize_client_profile
+from .services.profile_sync import profile_fingerprint
+from .services import export
 from .services.generator import generate_week_plan
+from .services.block_diff import diff_blocks
+from .services.search import search_clients
+from .services.item_store import compact_instances, expand_instances
+from .services.importer import import_clients, parse_csv_rows
+from .services.progression import ProgressionScheme, _strict_int, progress_block, progress_many
+
+
+# Block ids are UUIDs; the strict pattern keeps literal sub-paths like blocks/archive routable
+BLOCK_ID = r"[0-9a-fA-F-]{32,36}"
+
+
+class ExportNegotiation(negotiation.DefaultContentNegotiation):
+    """Export actions use ?format= for the file type and stream raw responses, so skip DRF's format lookup."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def _export_format(request) -> str:
+    fmt = (request.query_params.get("format") or "csv").lower()
+    return fmt if fmt in export.FORMATS else "csv"
+
+
+def _slug(text: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in text).strip("_") or "client"
+
+
+def _archive_response(request, blocks, filename: str, per_client: bool = False) -> StreamingHttpResponse:
+    fmt = _export_format(request)
+    _, ext = export.FORMATS[fmt]
+
+    def members():
+        # iterator() streams rows from the cursor instead of caching the whole queryset
+        rows = blocks.iterator(chunk_size=50)
+        while True:
+            chunk = list(islice(rows, 50))
+            if not chunk:
+                break
+            expand_instances(chunk)  # one item store lookup per chunk
+            for b in chunk:
+                title = b.name or f"plan_{b.id}"
+                arcname = f"{_slug(title)}_{b.id}.{ext}"
+                if per_client:
+                    arcname = f"{_slug(str(b.client))}_{b.client_id}/{arcname}"
+                yield arcname, b.expanded_block() or {}, title
+
+    resp = StreamingHttpResponse(export.iter_zip(members(), fmt), content_type="application/zip")
+    resp["Content-Disposition"] = f"attachment; filename={filename}.zip"
+    return resp
 
 
 class ClientViewSet(viewsets.ModelViewSet):
@@ -17,13 +89,95 @@ class ClientViewSet(viewsets.ModelViewSet):
     throttle_classes = [throttling.ScopedRateThrottle]
     throttle_scope = "clients"
 
+    def _summary_mode(self) -> bool:
+        return self.action == "list" and self.request.query_params.get("view") == "summary"
+
     def get_queryset(self):
         # Scope to requesting user
-        return Client.objects.filter(user=self.request.user).order_by("-created_at")
+        qs = Client.objects.filter(user=self.request.user).order_by("-created_at")
+        q = self.request.query_params.get("q")
+        if q and self.action == "list":
+            qs = search_clients(qs, q)
+        if self._summary_mode():
+            # Roster columns only; counts come from correlated subqueries in the same SELECT
+            blocks = ClientBlock.objects.filter(client=OuterRef("pk")).order_by()
+            consults = Consult.objects.filter(client=OuterRef("pk")).order_by()
+            return qs.only(*CLIENT_SUMMARY_FIELDS).annotate(
+                block_count=Coalesce(
+                    Subquery(blocks.values("client").annotate(n=Count("pk")).values("n")[:1], output_field=IntegerField()),
+                    0,
+                ),
+                consult_count=Coalesce(
+                    Subquery(consults.values("client").annotate(n=Count("pk")).values("n")[:1], output_field=IntegerField()),
+                    0,
+                ),
+                last_block_at=Subquery(blocks.order_by("-created_at").values("created_at")[:1]),
+            )
+        if self.action in ("list", "retrieve", "update", "partial_update"):
+            # Nested serializers read these; one query per relation instead of per client
+            qs = qs.prefetch_related("injuries", "preferences", "equipment")
+        return qs
+
+    def get_serializer_class(self):
+        if self._summary_mode():
+            return ClientSummarySerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[parsers.JSONParser, CSVTextParser, parsers.MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        Import many clients at once. Accepts a JSON array (or {"clients": [...]}), a text/csv body,
+        or a multipart 'file' upload (.csv or .json). Nested injuries/preferences/equipment are
+        supported; in CSV those columns hold JSON. Pass ?partial=1 to keep valid rows when others fail.
+        """
+        data = request.data
+        parse_errors = {}
+        upload = request.FILES.get("file") if hasattr(request, "FILES") else None
+        if upload is not None:
+            try:
+                raw = upload.read().decode("utf-8-sig")
+            except UnicodeDecodeError:
+                return Response({"detail": "File is not valid UTF-8; save it as UTF-8 (CSV UTF-8) and retry."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if upload.name.lower().endswith(".json"):
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    return Response({"detail": "Invalid JSON file."}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                data = raw
+        if isinstance(data, str):
+            data, parse_errors = parse_csv_rows(data)
+        elif isinstance(data, dict):
+            data = data.get("clients")
+        if not isinstance(data, list) or not data:
+            return Response({"detail": "Provide a non-empty list of clients."}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, "CLIENT_IMPORT_MAX_ROWS", 5000)
+        if len(data) > max_rows:
+            return Response({"detail": f"Too many rows; limit is {max_rows}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        partial = request.query_params.get("partial") in ("1", "true", "True")
+        result = import_clients(
+            request.user,
+            data,
+            partial=partial,
+            batch_size=getattr(settings, "CLIENT_IMPORT_BATCH_SIZE", 500),
+            parse_errors=parse_errors,
+        )
+        code = status.HTTP_201_CREATED if result["created"] else status.HTTP_400_BAD_REQUEST
+        return Response(
+            {"created": len(result["created"]), "ids": result["created"], "errors": result["errors"]},
+            status=code,
+        )
+
     @action(detail=True, methods=["get"], url_path="plan")
     def plan(self, request, pk=None):
         client = get_object_or_404(Client, pk=pk)
@@ -32,7 +186,7 @@ class ClientViewSet(viewsets.ModelViewSet):
         profile_obj = getattr(client, "profile", None)
         if not profile_obj:
             data = normalize_client_profile(client)
-            profile_obj = ClientProfile.objects.create(client=client, profile=data)
+            profile_obj = ClientProfile.objects.create(client=client, profile=data, fingerprint=profile_fingerprint(data))
         profile = profile_obj.profile
 
         save = request.query_params.get("save") in ("1", "true", "True")
@@ -61,10 +215,41 @@ class ClientViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"], url_path="blocks")
     def list_blocks(self, request, pk=None):
         client = get_object_or_404(Client, pk=pk)
-        qs = client.blocks.all().order_by("-created_at")
-        return Response(ClientBlockSerializer(qs, many=True).data)
+        # The JSON payload is never read or decoded for listings; summary stats are precomputed
+        qs = client.blocks.defer("block")
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(qs, request, view=self)
+        return paginator.get_paginated_response(ClientBlockListSerializer(page, many=True).data)
 
-    @action(detail=True, methods=["get", "patch", "delete"], url_path=r"blocks/(?P<block_id>[^/.]+)")
+    @action(detail=True, methods=["get"], url_path="blocks/diff")
+    def block_diff(self, request, pk=None):
+        """
+        Structural diff between two of this client's blocks: ?a=<block id>&b=<block id>.
+        Results are cached per (block, updated_at) pair, so repeat views are a cache read.
+        """
+        try:
+            ids = [uuid.UUID(str(request.query_params.get(k))) for k in ("a", "b")]
+        except ValueError:
+            return Response({"detail": "Provide block ids as ?a=..&b=.."}, status=status.HTTP_400_BAD_REQUEST)
+        client = get_object_or_404(Client, pk=pk, user=request.user)
+        # A cache hit costs the ownership check plus this stamp query
+        stamps = dict(ClientBlock.objects.filter(client=client, id__in=ids).values_list("id", "updated_at"))
+        if any(i not in stamps for i in ids):
+            raise Http404
+        key = "clients:blockdiff:" + ":".join(f"{i.hex}.{stamps[i].timestamp()}" for i in ids)
+        data = cache.get(key)
+        if data is None:
+            blocks = {b.id: b for b in ClientBlock.objects.filter(client=client, id__in=ids).only("id", "block")}
+            expand_instances(list(blocks.values()))
+            data = {
+                "a": str(ids[0]),
+                "b": str(ids[1]),
+                **diff_blocks(blocks[ids[0]].expanded_block(), blocks[ids[1]].expanded_block()),
+            }
+            cache.set(key, data, getattr(settings, "BLOCK_DIFF_CACHE_TTL", 86400))
+        return Response(data)
+
+    @action(detail=True, methods=["get", "patch", "delete"], url_path=rf"blocks/(?P<block_id>{BLOCK_ID})")
     def block_detail(self, request, pk=None, block_id=None):
         client = get_object_or_404(Client, pk=pk)
         block = get_object_or_404(ClientBlock, pk=block_id, client=client)
@@ -79,107 +264,106 @@ class ClientViewSet(viewsets.ModelViewSet):
         block.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=True, methods=["get"], url_path=r"blocks/(?P<block_id>[^/.]+)/export")
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=rf"blocks/(?P<block_id>{BLOCK_ID})/export",
+        content_negotiation_class=ExportNegotiation,
+    )
     def block_export(self, request, pk=None, block_id=None):
-        import csv as _csv
-        from io import StringIO
         client = get_object_or_404(Client, pk=pk)
         block = get_object_or_404(ClientBlock, pk=block_id, client=client)
-        fmt = (request.query_params.get("format") or "csv").lower()
+        fmt = _export_format(request)
         name = (block.name or f"plan_{block.id}").replace(" ", "_")
-        data = block.block or {}
-        # Normalize to entries: [(day,title,exercise dict)]
-        entries = []
-        if isinstance(data, dict):
-            for day, arr in data.items():
-                if isinstance(arr, list):
-                    for it in arr:
-                        if isinstance(it, dict):
-                            entries.append((day, it))
-        elif isinstance(data, list):
-            for i, arr in enumerate(data, start=1):
-                day = f"Day {i}"
-                if isinstance(arr, list):
-                    for it in arr:
-                        if isinstance(it, dict):
-                            entries.append((day, it))
-
-        if fmt == "html":
-            rows = []
-            for day, it in entries:
-                title = it.get("name") or it.get("exercise") or "Exercise"
-                mp = it.get("movement_pattern") or ""
-                sets = it.get("sets") or ""
-                reps = it.get("reps") or ""
-                rest = it.get("rest_s") or it.get("rest") or ""
-                notes = it.get("notes") or ""
-                rows.append(f"<tr><td>{day}</td><td>{title}</td><td>{mp}</td><td>{sets}</td><td>{reps}</td><td>{rest}</td><td>{notes}</td></tr>")
-            html = (
-                f"<!doctype html><html><head><meta charset='utf-8'><title>{name}</title>"
-                "<style>body{font-family:system-ui,Arial;padding:16px}table{border-collapse:collapse;width:100%}td,th{border:1px solid #e5e7eb;padding:6px;font-size:12px}th{background:#f8fafc}</style>" 
-                f"</head><body><h1>{name}</h1><table><thead><tr><th>Day</th><th>Exercise</th><th>Pattern</th><th>Sets</th><th>Reps</th><th>Rest(s)</th><th>Notes</th></tr></thead><tbody>{''.join(rows)}</tbody></table></body></html>"
-            )
-            resp = Response(html)
-            resp["Content-Type"] = "text/html; charset=utf-8"
-            return resp
-
-        # CSV default
-        buf = StringIO()
-        w = _csv.writer(buf)
-        w.writerow(["Day", "Exercise", "Movement Pattern", "Sets", "Reps", "Rest (s)", "Notes", "Equipment"])
-        for day, it in entries:
-            w.writerow([
-                day,
-                it.get("name") or it.get("exercise") or "Exercise",
-                it.get("movement_pattern") or "",
-                it.get("sets") or "",
-                it.get("reps") or "",
-                it.get("rest_s") or it.get("rest") or "",
-                it.get("notes") or "",
-                it.get("equipment") or "",
-            ])
-        resp = Response(buf.getvalue())
-        resp["Content-Type"] = "text/csv; charset=utf-8"
-        resp["Content-Disposition"] = f"attachment; filename={name}.csv"
+        content_type, ext = export.FORMATS[fmt]
+        # Rows are generated lazily; the first bytes go out before the block is fully rendered
+        resp = StreamingHttpResponse(export.iter_export(block.expanded_block() or {}, fmt, name), content_type=content_type)
+        if fmt != "html":
+            resp["Content-Disposition"] = f"attachment; filename={name}.{ext}"
         return resp
 
-    @action(detail=True, methods=["post"], url_path=r"blocks/(?P<block_id>[^/.]+)/next")
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="blocks/archive",
+        content_negotiation_class=ExportNegotiation,
+    )
+    def block_archive(self, request, pk=None):
+        """Stream a zip of every block for this client, one file per block."""
+        client = get_object_or_404(Client, pk=pk, user=request.user)
+        blocks = client.blocks.order_by("created_at")
+        return _archive_response(request, blocks, f"{_slug(str(client))}_blocks")
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="archive",
+        content_negotiation_class=ExportNegotiation,
+    )
+    def coach_archive(self, request):
+        """Stream a zip of every block across the coach's active clients, one folder per client."""
+        blocks = (
+            ClientBlock.objects.filter(client__user=request.user, client__archived=False)
+            .select_related("client")
+            .order_by("client_id", "created_at")
+        )
+        return _archive_response(request, blocks, "clients_blocks", per_client=True)
+
+    @action(detail=True, methods=["post"], url_path=rf"blocks/(?P<block_id>{BLOCK_ID})/next")
     def block_next(self, request, pk=None, block_id=None):
-        client = get_object_or_404(Client, pk=pk)
+        client = get_object_or_404(Client, pk=pk, user=request.user)
         block = get_object_or_404(ClientBlock, pk=block_id, client=client)
         name = (request.data or {}).get("name") or f"Next of {block.name or block.id}"
-        data = block.block
-        def bump(x):
-            try:
-                return max(2, min(6, int(x) + 1))
-            except Exception:
-                return x
-        # Shallow copy and bump first 2 items per day
-        new_block = {}
-        if isinstance(data, dict):
-            for day, arr in data.items():
-                if isinstance(arr, list):
-                    bumped = []
-                    cnt = 0
-                    for it in arr:
-                        it2 = dict(it)
-                        if cnt < 2 and isinstance(it2.get("sets"), (int, float)):
-                            it2["sets"] = bump(it2.get("sets"))
-                            cnt += 1
-                        bumped.append(it2)
-                    new_block[day] = bumped
-        elif isinstance(data, list):
-            new_block = []
-            for arr in data:
-                if isinstance(arr, list):
-                    bumped = []
-                    cnt = 0
-                    for it in arr:
-                        it2 = dict(it)
-                        if cnt < 2 and isinstance(it2.get("sets"), (int, float)):
-                            it2["sets"] = bump(it2.get("sets"))
-                            cnt += 1
-                        bumped.append(it2)
-                    new_block.append(bumped)
+        new_block, _ = progress_block(block.expanded_block(), ProgressionScheme())
         cb = ClientBlock.objects.create(client=client, name=name, block=new_block)
         return Response(ClientBlockSerializer(cb).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"], url_path=rf"blocks/(?P<block_id>{BLOCK_ID})/progress")
+    def block_progress(self, request, pk=None, block_id=None):
+        """
+        Create the next ``?steps=N`` blocks in one call. Progressions are computed in memory from
+        this block and inserted with a single bulk_create. The body may override ProgressionScheme
+        fields (sets_step, reps_step, rest_step_s, deload_every, ...) and set a base "name".
+        Each returned block lists the per-item field changes from its predecessor.
+        """
+        client = get_object_or_404(Client, pk=pk, user=request.user)
+        block = get_object_or_404(ClientBlock, pk=block_id, client=client)
+        body = request.data if isinstance(request.data, dict) else {}
+        max_steps = getattr(settings, "BLOCK_PROGRESS_MAX_STEPS", 24)
+        try:
+            steps = _strict_int(request.query_params.get("steps") or body.get("steps") or 1)
+        except (TypeError, ValueError):
+            return Response({"detail": "Invalid steps."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            scheme = ProgressionScheme.from_params(body)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= steps <= max_steps:
+            return Response({"detail": f"steps must be between 1 and {max_steps}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        base_name = body.get("name") or block.name or f"Block {block.id}"
+        results = progress_many(block.expanded_block(), scheme, steps)
+        now = timezone.now()
+        new_blocks = []
+        for i, res in enumerate(results, start=1):
+            cb = ClientBlock(
+                client=client,
+                name=f"{base_name} +{i}" + (" (deload)" if res["deload"] else ""),
+                block=res["block"],
+                # Distinct timestamps keep the sequence ordered in created_at listings
+                created_at=now + timedelta(microseconds=i),
+            )
+            cb.refresh_summary()  # bulk_create bypasses save()
+            new_blocks.append(cb)
+        with transaction.atomic():
+            compact_instances(new_blocks)
+            ClientBlock.objects.bulk_create(new_blocks)
+            record_blocks_created(client, new_blocks)
+
+        data = []
+        for cb, res in zip(new_blocks, results):
+            row = ClientBlockSerializer(cb).data
+            row["deload"] = res["deload"]
+            row["changes"] = res["changes"]
+            data.append(row)
+        return Response({"source": str(block.id), "steps": steps, "blocks": data}, status=status.HTTP_201_CREATED)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-based pagination on (ordering_field, id), created_at by default. Each page is a range scan
+    starting after the last row of the previous page, so deep pages cost the same as the first one.
+    Responses carry an opaque ``next`` cursor instead of page numbers. The total is only
+    computed on request (``?with_count=1``), since COUNT(*) is the one part that grows with the table.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    descending = True  # newest first; set False for chronological feeds such as chat messages
+    ordering_field = "created_at"  # a timestamp; back it with an index on (field, id)
+
+    def _limit(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param) or self.page_size)
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def encode_cursor(value, pk) -> str:
+        raw = json.dumps([value.isoformat(), str(pk)]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(token: str, model):
+        """(timestamp, pk) from a cursor, with pk converted for ``model``; NotFound if malformed."""
+        from django.utils.dateparse import parse_datetime
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            ts, pk = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+            dt = parse_datetime(ts)
+            pk = model._meta.pk.to_python(pk)
+        except (ValueError, TypeError, ValidationError):
+            dt = None
+        if dt is None:
+            raise NotFound("Invalid cursor.")
+        return dt, pk
+
+    def paginate_queryset(self, queryset, request, view=None) -> Optional[List[Any]]:
+        self.request = request
+        limit = self._limit(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param) in {"1", "true", "True"}:
+            self.count = queryset.count()
+        field = self.ordering_field
+        if self.descending:
+            qs = queryset.order_by(f"-{field}", "-pk")
+        else:
+            qs = queryset.order_by(field, "pk")
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            ts, pk = self.decode_cursor(token, queryset.model)
+            op = "lt" if self.descending else "gt"
+            qs = qs.filter(Q(**{f"{field}__{op}": ts}) | Q(**{field: ts, f"pk__{op}": pk}))
+        rows = list(qs[: limit + 1])
+        self.has_next = len(rows) > limit
+        rows = rows[:limit]
+        self.next_cursor = self.encode_cursor(getattr(rows[-1], field), rows[-1].pk) if self.has_next else None
+        return rows
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data) -> Response:
+        body = {"next": self.get_next_link(), "results": data}
+        if self.count is not None:
+            body["count"] = self.count
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer", "description": "Only present with ?with_count=1"},
+                "results": schema,
+            },
+        }
+
+
+class ChronologicalKeysetPagination(KeysetPagination):
+    """Oldest first, for feeds read in order such as consult messages."""
+
+    descending = False
+
+
+class RecentlyUpdatedKeysetPagination(KeysetPagination):
+    """Most recently updated first, for listings whose natural order is freshness (coach directory)."""
+
+    ordering_field = "updated_at"
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
     'emails',
     'bookings',
     'workouts',
+    'progress.apps.ProgressConfig',
     'templates',
     'rules',
 ]
@@ -99,6 +101,32 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# Shared by every worker when it points at Redis, the database or a common directory; the LLM
+# circuit breaker and block diffs live here. CACHE_URL: redis://host:6379/0, db://table_name or
+# file:///path. Unset keeps the per-process LocMemCache (runserver, tests); settings_prod falls
+# back to the database cache instead.
+
+
+def cache_from_url(url):
+    from urllib.parse import urlparse
+
+    u = urlparse(url)
+    if u.scheme in ("redis", "rediss"):
+        return {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": url}
+    if u.scheme == "db":
+        return {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": u.netloc or "django_cache"}
+    if u.scheme == "file":
+        return {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": u.path}
+    if u.scheme in ("", "locmem"):
+        return {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    raise ValueError(f"Unsupported CACHE_URL scheme: {u.scheme}")
+
+
+CACHES = {"default": cache_from_url(os.environ.get("CACHE_URL", ""))}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,7 +157,6 @@ USE_I18N = True
 
 USE_TZ = True
 
-import os
 _jwt_key = os.environ.get("JWT_TEST_PRIVATE_KEY")
 if not _jwt_key:
     try:
@@ -168,6 +195,8 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    # Cursor pages on (created_at, id): {"next", "results"}, plus "count" with ?with_count=1
+    'DEFAULT_PAGINATION_CLASS': 'coachapp.pagination.KeysetPagination',
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.ScopedRateThrottle',
         'rest_framework.throttling.AnonRateThrottle',
@@ -195,8 +224,104 @@ DEFAULT_FROM_EMAIL = 'no-reply@localhost'
 # Feature flags
 CONSULTS_REQUIRE_PREMIUM = False  # set True in production to gate by 'premium' user group
 
+# Bulk client import (/api/clients/import/)
+CLIENT_IMPORT_MAX_ROWS = int(os.environ.get("CLIENT_IMPORT_MAX_ROWS", "5000"))
+CLIENT_IMPORT_BATCH_SIZE = 500
+
+# Max blocks generated by one /blocks/<id>/progress call
+BLOCK_PROGRESS_MAX_STEPS = 24
+
+# ClientBlock JSON storage: "inline" keeps full item dicts; "compact" stores shared item
+# payloads once in BlockItem and keeps {"$ref": digest, sets/reps/...} in the block
+CLIENT_BLOCK_STORAGE = os.environ.get("CLIENT_BLOCK_STORAGE", "inline")
+
+# Block diffs are keyed on both blocks' updated_at, so edits never serve a stale diff
+BLOCK_DIFF_CACHE_TTL = 24 * 3600
+
+# Consult chat context: last N messages verbatim plus a rolling summary of older ones,
+# trimmed to a token budget (estimated locally, excludes the system prompt and tools)
+CONSULT_CONTEXT_TURNS = 12
+CONSULT_CONTEXT_TOKEN_BUDGET = 3000
+CONSULT_SUMMARY_MAX_TOKENS = 600
+
+# In-process LLM caches (per worker; 0 disables). Replies are keyed on model, temperature,
+# tool schema and the normalized message window; tool results on canonicalized arguments.
+# Hit rates: GET /api/consults/llm-cache/ (staff)
+LLM_RESPONSE_CACHE_TTL = int(os.environ.get("LLM_RESPONSE_CACHE_TTL", "600"))
+LLM_RESPONSE_CACHE_SIZE = 512
+LLM_TOOL_CACHE_TTL = 3600
+LLM_TOOL_CACHE_SIZE = 1024
+
+# Rendered client-profile prompt text is cached per profile fingerprint
+CLIENT_PROFILE_CONTEXT_TTL = 7 * 24 * 3600
+
 # OpenAI
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# OpenAI-compatible endpoint override (proxy, self-hosted or fake server); None uses the SDK default
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+
+# LLM provider for consults: "openai", "stub" (deterministic, offline; for load tests) or a
+# dotted path to a consults.providers.LLMProvider subclass. One pooled client per process.
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai")
+LLM_CHAT_MODEL = os.environ.get("LLM_CHAT_MODEL", "gpt-4o-mini")
+LLM_TRANSCRIBE_MODEL = os.environ.get("LLM_TRANSCRIBE_MODEL", "gpt-4o-transcribe")
+LLM_TTS_MODEL = os.environ.get("LLM_TTS_MODEL", "gpt-4o-mini-tts")
+LLM_TTS_VOICE = os.environ.get("LLM_TTS_VOICE", "alloy")
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "30"))
+LLM_STUB_LATENCY_MS = int(os.environ.get("LLM_STUB_LATENCY_MS", "0"))
+# Outbound LLM calls (chat, transcription, speech): LLM_TIMEOUT_S per attempt, LLM_DEADLINE_S
+# per call including retries, LLM_RETRIES retries on timeouts, connection errors, 429 and 5xx with
+# full-jitter exponential backoff. LLM_REQUEST_DEADLINE_S is one budget for every call a request
+# or turn makes (tool loops; voice transcription, reply and speech); keep it under the gunicorn
+# worker timeout
+LLM_DEADLINE_S = float(os.environ.get("LLM_DEADLINE_S", "45"))
+LLM_REQUEST_DEADLINE_S = float(os.environ.get("LLM_REQUEST_DEADLINE_S", "50"))
+LLM_RETRIES = 2
+LLM_RETRY_BACKOFF_S = 0.5
+LLM_RETRY_BACKOFF_MAX_S = 4
+# Circuit breaker per provider: LLM_BREAKER_THRESHOLD failed attempts within LLM_BREAKER_WINDOW_S
+# open it, and calls get a 503 for LLM_BREAKER_COOLDOWN_S. State lives in the default cache, so
+# it is only shared by all workers when CACHE_URL is set (see CACHES).
+LLM_BREAKER_THRESHOLD = 5
+LLM_BREAKER_WINDOW_S = 60
+LLM_BREAKER_COOLDOWN_S = 30
+# Chat routing: LLM_ROUTES lists "provider:model" targets (empty: LLM_PROVIDER + LLM_CHAT_MODEL),
+# ranked by rolling p50 latency over LLM_ROUTE_WINDOW_S once they have LLM_ROUTE_MIN_SAMPLES.
+# With LLM_HEDGE, a backup request goes to the runner-up after LLM_HEDGE_DELAY_MS (None: the
+# primary's rolling LLM_HEDGE_QUANTILE latency) and the first answer wins. At most
+# LLM_HEDGE_MAX_RATIO of requests hedge (bursts of LLM_HEDGE_BURST), none while all
+# LLM_HEDGE_WORKERS are busy, and a backup request gets LLM_HEDGE_LEG_TIMEOUT_S.
+LLM_ROUTES = [r for r in os.environ.get("LLM_ROUTES", "").split(",") if r]
+LLM_ROUTE_WINDOW_S = 300
+LLM_ROUTE_MIN_SAMPLES = 20
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_DELAY_MS = None
+LLM_HEDGE_QUANTILE = 0.95
+LLM_HEDGE_DEFAULT_DELAY_MS = 2000
+LLM_HEDGE_WORKERS = 8
+LLM_HEDGE_MAX_RATIO = 0.1
+LLM_HEDGE_BURST = 5
+LLM_HEDGE_LEG_TIMEOUT_S = 10
+# Pipelined voice replies (?tts=stream / ?tts=hls): sentences synthesized concurrently on
+# LLM_TTS_WORKERS threads; the first sentence is its own segment, later ones are packed up to
+# LLM_TTS_SEGMENT_MAX_CHARS. A reply has at most LLM_TTS_REQUEST_SEGMENTS segments queued or
+# running, so other replies' first sentences don't wait behind a long one
+LLM_TTS_WORKERS = 4
+LLM_TTS_REQUEST_SEGMENTS = 2
+LLM_TTS_SEGMENT_MAX_CHARS = 400
+# Voice-reply audio is cached in MEDIA_ROOT/tts by sha256(provider, voice, model, text); least
+# recently used files are evicted over LLM_TTS_CACHE_QUOTA_MB (on writes at most every
+# LLM_TTS_CACHE_SWEEP_S, or via `manage.py purge_tts_cache`). Files used within
+# LLM_TTS_URL_TTL_S are never evicted, so signed URLs stay valid until they expire.
+LLM_TTS_CACHE_QUOTA_MB = int(os.environ.get("LLM_TTS_CACHE_QUOTA_MB", "512"))
+LLM_TTS_CACHE_SWEEP_S = 300
+LLM_TTS_URL_TTL_S = 900
+# Voice uploads: rejected with 413 above this size (checked against Content-Length before the
+# body is parsed) or duration (WAV header, or the client's duration_s field)
+LLM_VOICE_MAX_BYTES = 25 * 1024 * 1024
+LLM_VOICE_MAX_SECONDS = 300
+# Tool calls returned together in one model message run concurrently on this many threads
+LLM_TOOL_WORKERS = 4
 
 # Optional Sentry integration (set SENTRY_DSN to enable)
 SENTRY_DSN = os.environ.get("SENTRY_DSN")
@@ -50,3 +50,7 @@ if db_url:
             'CONN_MAX_AGE': 60,
             'OPTIONS': {},
         }
+
+# Cache shared across gunicorn workers (LLM circuit breaker state): CACHE_URL=redis://host:6379/0,
+# else the database cache (created by `manage.py createcachetable` in deploy/entrypoint.sh)
+CACHES = {'default': cache_from_url(os.environ.get('CACHE_URL') or 'db://django_cache')}
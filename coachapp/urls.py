@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from coachapp.views_progress import ProgressView
+from coachapp.views_progress import ProgressSeriesView, ProgressView
 from .auth_views import (
     ThrottledTokenObtainPairView,
     ThrottledTokenRefreshView,
@@ -45,6 +45,7 @@ urlpatterns = [
     path('api/rules/', include('rules.urls')),
     path('api/emails/', include('emails.urls')),
     path('api/progress/', ProgressView.as_view(), name='progress'),
+    path('api/progress/series/', ProgressSeriesView.as_view(), name='progress-series'),
 ]
 
 
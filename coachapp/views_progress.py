@@ -1,49 +1,71 @@
 from __future__ import annotations
 
-from django.utils.timezone import now
+from datetime import date, timedelta
+
+from django.utils.timezone import localdate, now
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import permissions
+from rest_framework import permissions, status
 
-from clients.models import Client, ClientBlock
-from consults.models import Consult, Assessment
+from progress.counters import KINDS, recompute
+from progress.models import CoachCounters
+from progress.rollups import BUCKETS, series
 
 
 class ProgressView(APIView):
+    """Dashboard totals, read from the coach's materialized counters row (see progress.signals)."""
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-
-        clients_qs = Client.objects.filter(user=user, archived=False)
-        consults_qs = Consult.objects.filter(user=user)
-        blocks_qs = ClientBlock.objects.filter(client__user=user, client__archived=False)
-        assessments_qs = Assessment.objects.filter(consult__user=user)
-
-        def latest_dt(qs, field: str):
-            try:
-                return qs.order_by(f"-{field}").values_list(field, flat=True).first()
-            except Exception:
-                return None
+        counters = CoachCounters.objects.filter(user=request.user).first()
+        if counters is None:
+            # First visit (or the row was dropped): build it once from the raw tables
+            counters = recompute(request.user.pk)
 
+        # recompute() skips a coach whose delete is in progress: report nothing rather than fail
         data = {
-            "clients": {
-                "count": clients_qs.count(),
-                "last_updated": latest_dt(clients_qs, "updated_at"),
-            },
-            "consults": {
-                "count": consults_qs.count(),
-                "last_updated": latest_dt(consults_qs, "updated_at"),
-            },
-            "blocks": {
-                "count": blocks_qs.count(),
-                "last_updated": latest_dt(blocks_qs, "updated_at"),
-            },
-            "assessments": {
-                "count": assessments_qs.count(),
-                "last_updated": latest_dt(assessments_qs, "created_at"),
-            },
-            "generated_at": now(),
+            kind: {
+                "count": getattr(counters, kind, 0),
+                "last_updated": getattr(counters, f"{kind}_updated_at", None),
+            }
+            for kind in KINDS
         }
+        data["generated_at"] = now()
         return Response(data)
 
+
+class ProgressSeriesView(APIView):
+    """
+    Creation history for charts: GET /api/progress/series/?bucket=day|week|month&from=YYYY-MM-DD&to=YYYY-MM-DD.
+    Defaults to weekly buckets over the last year. Served from progress.DailyRollup with one range scan.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 3660
+
+    def get(self, request):
+        bucket = request.query_params.get("bucket") or "week"
+        if bucket not in BUCKETS:
+            return Response({"detail": f"bucket must be one of {', '.join(BUCKETS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        today = localdate()
+        try:
+            end = _parse_day(request.query_params.get("to")) or today
+            start = _parse_day(request.query_params.get("from")) or end - timedelta(days=365)
+        except ValueError:
+            return Response({"detail": "from/to must be YYYY-MM-DD dates."}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({"detail": "from must not be after to."}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days > self.max_days:
+            return Response({"detail": f"Range is limited to {self.max_days} days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "bucket": bucket,
+            "from": start,
+            "to": end,
+            "series": series(request.user.pk, bucket, start, end),
+        })
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    return date.fromisoformat(value)
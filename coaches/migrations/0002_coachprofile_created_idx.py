@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaches', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coachprofile',
+            index=models.Index(fields=['created_at', 'id'], name='coachprofile_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 07:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaches', '0002_coachprofile_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='coachprofile',
+            name='coachprofile_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='coachprofile',
+            index=models.Index(fields=['updated_at', 'id'], name='coachprofile_updated_idx'),
+        ),
+    ]
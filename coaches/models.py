@@ -25,6 +25,10 @@ class CoachProfile(models.Model):
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            # Directory pages: ORDER BY updated_at DESC, id DESC (keyset pagination)
+            models.Index(fields=["updated_at", "id"], name="coachprofile_updated_idx"),
+        ]
 
     def __str__(self) -> str:
         name = self.user.get_full_name().strip() or self.user.email
@@ -7,6 +7,8 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from coachapp.pagination import RecentlyUpdatedKeysetPagination
+
 from .models import CoachProfile
 from .serializers import CoachProfileSerializer
 
@@ -14,6 +16,8 @@ from .serializers import CoachProfileSerializer
 class CoachProfileViewSet(viewsets.ModelViewSet):
     serializer_class = CoachProfileSerializer
     queryset = CoachProfile.objects.select_related("user").all()
+    # Keep the directory's Meta.ordering (-updated_at) rather than the default created_at cursor
+    pagination_class = RecentlyUpdatedKeysetPagination
 
     def get_permissions(self) -> Iterable[permissions.BasePermission]:
         if self.request.method in permissions.SAFE_METHODS:
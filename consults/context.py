@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import math
+import re
+from typing import Dict, List, Optional, Sequence
+
+from django.conf import settings
+
+from .models import Consult, Message
+
+
+# Chat formats add a few tokens per message for role and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_SNIPPET_CHARS = 200
+# Older summary lines are shortened down to this before any line is dropped
+SUMMARY_MIN_SNIPPET_CHARS = 40
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Offline estimate for BPE tokenizers (cl100k/o200k): about four characters per token for
+    prose, but never fewer tokens than words plus punctuation marks. Errs on the high side.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), len(_PIECE_RE.findall(text)))
+
+
+def message_tokens(msg: Dict[str, str]) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(msg.get("content"))
+
+
+def _settings():
+    return (
+        int(getattr(settings, "CONSULT_CONTEXT_TURNS", 12)),
+        int(getattr(settings, "CONSULT_CONTEXT_TOKEN_BUDGET", 3000)),
+        int(getattr(settings, "CONSULT_SUMMARY_MAX_TOKENS", 600)),
+    )
+
+
+def _snippet(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def summary_line(m: Message) -> str:
+    return f"- {m.role}: {_snippet(_WS_RE.sub(' ', m.text or '').strip(), SUMMARY_SNIPPET_CHARS)}"
+
+
+def _shorten_line(line: str, limit: int) -> str:
+    head, sep, text = line.partition(": ")
+    return f"{head}{sep}{_snippet(text, limit)}" if sep else _snippet(line, limit)
+
+
+def fold_summary(summary: str, messages: Sequence[Message], max_tokens: int) -> str:
+    """
+    Append one line per folded message and compress to fit ``max_tokens``: all but the newest
+    line are cut to half length, repeatedly, down to SUMMARY_MIN_SNIPPET_CHARS; only then are
+    lines dropped, from the middle, so the consult's opening (goals, injuries) and its latest
+    turns stay in the summary.
+    """
+    lines = [ln for ln in (summary or "").splitlines() if ln.strip()]
+    lines.extend(summary_line(m) for m in messages)
+
+    def over() -> bool:
+        return estimate_tokens("\n".join(lines)) > max_tokens
+
+    limit = SUMMARY_SNIPPET_CHARS
+    while over() and limit > SUMMARY_MIN_SNIPPET_CHARS:
+        limit = max(SUMMARY_MIN_SNIPPET_CHARS, limit // 2)
+        lines = [_shorten_line(ln, limit) for ln in lines[:-1]] + lines[-1:]
+    while over() and len(lines) > 2:
+        del lines[len(lines) // 2]
+    if over():
+        lines = [_shorten_line(ln, SUMMARY_MIN_SNIPPET_CHARS) for ln in lines]
+    return "\n".join(lines)
+
+
+def build_context(consult: Consult, prefix: Sequence[Dict[str, str]] = ()) -> List[Dict[str, str]]:
+    """
+    Chat history for the next model call: ``prefix`` (e.g. profile context), the consult's rolling
+    summary of older turns, then the most recent turns verbatim. At most CONSULT_CONTEXT_TURNS
+    messages are read and kept, trimmed oldest first to CONSULT_CONTEXT_TOKEN_BUDGET. Messages that
+    leave the window are folded into Consult.context_summary, which is capped at
+    CONSULT_SUMMARY_MAX_TOKENS, so each turn reads a bounded number of rows.
+    """
+    turns, budget, summary_budget = _settings()
+    prefix = list(prefix)
+    upto = consult.context_summary_upto or 0
+
+    recent = list(consult.messages.filter(id__gt=upto).order_by("-id")[:turns])
+    remaining = budget - summary_budget - sum(message_tokens(m) for m in prefix)
+    window: List[Message] = []
+    for m in recent:  # newest first
+        cost = message_tokens({"content": m.text})
+        if window and cost > remaining:
+            break
+        window.append(m)
+        remaining -= cost
+    window.reverse()
+
+    # Everything after the previous fold point and before the window moves into the summary.
+    # A short read that fit entirely means there is nothing older left to fold.
+    if window and (len(recent) == turns or len(window) < len(recent)):
+        folded = list(consult.messages.filter(id__gt=upto, id__lt=window[0].id).order_by("id"))
+        if folded:
+            summary = fold_summary(consult.context_summary, folded, summary_budget)
+            # Conditional on the fold point so concurrent turns never fold the same rows twice
+            if Consult.objects.filter(pk=consult.pk, context_summary_upto=consult.context_summary_upto).update(
+                context_summary=summary, context_summary_upto=folded[-1].id,
+            ):
+                consult.context_summary, consult.context_summary_upto = summary, folded[-1].id
+
+    out = prefix
+    if consult.context_summary:
+        out.append({"role": "system", "content": "Earlier in this consult:\n" + consult.context_summary})
+    out.extend({"role": m.role, "content": m.text} for m in window)
+    return out
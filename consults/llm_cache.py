@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+class TTLCache:
+    """
+    Process-local LRU cache with per-entry expiry. Entries carry the latency (and tokens) the
+    original call cost, so hits can report what they saved. Values are deep-copied in and out.
+    """
+
+    def __init__(self, name: str, ttl_setting: str, size_setting: str, default_ttl: int, default_size: int):
+        self.name = name
+        self._ttl_setting, self._size_setting = ttl_setting, size_setting
+        self._default_ttl, self._default_size = default_ttl, default_size
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def ttl(self) -> int:
+        return int(getattr(settings, self._ttl_setting, self._default_ttl))
+
+    @property
+    def maxsize(self) -> int:
+        return int(getattr(settings, self._size_setting, self._default_size))
+
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def reset_stats(self) -> None:
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "saved_ms": 0.0, "saved_tokens": 0}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.reset_stats()
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled():
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += entry[2]
+            self.stats["saved_tokens"] += entry[3]
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, cost_ms: float = 0.0, tokens: int = 0) -> None:
+        if not self.enabled():
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value, cost_ms, tokens)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.stats)
+            size = len(self._data)
+        lookups = s["hits"] + s["misses"]
+        return {
+            **s,
+            "saved_ms": round(s["saved_ms"], 1),
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hit_rate": round(s["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+RESPONSE_CACHE = TTLCache("responses", "LLM_RESPONSE_CACHE_TTL", "LLM_RESPONSE_CACHE_SIZE", 600, 512)
+TOOL_CACHE = TTLCache("tools", "LLM_TOOL_CACHE_TTL", "LLM_TOOL_CACHE_SIZE", 3600, 1024)
+
+
+def _digest(payload: Any) -> str:
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _norm_text(text: Any) -> Any:
+    return _WS_RE.sub(" ", text).strip().casefold() if isinstance(text, str) else text
+
+
+def response_key(model: str, temperature: float, tools: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> str:
+    """Hash of everything that shapes a reply; message text is whitespace- and case-normalized."""
+    window = [{"role": m.get("role"), "content": _norm_text(m.get("content"))} for m in messages]
+    return _digest({"model": model, "temperature": temperature, "tools": tools, "messages": window})
+
+
+def _canon(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {k: _canon(v) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_canon(v) for v in value]
+        # Equipment and muscle lists are sets; order does not change the generated plan
+        return sorted(items, key=str.casefold) if all(isinstance(v, str) for v in items) else items
+    return value
+
+
+def tool_key(name: str, arguments: Dict[str, Any]) -> str:
+    return _digest({"tool": name, "arguments": _canon(arguments or {})})
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit rates and savings for this worker process."""
+    return {c.name: c.snapshot() for c in (RESPONSE_CACHE, TOOL_CACHE)}
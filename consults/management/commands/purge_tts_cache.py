@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from consults.tts import cache_usage, enforce_quota
+
+
+class Command(BaseCommand):
+    help = (
+        "Evict least recently used voice-reply audio from MEDIA_ROOT/tts until it fits the quota "
+        "(LLM_TTS_CACHE_QUOTA_MB). Files used within LLM_TTS_URL_TTL_S are kept so outstanding "
+        "signed URLs keep working. Run from cron; writes also sweep every LLM_TTS_CACHE_SWEEP_S."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quota-mb", type=float, help="Override LLM_TTS_CACHE_QUOTA_MB")
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be evicted")
+
+    def handle(self, *args, **options):
+        quota = options.get("quota_mb")
+        files, total = cache_usage()
+        result = enforce_quota(int(quota * 1024 * 1024) if quota is not None else None, dry_run=options["dry_run"])
+        verb = "Would evict" if options["dry_run"] else "Evicted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['evicted']} of {files} file(s), {result['freed_bytes']} of {total} bytes; "
+            f"{result['remaining_bytes']} bytes remain."
+        ))
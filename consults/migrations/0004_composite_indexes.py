@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0010_composite_indexes'),
+        ('consults', '0003_consult_client'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consult',
+            index=models.Index(fields=['user', 'created_at'], name='consult_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consult',
+            index=models.Index(fields=['user', 'client'], name='consult_user_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['consult', 'created_at'], name='message_consult_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consults', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consult',
+            name='context_summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='consult',
+            name='context_summary_upto',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
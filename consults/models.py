@@ -16,6 +16,17 @@ class Consult(models.Model):
     use_llm = models.BooleanField(default=False)
     # Link to a Client for context-aware chats (optional)
     client = models.ForeignKey('clients.Client', null=True, blank=True, on_delete=models.SET_NULL, related_name='consults')
+    # Rolling summary of turns that fell out of the chat context window (see consults.context)
+    context_summary = models.TextField(blank=True, default="")
+    context_summary_upto = models.BigIntegerField(null=True, blank=True)  # last Message id folded in
+
+    class Meta:
+        indexes = [
+            # Consult list: WHERE user_id = ? ORDER BY created_at DESC
+            models.Index(fields=["user", "created_at"], name="consult_user_created_idx"),
+            # Consult list filtered by ?client_id=
+            models.Index(fields=["user", "client"], name="consult_user_client_idx"),
+        ]
 
     def __str__(self):
         return self.title or f"Consult {self.pk}"
@@ -51,3 +62,7 @@ class Message(models.Model):
 
     class Meta:
         ordering = ("created_at",)
+        indexes = [
+            # Chat history: WHERE consult_id = ? ORDER BY created_at
+            models.Index(fields=["consult", "created_at"], name="message_consult_created_idx"),
+        ]
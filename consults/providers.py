@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ProviderUnavailable(Exception):
+    """The provider cannot serve requests (SDK missing, key not configured, ...)."""
+
+
+def chat_model() -> str:
+    return getattr(settings, "LLM_CHAT_MODEL", "gpt-4o-mini")
+
+
+def transcribe_model() -> str:
+    return getattr(settings, "LLM_TRANSCRIBE_MODEL", "gpt-4o-transcribe")
+
+
+def tts_model() -> str:
+    return getattr(settings, "LLM_TTS_MODEL", "gpt-4o-mini-tts")
+
+
+def tts_voice() -> str:
+    return getattr(settings, "LLM_TTS_VOICE", "alloy")
+
+
+class LLMProvider:
+    """
+    Backend for consult chat, transcription and speech. Chat responses use the OpenAI
+    chat.completions JSON shape as plain dicts, whatever the backend. ``timeout`` is the
+    per-attempt limit in seconds set by consults.resilience; backends must not retry on their own.
+    """
+
+    name = "base"
+
+    def ensure_ready(self) -> None:
+        """Raise ProviderUnavailable if requests cannot be served."""
+
+    def chat(self, messages: List[Dict[str, Any]], *, model: str, tools: List[Dict[str, Any]],
+             temperature: float, timeout: Optional[float] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def chat_stream(self, messages: List[Dict[str, Any]], *, model: str, tools: List[Dict[str, Any]],
+                    temperature: float, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yield chat.completion.chunk dicts."""
+        raise NotImplementedError
+
+    def transcribe(self, audio, *, model: str, timeout: Optional[float] = None) -> str:
+        """``audio`` is an UploadedFile (or any named file object), positioned at the start."""
+        raise NotImplementedError
+
+    def speech(self, text: str, *, model: str, voice: str, timeout: Optional[float] = None) -> bytes:
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    OpenAI (or any OpenAI-compatible endpoint via OPENAI_BASE_URL). One SDK client per process,
+    so the underlying HTTP connection pool and keep-alive connections are shared by all requests.
+    """
+
+    name = "openai"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_conf = None
+
+    def _conf(self):
+        return (
+            getattr(settings, "OPENAI_API_KEY", None),
+            getattr(settings, "OPENAI_BASE_URL", None),
+            float(getattr(settings, "LLM_TIMEOUT_S", 30)),
+        )
+
+    def ensure_ready(self) -> None:
+        if not getattr(settings, "OPENAI_API_KEY", None):
+            raise ProviderUnavailable("OpenAI API key not configured.")
+
+    def client(self):
+        self.ensure_ready()
+        conf = self._conf()
+        with self._lock:
+            if self._client is None or self._client_conf != conf:
+                try:
+                    from openai import OpenAI  # type: ignore
+                except Exception as e:  # pragma: no cover
+                    raise ProviderUnavailable(f"AI unavailable: {e}")
+                api_key, base_url, timeout = conf
+                # The SDK keeps a pooled HTTP client per instance; reusing the instance reuses connections.
+                # Retries belong to consults.resilience, so the SDK's own are off.
+                self._client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+                self._client_conf = conf
+            return self._client
+
+    def _api(self, timeout: Optional[float]):
+        client = self.client()
+        # with_options copies the client but shares its HTTP connection pool
+        return client.with_options(timeout=timeout) if timeout else client
+
+    def chat(self, messages, *, model, tools, temperature, timeout=None):
+        resp = self._api(timeout).chat.completions.create(model=model, messages=messages, tools=tools, temperature=temperature)
+        return resp.model_dump()  # type: ignore
+
+    def chat_stream(self, messages, *, model, tools, temperature, timeout=None):
+        stream = self._api(timeout).chat.completions.create(
+            model=model, messages=messages, tools=tools, temperature=temperature, stream=True,
+        )
+        for chunk in stream:
+            yield chunk.model_dump() if hasattr(chunk, "model_dump") else chunk
+
+    def transcribe(self, audio, *, model, timeout=None):
+        # (filename, file object, content type): the SDK streams the underlying file (Django's
+        # spooled temp file or in-memory buffer) into the request body, and the filename tells
+        # the API the container format
+        upload = (
+            getattr(audio, "name", None) or "audio.webm",
+            getattr(audio, "file", audio),
+            getattr(audio, "content_type", None) or "application/octet-stream",
+        )
+        resp = self._api(timeout).audio.transcriptions.create(model=model, file=upload)
+        return getattr(resp, "text", None) or (resp.get("text") if isinstance(resp, dict) else None) or ""
+
+    def speech(self, text, *, model, voice, timeout=None):
+        speech = self._api(timeout).audio.speech.create(model=model, voice=voice, input=text, response_format="mp3")
+        audio_bytes = getattr(speech, "content", None)
+        if not audio_bytes and hasattr(speech, "to_bytes"):
+            audio_bytes = speech.to_bytes()  # type: ignore
+        return bytes(audio_bytes or b"")
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic offline backend for load tests and local development. Replies depend only on
+    the request: messages mentioning a program, session/workout or meal plan trigger the matching
+    tool once, everything else gets an echo reply. LLM_STUB_LATENCY_MS adds a fixed delay per call;
+    a delay longer than the call's timeout raises TimeoutError after waiting out the timeout.
+    """
+
+    name = "stub"
+    TOOL_TRIGGERS = (
+        ("meal", "generate_meal_plan", {"days": 1}),
+        ("program", "generate_training_program",
+         {"weeks": 4, "days_per_week": 3, "goal": "General Fitness", "duration_min": 45, "fitness_level": "Beginner"}),
+        ("session", "generate_training_session", {"goal": "General Fitness", "duration_min": 45, "fitness_level": "Beginner"}),
+        ("workout", "generate_training_session", {"goal": "General Fitness", "duration_min": 45, "fitness_level": "Beginner"}),
+    )
+
+    def _latency_ms(self) -> float:
+        return float(getattr(settings, "LLM_STUB_LATENCY_MS", 0) or 0)
+
+    def _delay(self, timeout: Optional[float] = None) -> None:
+        seconds = self._latency_ms() / 1000.0
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"stub call exceeded {timeout:.3f}s")
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _digest(payload: Any) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _message(self, messages, tools) -> Dict[str, Any]:
+        last = messages[-1] if messages else {}
+        if last.get("role") == "tool":
+            names = [m.get("name") for m in messages if m.get("role") == "tool"]
+            return {"role": "assistant", "content": f"Stub reply: ran {', '.join(n for n in names if n)}."}
+        text = str(last.get("content") or "")
+        if tools:
+            offered = {t["function"]["name"] for t in tools}
+            for word, name, args in self.TOOL_TRIGGERS:
+                if word in text.lower() and name in offered:
+                    call_id = "call_" + self._digest([text, name])[:12]
+                    return {"role": "assistant", "content": None, "tool_calls": [
+                        {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}},
+                    ]}
+        return {"role": "assistant", "content": f"Stub reply ({self._digest(messages)[:8]}): {text[:80]}"}
+
+    def chat(self, messages, *, model, tools, temperature, timeout=None):
+        from .context import estimate_tokens
+
+        self._delay(timeout)
+        message = self._message(messages, tools)
+        prompt = sum(estimate_tokens(str(m.get("content") or "")) for m in messages)
+        completion = estimate_tokens(message.get("content") or "")
+        return {
+            "id": "stub-" + self._digest(messages)[:12],
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion},
+        }
+
+    def chat_stream(self, messages, *, model, tools, temperature, timeout=None):
+        self._delay(timeout)
+        message = self._message(messages, tools)
+        if message.get("tool_calls"):
+            deltas = [{"role": "assistant", "tool_calls": [{"index": i, **tc} for i, tc in enumerate(message["tool_calls"])]}]
+        else:
+            words = message["content"].split(" ")
+            deltas = [{"content": w if i == 0 else " " + w} for i, w in enumerate(words)]
+        for delta in deltas:
+            yield {"object": "chat.completion.chunk", "model": model,
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+
+    def transcribe(self, audio, *, model, timeout=None):
+        self._delay(timeout)
+        size = getattr(audio, "size", None)
+        if size is None and hasattr(audio, "read"):
+            size = len(audio.read())
+        return f"Stub transcript of {size or 0} bytes."
+
+    def speech(self, text, *, model, voice, timeout=None):
+        self._delay(timeout)
+        # Not playable audio; stable bytes per (voice, text) for pipeline and cache tests
+        return b"ID3STUB" + hashlib.sha256(f"{voice}:{text}".encode("utf-8")).digest()
+
+
+PROVIDERS = {"openai": OpenAIProvider, "stub": StubProvider}
+
+_instances: Dict[str, LLMProvider] = {}
+_instances_lock = threading.Lock()
+
+
+def get_provider(name: Optional[str] = None) -> LLMProvider:
+    """
+    Process-wide provider instance for ``name`` (default LLM_PROVIDER). Names are keys of
+    PROVIDERS or dotted paths to an LLMProvider subclass.
+    """
+    name = name or getattr(settings, "LLM_PROVIDER", "openai")
+    with _instances_lock:
+        provider = _instances.get(name)
+        if provider is None:
+            cls = PROVIDERS.get(name) or import_string(name)
+            provider = _instances[name] = cls()
+        return provider
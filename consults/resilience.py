@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .providers import ProviderUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another attempt; other 4xx mean the request itself is wrong
+TRANSIENT_STATUSES = (408, 409, 429)
+
+
+class LLMDegraded(Exception):
+    """The provider is failing or its breaker is open. Views answer 503 with Retry-After."""
+
+    def __init__(self, detail: str, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+def _setting(name: str, default: float) -> float:
+    return float(getattr(settings, name, default))
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Timeouts, connection errors, 429 and 5xx. Works on SDK errors without importing the SDK."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUSES or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    ceiling = min(_setting("LLM_RETRY_BACKOFF_MAX_S", 4), _setting("LLM_RETRY_BACKOFF_S", 0.5) * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Per-provider breaker with its state in the Django cache, so every worker sharing the cache
+    backend trips and recovers together (LocMemCache only covers one process).
+
+    Closed: failed attempts are counted in a LLM_BREAKER_WINDOW_S window; LLM_BREAKER_THRESHOLD
+    of them open the breaker. Open: calls fail fast for LLM_BREAKER_COOLDOWN_S. Half-open: after
+    the cooldown a single caller (across workers) gets to probe; success closes, failure reopens.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _key(self, part: str) -> str:
+        return f"llm-breaker:{self.name}:{part}"
+
+    def _open_until(self) -> Optional[float]:
+        return cache.get(self._key("open_until"))
+
+    def state(self) -> str:
+        until = self._open_until()
+        if until is None:
+            return "closed"
+        return "open" if until > time.time() else "half-open"
+
+    def is_open(self) -> bool:
+        """True while cooling down. Does not claim the half-open probe."""
+        return self.state() == "open"
+
+    def retry_after(self) -> int:
+        until = self._open_until()
+        return max(1, int((until or 0) - time.time()) + 1)
+
+    def allow(self) -> bool:
+        until = self._open_until()
+        if until is None:
+            return True
+        if until > time.time():
+            return False
+        return cache.add(self._key("probe"), 1, timeout=int(_setting("LLM_DEADLINE_S", 45)) + 1)
+
+    def record_success(self) -> None:
+        keys = [self._key("failures"), self._key("open_until")]
+        if not any(cache.get_many(keys).values()):
+            return  # already closed with a clean window: skip the write on the hot path
+        cache.delete_many(keys + [self._key("probe")])
+
+    def record_failure(self) -> None:
+        cooldown = _setting("LLM_BREAKER_COOLDOWN_S", 30)
+        if self._open_until() is not None:
+            # A failed half-open probe: back to open for another cooldown
+            self._trip(cooldown)
+            return
+        key = self._key("failures")
+        cache.add(key, 0, timeout=int(_setting("LLM_BREAKER_WINDOW_S", 60)))
+        try:
+            failures = cache.incr(key)
+        except ValueError:  # window expired between add and incr
+            cache.set(key, 1, timeout=int(_setting("LLM_BREAKER_WINDOW_S", 60)))
+            failures = 1
+        if failures >= _setting("LLM_BREAKER_THRESHOLD", 5):
+            self._trip(cooldown)
+
+    def _trip(self, cooldown: float) -> None:
+        logger.warning("LLM circuit breaker for %s open for %ss", self.name, cooldown)
+        cache.set(self._key("open_until"), time.time() + cooldown, timeout=None)
+        cache.delete_many([self._key("failures"), self._key("probe")])
+
+
+def breaker_for(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name)
+
+
+def _degraded(breaker: CircuitBreaker, op: str, cause: Optional[BaseException] = None) -> LLMDegraded:
+    if cause is None:
+        detail = f"AI service is temporarily unavailable ({op}); please retry shortly."
+        return LLMDegraded(detail, retry_after=breaker.retry_after())
+    detail = f"AI service failed ({op}): {cause}"
+    return LLMDegraded(detail, retry_after=breaker.retry_after() if breaker.is_open() else None)
+
+
+def request_deadline() -> float:
+    """
+    time.monotonic() deadline for one request or turn (LLM_REQUEST_DEADLINE_S from now). Pass it
+    to every call() the request makes, so retries and follow-up calls share one budget.
+    """
+    return time.monotonic() + _setting("LLM_REQUEST_DEADLINE_S", 50)
+
+
+def call(name: str, fn: Callable[[float], Any], *, op: str, deadline: Optional[float] = None,
+         cancelled: Optional[threading.Event] = None) -> Any:
+    """
+    Run ``fn(timeout)`` against provider ``name`` with a per-attempt timeout (LLM_TIMEOUT_S), an
+    overall deadline (LLM_DEADLINE_S, or the request's ``deadline`` when that comes first) and up
+    to LLM_RETRIES jittered retries on transient errors; none once ``cancelled`` is set (the
+    caller no longer wants the result). Raises LLMDegraded when the breaker is open, the request
+    is out of time or the attempts are used up; other errors pass through unchanged.
+    """
+    own = time.monotonic() + _setting("LLM_DEADLINE_S", 45)
+    deadline = own if deadline is None else min(own, deadline)
+    if deadline <= time.monotonic():
+        raise LLMDegraded(f"AI request ran out of time ({op}); please retry.")
+    breaker = breaker_for(name)
+    if not breaker.allow():
+        raise _degraded(breaker, op)
+    retries = int(_setting("LLM_RETRIES", 2))
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            result = fn(max(0.001, min(_setting("LLM_TIMEOUT_S", 30), remaining)))
+        except ProviderUnavailable:
+            raise
+        except Exception as e:
+            if not is_transient(e):
+                # The provider answered; a bad request says nothing about its health
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            delay = backoff(attempt)
+            if attempt > retries or time.monotonic() + delay >= deadline or (cancelled and cancelled.is_set()):
+                raise _degraded(breaker, op, e) from e
+            if not breaker.allow():
+                raise _degraded(breaker, op) from e
+            logger.info("LLM %s attempt %s failed (%s); retrying in %.2fs", op, attempt, e, delay)
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+_END = object()
+
+
+def stream(name: str, fn: Callable[[float], Iterator[Any]], *, op: str,
+           deadline: Optional[float] = None) -> Iterator[Any]:
+    """
+    Streaming variant of call(): opening the stream and waiting for its first chunk are retried;
+    once output has been yielded a failure is recorded and re-raised as is.
+    """
+
+    def opened(timeout: float) -> Tuple[Iterator[Any], Any]:
+        it = iter(fn(timeout))
+        return it, next(it, _END)
+
+    it, head = call(name, opened, op=op, deadline=deadline)
+    if head is _END:
+        return
+    yield head
+    try:
+        yield from it
+    except Exception as e:
+        if is_transient(e):
+            breaker_for(name).record_failure()
+        raise
+
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from . import resilience
+from .providers import ProviderUnavailable, chat_model, get_provider
+
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended
+BUCKETS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200, 6400, 12800, 25600, 51200)
+SLICES = 6
+
+
+@dataclass(frozen=True)
+class Target:
+    provider: str
+    model: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class LatencyHistogram:
+    """
+    Process-local rolling latency histograms per target. The LLM_ROUTE_WINDOW_S window is split
+    into SLICES time slices of bucket counts; a slice is reset when the ring comes back round to it,
+    so quantiles only ever reflect the last window.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, List[Tuple[int, List[int]]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _slice_len() -> float:
+        return max(1.0, float(getattr(settings, "LLM_ROUTE_WINDOW_S", 300)) / SLICES)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def record(self, key: str, ms: float) -> None:
+        epoch = int(time.monotonic() // self._slice_len())
+        bucket = bisect.bisect_left(BUCKETS_MS, ms)
+        with self._lock:
+            ring = self._data.setdefault(key, [(-1, [0] * (len(BUCKETS_MS) + 1)) for _ in range(SLICES)])
+            slot = epoch % SLICES
+            if ring[slot][0] != epoch:
+                ring[slot] = (epoch, [0] * (len(BUCKETS_MS) + 1))
+            ring[slot][1][bucket] += 1
+
+    def counts(self, key: str) -> List[int]:
+        epoch = int(time.monotonic() // self._slice_len())
+        merged = [0] * (len(BUCKETS_MS) + 1)
+        with self._lock:
+            for slice_epoch, counts in self._data.get(key, ()):
+                if epoch - slice_epoch < SLICES:
+                    merged = [a + b for a, b in zip(merged, counts)]
+        return merged
+
+    def quantile(self, key: str, q: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding quantile ``q``; None without samples."""
+        counts = self.counts(key)
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= q * total:
+                return float(BUCKETS_MS[i] if i < len(BUCKETS_MS) else BUCKETS_MS[-1] * 2)
+        return float(BUCKETS_MS[-1] * 2)  # pragma: no cover
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._data)
+        return {
+            k: {"samples": sum(self.counts(k)), "p50_ms": self.quantile(k, 0.5), "p95_ms": self.quantile(k, 0.95)}
+            for k in keys
+        }
+
+
+LATENCY = LatencyHistogram()
+
+
+class HedgeBudget:
+    """
+    Token bucket keeping hedges to LLM_HEDGE_MAX_RATIO of requests: every hedged-mode request
+    earns that fraction of a token (up to LLM_HEDGE_BURST) and each backup request spends one.
+    Process-local, like LATENCY.
+    """
+
+    def __init__(self):
+        self._tokens: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _burst() -> float:
+        return float(getattr(settings, "LLM_HEDGE_BURST", 5))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tokens = None
+
+    def earn(self) -> None:
+        with self._lock:
+            tokens = self._burst() if self._tokens is None else self._tokens
+            self._tokens = min(self._burst(), tokens + float(getattr(settings, "LLM_HEDGE_MAX_RATIO", 0.1)))
+
+    def spend(self) -> bool:
+        with self._lock:
+            tokens = self._burst() if self._tokens is None else self._tokens
+            if tokens < 1:
+                return False
+            self._tokens = tokens - 1
+            return True
+
+
+HEDGES = HedgeBudget()
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_in_flight = 0
+
+
+def _workers() -> int:
+    return int(getattr(settings, "LLM_HEDGE_WORKERS", 8))
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="llm-hedge")
+        return _pool
+
+
+def _leg_done(_future) -> None:
+    global _in_flight
+    with _pool_lock:
+        _in_flight -= 1
+
+
+def _submit(*args) -> Future:
+    """Submit a leg to the pool, counting it until it finishes (or is cancelled)."""
+    global _in_flight
+    pool = _executor()
+    with _pool_lock:
+        _in_flight += 1
+    future = pool.submit(_leg, *args)
+    future.add_done_callback(_leg_done)
+    return future
+
+
+def _pool_free() -> bool:
+    """True when a leg submitted now would start at once rather than queue behind others."""
+    with _pool_lock:
+        return _in_flight < _workers()
+
+
+def configured_targets() -> List[Target]:
+    """LLM_ROUTES ("provider:model" strings), or just LLM_PROVIDER with LLM_CHAT_MODEL."""
+    routes = getattr(settings, "LLM_ROUTES", None) or []
+    targets = [Target(*route.split(":", 1)) for route in routes]
+    return targets or [Target(getattr(settings, "LLM_PROVIDER", "openai"), chat_model())]
+
+
+def ready_targets() -> List[Target]:
+    """Configured targets whose provider can serve requests; raises ProviderUnavailable if none can."""
+    ready, error = [], None
+    for target in configured_targets():
+        try:
+            get_provider(target.provider).ensure_ready()
+        except ProviderUnavailable as e:
+            error = error or e
+            continue
+        ready.append(target)
+    if not ready:
+        raise error or ProviderUnavailable("No LLM route configured.")
+    return ready
+
+
+def rank(targets: List[Target]) -> List[Target]:
+    """
+    Targets with an open breaker go last; the rest by rolling p50, fastest first. Targets with
+    fewer than LLM_ROUTE_MIN_SAMPLES samples keep their configured order ahead of measured ones,
+    so they get traffic until they have a latency profile.
+    """
+    min_samples = int(getattr(settings, "LLM_ROUTE_MIN_SAMPLES", 20))
+
+    def sort_key(indexed):
+        i, target = indexed
+        degraded = resilience.breaker_for(get_provider(target.provider).name).is_open()
+        p50 = LATENCY.quantile(target.key, 0.5) if sum(LATENCY.counts(target.key)) >= min_samples else None
+        return (degraded, p50 is not None, p50 or 0.0, i)
+
+    return [t for _, t in sorted(enumerate(targets), key=sort_key)]
+
+
+def hedge_delay_s(target: Target) -> float:
+    """LLM_HEDGE_DELAY_MS if set, else the target's rolling LLM_HEDGE_QUANTILE latency."""
+    fixed = getattr(settings, "LLM_HEDGE_DELAY_MS", None)
+    if fixed:
+        return float(fixed) / 1000.0
+    min_samples = int(getattr(settings, "LLM_ROUTE_MIN_SAMPLES", 20))
+    q = LATENCY.quantile(target.key, float(getattr(settings, "LLM_HEDGE_QUANTILE", 0.95)))
+    if q is None or sum(LATENCY.counts(target.key)) < min_samples:
+        q = float(getattr(settings, "LLM_HEDGE_DEFAULT_DELAY_MS", 2000))
+    return q / 1000.0
+
+
+def _leg(target: Target, messages: List[Dict[str, Any]], tools, temperature: float,
+         deadline: Optional[float] = None, settled: Optional[threading.Event] = None) -> Tuple[Dict[str, Any], Target]:
+    provider = get_provider(target.provider)
+    started = time.monotonic()
+    raw = resilience.call(
+        provider.name,
+        lambda timeout: provider.chat(messages, model=target.model, tools=tools, temperature=temperature, timeout=timeout),
+        op="chat",
+        deadline=deadline,
+        cancelled=settled,
+    )
+    LATENCY.record(target.key, (time.monotonic() - started) * 1000)
+    return raw, target
+
+
+def chat(messages: List[Dict[str, Any]], *, tools, temperature: float,
+         targets: Optional[List[Target]] = None, deadline: Optional[float] = None) -> Tuple[Dict[str, Any], Target]:
+    """
+    One chat completion on the best-ranked target. With LLM_HEDGE on, a second request goes to
+    the runner-up (or the same target when it is the only one) if the first has not answered
+    within hedge_delay_s(); the first successful answer wins and the other request is cancelled
+    if it has not started. A request already in flight gets no further retries, and the backup
+    itself only has LLM_HEDGE_LEG_TIMEOUT_S, so a loser frees its thread quickly.
+    Hedges are capped by HEDGES (LLM_HEDGE_MAX_RATIO) and skipped while every pool thread is
+    busy; with no free thread the primary runs inline instead of queueing.
+    ``deadline`` is the request's resilience deadline. Returns (raw response, target that served it).
+    """
+    ranked = rank(targets or ready_targets())
+    primary = ranked[0]
+    if not getattr(settings, "LLM_HEDGE", False):
+        return _leg(primary, messages, tools, temperature, deadline)
+
+    HEDGES.earn()
+    if not _pool_free():
+        # Upstream is slow and the pool is full of legs; waiting in its queue only adds latency
+        return _leg(primary, messages, tools, temperature, deadline)
+
+    secondary = ranked[1] if len(ranked) > 1 else primary
+    settled = threading.Event()
+    # Each leg gets its own copy; the caller appends to the message list once a reply is in
+    pending = {_submit(primary, list(messages), tools, temperature, deadline, settled)}
+    done, _ = wait(pending, timeout=hedge_delay_s(primary))
+    hedged = False
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            for future in done:
+                pending.discard(future)
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+            if not hedged:
+                # Primary is slow (or already failed): fire the backup request, if the budget allows
+                hedged = True
+                if _pool_free() and HEDGES.spend():
+                    short = time.monotonic() + float(getattr(settings, "LLM_HEDGE_LEG_TIMEOUT_S", 10))
+                    leg_deadline = short if deadline is None else min(deadline, short)
+                    pending.add(_submit(secondary, list(messages), tools, temperature, leg_deadline, settled))
+            if not pending:
+                raise error  # type: ignore[misc]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    finally:
+        settled.set()
@@ -34,7 +34,7 @@ class AssessmentSerializer(serializers.ModelSerializer):
 class ConsultSerializer(serializers.ModelSerializer):
     messages = MessageSerializer(many=True, read_only=True)
     assessment = AssessmentSerializer(read_only=True)
-    client = serializers.PrimaryKeyRelatedField(source='client', queryset=Client.objects.all(), required=False, allow_null=True)
+    client = serializers.PrimaryKeyRelatedField(queryset=Client.objects.all(), required=False, allow_null=True)
 
     class Meta:
         model = Consult
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 from django.conf import settings
+from django.db import connections
+
 
 from workouts.services.generation import generate_session, generate_plan, SessionParams
 
+from .llm_cache import RESPONSE_CACHE, TOOL_CACHE, response_key, tool_key
+from .providers import ProviderUnavailable, chat_model, get_provider
+from . import resilience, routing
+
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = (
     "You are an expert personal trainer and nutrition coach. "
@@ -17,6 +29,8 @@ SYSTEM_PROMPT = (
     "Return short, practical explanations. Keep the tone supportive."
 )
 
+CHAT_TEMPERATURE = 0.3
+
 
 def _tool_defs() -> List[Dict[str, Any]]:
     return [
@@ -80,6 +94,87 @@ def _tool_defs() -> List[Dict[str, Any]]:
 
 
 def _run_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a tool, memoized on its canonicalized arguments (the generators are deterministic)."""
+    key = tool_key(name, arguments)
+    cached = TOOL_CACHE.get(key)
+    if cached is not None:
+        return cached
+    started = time.monotonic()
+    result = _execute_tool(name, arguments)
+    if not (isinstance(result, dict) and "error" in result):
+        TOOL_CACHE.set(key, result, cost_ms=(time.monotonic() - started) * 1000)
+    return result
+
+
+_tool_pool: Optional[ThreadPoolExecutor] = None
+_tool_pool_lock = threading.Lock()
+
+
+def _tool_workers() -> int:
+    return int(getattr(settings, "LLM_TOOL_WORKERS", 4))
+
+
+def _tool_executor() -> ThreadPoolExecutor:
+    global _tool_pool
+    with _tool_pool_lock:
+        if _tool_pool is None:
+            _tool_pool = ThreadPoolExecutor(max_workers=_tool_workers(), thread_name_prefix="consult-tool")
+        return _tool_pool
+
+
+def _tool_arguments(raw: Optional[str]) -> Any:
+    """Arguments of a model tool call; malformed JSON is passed on as is and the run reports it."""
+    try:
+        return json.loads(raw or "{}")
+    except ValueError:
+        return raw
+
+
+def _timed_tool(name: str, arguments: Any) -> Dict[str, Any]:
+    started = time.monotonic()
+    try:
+        if not isinstance(arguments, dict):
+            raise ValueError(f"arguments are not a JSON object: {str(arguments)[:200]}")
+        result = _run_tool(name, arguments)
+    except Exception as e:
+        # Goes back to the model as the tool result, so it can correct the call
+        logger.warning("Tool %s failed: %s", name, e)
+        result = {"error": f"Tool {name} failed: {e}"}
+    return {"name": name, "arguments": arguments, "result": result, "ms": round((time.monotonic() - started) * 1000, 1)}
+
+
+def _pooled_tool(name: str, arguments: Any) -> Dict[str, Any]:
+    try:
+        return _timed_tool(name, arguments)
+    finally:
+        # Pool threads outlive the request; don't leave a DB connection open per worker
+        connections.close_all()
+
+
+def iter_tool_calls(calls: List[Tuple[str, Any]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Run (name, arguments) tool calls, concurrently on a bounded thread pool (LLM_TOOL_WORKERS)
+    when there is more than one. Yields (call index, tool run) as each finishes. Invalid
+    arguments and failing tools give a run whose result is {"error": ...}; nothing is raised.
+    """
+    if len(calls) <= 1 or _tool_workers() <= 1:
+        for i, (name, args) in enumerate(calls):
+            yield i, _timed_tool(name, args)
+        return
+    futures = {_tool_executor().submit(_pooled_tool, name, args): i for i, (name, args) in enumerate(calls)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
+def run_tool_calls(calls: List[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+    """Tool runs in call order, each with its own wall time in "ms"."""
+    runs: List[Dict[str, Any]] = [{}] * len(calls)
+    for i, run in iter_tool_calls(calls):
+        runs[i] = run
+    return runs
+
+
+def _execute_tool(name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     if name == "generate_training_session":
         sp = SessionParams(
             goal=arguments.get("goal", "General Fitness"),
@@ -192,56 +287,178 @@ def _build_meal_plan(args: Dict[str, Any]) -> Dict[str, Any]:
     return {"days": out_days, "calories": kcal, "meals_per_day": meals_per_day, "diet": diet}
 
 
-def ai_respond(messages: List[Dict[str, str]], max_tool_loops: int = 2) -> Dict[str, Any]:
+def _tool_messages(calls: List[Dict[str, Any]], content: Optional[str]) -> Dict[str, Any]:
+    """The assistant turn that requested tools; the API requires it ahead of the tool results."""
+    return {"role": "assistant", "content": content or None, "tool_calls": calls}
+
+
+def ai_respond(messages: List[Dict[str, str]], max_tool_loops: int = 2,
+               deadline: Optional[float] = None) -> Dict[str, Any]:
     """
-    Call OpenAI with tools enabled. Returns dict with keys:
+    Chat with tools enabled through the configured provider (LLM_PROVIDER / LLM_CHAT_MODEL).
+    Returns dict with keys:
     - role: 'assistant'
     - text: assistant content
-    - tool_runs: list of {name, arguments, result}
+    - tool_runs: list of {name, arguments, result, ms}, in call order
     - raw: raw API response (if available)
+    - provider, model: what served the (last) completion; see routing for LLM_ROUTES / LLM_HEDGE
+    - cached: True when served from the response cache
+    All completions of the turn share one deadline: ``deadline`` when the caller has a wider
+    request budget, else LLM_REQUEST_DEADLINE_S from now.
+    Raises resilience.LLMDegraded when the provider keeps failing, its breaker is open or the
+    turn is out of time.
     """
-    try:
-        from openai import OpenAI  # type: ignore
-    except Exception as e:  # pragma: no cover
-        return {"role": "assistant", "text": f"AI unavailable: {e}", "tool_runs": [], "raw": None}
+    if deadline is None:
+        deadline = resilience.request_deadline()
+    provider = get_provider()
+    model = chat_model()
+    tools = _tool_defs()
+    key = response_key(f"{provider.name}:{model}", CHAT_TEMPERATURE, tools, messages)
+    hit = RESPONSE_CACHE.get(key)
+    if hit is not None:
+        return {**hit, "cached": True}
 
-    client = OpenAI(api_key=getattr(settings, "OPENAI_API_KEY", None))
-    if not getattr(settings, "OPENAI_API_KEY", None):
-        return {"role": "assistant", "text": "OpenAI API key not configured.", "tool_runs": [], "raw": None}
+    try:
+        targets = routing.ready_targets()
+    except ProviderUnavailable as e:
+        return {"role": "assistant", "text": str(e), "tool_runs": [], "raw": None,
+                "provider": provider.name, "model": model, "cached": False}
+    served = targets[0]
 
     tool_runs: List[Dict[str, Any]] = []
     augmented = [{"role": "system", "content": SYSTEM_PROMPT}] + messages
-    tools = _tool_defs()
 
     result_text = ""
     raw_last: Optional[Dict[str, Any]] = None
+    started = time.monotonic()
+    tokens = 0
 
     for _ in range(max_tool_loops + 1):
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=augmented,
-            tools=tools,
-            temperature=0.3,
-        )
-        raw_last = resp.model_dump()  # type: ignore
-        choice = resp.choices[0]
-        msg = choice.message
-        if msg.tool_calls:
+        raw_last, served = routing.chat(augmented, tools=tools, temperature=CHAT_TEMPERATURE, targets=targets,
+                                        deadline=deadline)
+        tokens += (raw_last.get("usage") or {}).get("total_tokens") or 0
+        msg = (raw_last.get("choices") or [{}])[0].get("message") or {}
+        if msg.get("tool_calls"):
             # Execute tools and append results
-            for call in msg.tool_calls:
-                name = call.function.name
-                args = json.loads(call.function.arguments or "{}")
-                result = _run_tool(name, args)
-                tool_runs.append({"name": name, "arguments": args, "result": result})
+            augmented.append(_tool_messages(msg["tool_calls"], msg.get("content")))
+            calls = [(c["function"]["name"], _tool_arguments(c["function"].get("arguments"))) for c in msg["tool_calls"]]
+            for call, run in zip(msg["tool_calls"], run_tool_calls(calls)):
+                tool_runs.append(run)
                 augmented.append({
                     "role": "tool",
-                    "tool_call_id": call.id,
-                    "name": name,
-                    "content": json.dumps(result),
+                    "tool_call_id": call.get("id"),
+                    "name": run["name"],
+                    "content": json.dumps(run["result"]),
                 })
             continue
         # No more tools; capture final text
-        result_text = (msg.content or "").strip()
+        result_text = (msg.get("content") or "").strip()
         break
 
-    return {"role": "assistant", "text": result_text, "tool_runs": tool_runs, "raw": raw_last}
+    result = {"role": "assistant", "text": result_text, "tool_runs": tool_runs, "raw": raw_last,
+              "provider": get_provider(served.provider).name, "model": served.model}
+    if result_text:
+        RESPONSE_CACHE.set(key, result, cost_ms=(time.monotonic() - started) * 1000, tokens=tokens)
+    return {**result, "cached": False}
+
+
+def _accumulate_tool_calls(calls: Dict[int, Dict[str, str]], deltas: List[Dict[str, Any]]) -> None:
+    """Merge streamed tool_call fragments; ids and names arrive once, arguments in pieces."""
+    for tc in deltas or []:
+        slot = calls.setdefault(tc.get("index") or 0, {"id": "", "name": "", "arguments": ""})
+        if tc.get("id"):
+            slot["id"] = tc["id"]
+        fn = tc.get("function") or {}
+        slot["name"] += fn.get("name") or ""
+        slot["arguments"] += fn.get("arguments") or ""
+
+
+def ai_respond_stream(messages: List[Dict[str, str]], max_tool_loops: int = 2) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming counterpart of ai_respond. Yields event dicts as the model produces output:
+    - {"type": "delta", "text"}                          assistant text fragment
+    - {"type": "tool_start", "index", "name", "arguments"}
+    - {"type": "tool_finish", "index", "name", "ms"}
+    - {"type": "error", "detail", "retry_after"}         terminal; retry_after set when degraded
+    - {"type": "done", "text", "tool_runs", "provider", "model", "cached"}   terminal, full reply
+    A response-cache hit is replayed as a single delta. The turn shares one
+    LLM_REQUEST_DEADLINE_S budget, as in ai_respond.
+    """
+    deadline = resilience.request_deadline()
+    provider = get_provider()
+    model = chat_model()
+    tools = _tool_defs()
+    key = response_key(f"{provider.name}:{model}", CHAT_TEMPERATURE, tools, messages)
+    hit = RESPONSE_CACHE.get(key)
+    if hit is not None:
+        yield {"type": "delta", "text": hit["text"]}
+        yield {"type": "done", **{k: hit.get(k) for k in ("text", "tool_runs", "provider", "model")}, "cached": True}
+        return
+    try:
+        provider.ensure_ready()
+    except ProviderUnavailable as e:
+        yield {"type": "error", "detail": str(e), "retry_after": None}
+        return
+
+    tool_runs: List[Dict[str, Any]] = []
+    augmented = [{"role": "system", "content": SYSTEM_PROMPT}] + messages
+    result_text = ""
+    started = time.monotonic()
+
+    for _ in range(max_tool_loops + 1):
+        parts: List[str] = []
+        calls: Dict[int, Dict[str, str]] = {}
+        try:
+            chunks = resilience.stream(
+                provider.name,
+                lambda timeout: provider.chat_stream(augmented, model=model, tools=tools,
+                                                     temperature=CHAT_TEMPERATURE, timeout=timeout),
+                op="chat",
+                deadline=deadline,
+            )
+            for chunk in chunks:
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if delta.get("content"):
+                        parts.append(delta["content"])
+                        yield {"type": "delta", "text": delta["content"]}
+                    _accumulate_tool_calls(calls, delta.get("tool_calls"))
+        except resilience.LLMDegraded as e:
+            yield {"type": "error", "detail": str(e), "retry_after": e.retry_after}
+            return
+        except Exception as e:
+            yield {"type": "error", "detail": f"AI request failed: {e}", "retry_after": None}
+            return
+
+        if not calls:
+            result_text = "".join(parts).strip()
+            break
+        augmented.append(_tool_messages(
+            [{"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+             for _, c in sorted(calls.items())],
+            "".join(parts),
+        ))
+        ordered = [c for _, c in sorted(calls.items())]
+        pending = [(c["name"], _tool_arguments(c["arguments"])) for c in ordered]
+        base = len(tool_runs)
+        for i, (name, args) in enumerate(pending):
+            yield {"type": "tool_start", "index": base + i, "name": name, "arguments": args}
+        runs: List[Dict[str, Any]] = [{}] * len(pending)
+        # tool_finish events arrive in completion order; results go back to the model in call order
+        for i, run in iter_tool_calls(pending):
+            runs[i] = run
+            yield {"type": "tool_finish", "index": base + i, "name": run["name"], "ms": run["ms"]}
+        for call, run in zip(ordered, runs):
+            tool_runs.append(run)
+            augmented.append({
+                "role": "tool",
+                "tool_call_id": call["id"],
+                "name": run["name"],
+                "content": json.dumps(run["result"]),
+            })
+
+    result = {"role": "assistant", "text": result_text, "tool_runs": tool_runs, "raw": None,
+              "provider": provider.name, "model": model}
+    if result_text:
+        RESPONSE_CACHE.set(key, result, cost_ms=(time.monotonic() - started) * 1000)
+    yield {"type": "done", **{k: result[k] for k in ("text", "tool_runs", "provider", "model")}, "cached": False}
@@ -0,0 +1,902 @@
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from .context import build_context, estimate_tokens
+from .llm_cache import RESPONSE_CACHE, TOOL_CACHE, cache_stats
+from .models import Consult, Message
+from .providers import StubProvider, get_provider
+from .resilience import LLMDegraded, breaker_for
+from .routing import HEDGES, LATENCY, Target, rank
+from .views import _MULTIPART_OVERHEAD
+from .tts import (
+    _hls_segment, cache_dir, cached_speech, enforce_quota, iter_audio, playlist, speech_name, split_segments,
+    start_segments,
+)
+from .services import _run_tool, ai_respond, run_tool_calls
+
+
+@override_settings(CONSULT_CONTEXT_TURNS=4, CONSULT_CONTEXT_TOKEN_BUDGET=400, CONSULT_SUMMARY_MAX_TOKENS=120)
+class ConsultContextTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="cass", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Chat")
+        for i in range(10):
+            Message.objects.create(consult=self.consult, role="user" if i % 2 == 0 else "assistant", text=f"turn {i}")
+
+    def test_estimator_counts_words_and_long_text(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("Hi, there!"), 4)
+        self.assertEqual(estimate_tokens("x" * 400), 100)
+
+    def test_window_and_incremental_summary(self):
+        history = build_context(self.consult)
+        self.assertEqual([m["content"] for m in history[1:]], ["turn 6", "turn 7", "turn 8", "turn 9"])
+        self.assertIn("turn 0", history[0]["content"])
+        self.consult.refresh_from_db()
+        upto = self.consult.context_summary_upto
+        self.assertEqual(upto, Message.objects.get(text="turn 5").id)
+
+        Message.objects.create(consult=self.consult, role="user", text="turn 10")
+        with self.assertNumQueries(3):  # window, rows to fold, summary update
+            history = build_context(self.consult)
+        self.assertEqual(history[-1]["content"], "turn 10")
+        self.assertIn("turn 6", self.consult.context_summary)
+
+    def test_token_budget_trims_oldest_turns(self):
+        Message.objects.create(consult=self.consult, role="assistant", text="long " * 300)
+        history = build_context(self.consult)
+        self.assertEqual(len(history), 2)  # summary + the oversized latest turn
+        self.assertLessEqual(estimate_tokens(self.consult.context_summary), 120)
+
+    def test_summary_keeps_earliest_facts(self):
+        self.consult.messages.all().delete()
+        Message.objects.create(consult=self.consult, role="user",
+                               text="Goal: first marathon in May. Injury: left knee, no deep lunges. " * 3)
+        for i in range(60):
+            Message.objects.create(consult=self.consult, role="user" if i % 2 == 0 else "assistant",
+                                   text=f"Week {i} check-in: sessions done, sleep ok, mood good, nothing new to report.")
+            build_context(self.consult)
+        summary = self.consult.context_summary
+        self.assertLessEqual(estimate_tokens(summary), 120)
+        self.assertTrue(summary.startswith("- user: Goal: first marathon"))
+        self.assertIn("Week 5", summary.splitlines()[-1])  # and the latest folded turn
+
+    def test_tampered_message_cursor_is_404(self):
+        from django.utils import timezone
+
+        from coachapp.pagination import KeysetPagination
+
+        tampered = KeysetPagination.encode_cursor(timezone.now(), "abc")  # integer pk expected
+        res = self.client.get(reverse("consults-list-messages", args=[self.consult.pk]), {"cursor": tampered})
+        self.assertEqual(res.status_code, 404)
+
+    def test_post_message_sends_bounded_history(self):
+        for i in range(30):
+            Message.objects.create(consult=self.consult, role="user", text=f"extra {i}")
+        with mock.patch("consults.views.ai_respond", return_value={"text": "ok", "tool_runs": []}) as ai:
+            res = self.client.post(reverse("consults-list-messages", args=[self.consult.pk]), {"text": "latest"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        sent = ai.call_args.args[0]
+        self.assertEqual(len(sent), 5)
+        self.assertEqual(sent[-1]["content"], "latest")
+
+
+def _sse_events(response):
+    body = b"".join(response.streaming_content).decode("utf-8")
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible /chat/completions. Streaming requests get a tool call, then (after the tool
+    result) text; non-streaming requests get a fixed reply. ``faults`` are consumed one per request
+    before normal service: an int answers with that HTTP status, a float delays the reply (seconds).
+    """
+
+    def __init__(self, faults=()):
+        outer = self
+        self.requests = []
+        self.faults = list(faults)
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                outer.requests.append(body)
+                fault = outer.faults.pop(0) if outer.faults else None
+                if isinstance(fault, int):
+                    data = json.dumps({"error": {"message": "injected", "type": "server_error"}}).encode()
+                    self.send_response(fault)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                if isinstance(fault, float):
+                    time.sleep(fault)
+                if not body.get("stream"):
+                    reply = {"id": "c1", "object": "chat.completion", "created": 0, "model": "fake",
+                             "choices": [{"index": 0, "finish_reason": "stop",
+                                          "message": {"role": "assistant", "content": "Plain reply."}}],
+                             "usage": {"prompt_tokens": 40, "completion_tokens": 2, "total_tokens": 42}}
+                    data = json.dumps(reply).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                if any(m.get("role") == "tool" for m in body["messages"]):
+                    deltas = [{"role": "assistant", "content": "Here is "}, {"content": "your plan."}]
+                else:
+                    deltas = [
+                        {"role": "assistant", "tool_calls": [{"index": 0, "id": "call_1", "type": "function",
+                                                              "function": {"name": "generate_meal_plan", "arguments": '{"days"'}}]},
+                        {"tool_calls": [{"index": 0, "function": {"arguments": ': 1}'}}]},
+                    ]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for delta in deltas:
+                    chunk = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                             "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ConsultStreamTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # llm-scope throttle counters
+        self.user = get_user_model().objects.create_user(username="sage", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Stream")
+        self.url = reverse("consults-post-message-stream", args=[self.consult.pk])
+
+    def test_events_then_persist_at_end(self):
+        def fake_stream(history):
+            self.assertEqual(Message.objects.count(), 0)  # nothing saved while streaming
+            self.assertEqual(history[-1], {"role": "user", "content": "hi"})
+            yield {"type": "tool_start", "index": 0, "name": "generate_meal_plan", "arguments": {}}
+            yield {"type": "tool_finish", "index": 0, "name": "generate_meal_plan", "ms": 1.0}
+            yield {"type": "delta", "text": "Hel"}
+            yield {"type": "delta", "text": "lo"}
+            yield {"type": "done", "text": "Hello", "tool_runs": [{"name": "generate_meal_plan"}]}
+
+        with mock.patch("consults.views.ai_respond_stream", fake_stream):
+            res = self.client.post(self.url, {"text": "hi"}, format="json", HTTP_ACCEPT="text/event-stream")
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res["Content-Type"], "text/event-stream")
+            events = _sse_events(res)
+        self.assertEqual([e for e, _ in events], ["tool_start", "tool_finish", "delta", "delta", "message"])
+        assistant = Message.objects.get(role="assistant")
+        self.assertEqual(events[-1][1]["id"], assistant.id)
+        self.assertEqual(assistant.text, "Hello")
+        self.assertTrue(Message.objects.filter(role="user", text="hi").exists())
+
+    def test_error_saves_nothing(self):
+        with mock.patch("consults.views.ai_respond_stream", lambda history: iter([{"type": "error", "detail": "down"}])):
+            events = _sse_events(self.client.post(self.url, {"text": "hi"}, format="json"))
+        self.assertEqual(events, [("error", {"detail": "down"})])
+        self.assertFalse(Message.objects.exists())
+
+    @skipUnless(importlib.util.find_spec("openai"), "openai SDK not installed")
+    def test_against_fake_streaming_server(self):
+        server = FakeLLMServer()
+        self.addCleanup(server.close)
+        with override_settings(OPENAI_API_KEY="test", OPENAI_BASE_URL=server.url):
+            events = _sse_events(self.client.post(self.url, {"text": "meal plan please"}, format="json"))
+        kinds = [e for e, _ in events]
+        self.assertEqual(kinds, ["tool_start", "tool_finish", "delta", "delta", "message"])
+        self.assertEqual(events[0][1]["arguments"], {"days": 1})
+        self.assertEqual(Message.objects.get(role="assistant").text, "Here is your plan.")
+        # The follow-up request carries the assistant tool_calls turn before the tool result
+        roles = [m["role"] for m in server.requests[1]["messages"]]
+        self.assertEqual(roles[-2:], ["assistant", "tool"])
+
+
+class LLMCacheTests(APITestCase):
+    def setUp(self):
+        RESPONSE_CACHE.clear()
+        TOOL_CACHE.clear()
+
+    @override_settings(LLM_RESPONSE_CACHE_SIZE=2)
+    def test_lru_eviction_and_ttl(self):
+        RESPONSE_CACHE.set("a", {"v": 1})
+        RESPONSE_CACHE.set("b", {"v": 2})
+        self.assertEqual(RESPONSE_CACHE.get("a"), {"v": 1})  # a becomes most recent
+        RESPONSE_CACHE.set("c", {"v": 3})
+        self.assertIsNone(RESPONSE_CACHE.get("b"))
+        self.assertEqual(RESPONSE_CACHE.snapshot()["evictions"], 1)
+        with mock.patch("consults.llm_cache.time.monotonic", return_value=time.monotonic() + 601):
+            self.assertIsNone(RESPONSE_CACHE.get("a"))
+
+    def test_tool_memo_canonicalizes_arguments(self):
+        args = {"goal": "Strength", "duration_min": 45, "fitness_level": "Beginner", "equipment": ["Dumbbells", "Bench"]}
+        first = _run_tool("generate_training_session", args)
+        again = _run_tool("generate_training_session", {**args, "goal": " Strength ", "equipment": ["Bench", "Dumbbells"]})
+        self.assertEqual(first, again)
+        first["mutated"] = True  # callers cannot corrupt the memo
+        self.assertNotIn("mutated", _run_tool("generate_training_session", args))
+        stats = cache_stats()["tools"]
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_stats_endpoint_is_staff_only(self):
+        user = get_user_model().objects.create_user(username="ops", password="pass1234")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse("consults-llm-cache")).status_code, 403)
+        user.is_staff = True
+        user.save()
+        res = self.client.get(reverse("consults-llm-cache"))
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("hit_rate", res.data["responses"])
+
+    @skipUnless(importlib.util.find_spec("openai"), "openai SDK not installed")
+    def test_identical_windows_call_upstream_once(self):
+        server = FakeLLMServer()
+        self.addCleanup(server.close)
+        with override_settings(OPENAI_API_KEY="test", OPENAI_BASE_URL=server.url):
+            first = ai_respond([{"role": "user", "content": "Give me a 3 day  beginner program"}])
+            second = ai_respond([{"role": "user", "content": "give me a 3 day beginner program "}])
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(second["text"], first["text"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(cache_stats()["responses"]["saved_tokens"], 42)
+
+
+@override_settings(LLM_PROVIDER="stub", LLM_RESPONSE_CACHE_TTL=0)
+class StubProviderTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # llm-scope throttle counters
+        self.user = get_user_model().objects.create_user(username="stubby", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Offline")
+
+    def test_consult_turn_runs_offline_and_deterministically(self):
+        url = reverse("consults-list-messages", args=[self.consult.pk])
+        res = self.client.post(url, {"text": "Could I get a meal plan?"}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual([r["name"] for r in res.data["tool_runs"]], ["generate_meal_plan"])
+        self.assertEqual(res.data["message"]["text"], "Stub reply: ran generate_meal_plan.")
+        a = ai_respond([{"role": "user", "content": "hello"}])
+        b = ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(a["text"], b["text"])
+        self.assertEqual((a["provider"], a["model"]), ("stub", "gpt-4o-mini"))
+
+    def test_voice_with_tts(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            res = self.client.post(
+                reverse("consults-voice", args=[self.consult.pk]) + "?tts=1",
+                {"audio": SimpleUploadedFile("a.webm", b"\x00" * 64, content_type="audio/webm")},
+                format="multipart",
+            )
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(res.data["transcript"], "Stub transcript of 64 bytes.")
+            self.assertTrue(res.data["audio_url"].startswith("/api/consults/tts/"))
+
+    @skipUnless(importlib.util.find_spec("openai"), "openai SDK not installed")
+    def test_openai_client_is_pooled_per_process(self):
+        provider = get_provider("openai")
+        with override_settings(OPENAI_API_KEY="k1"):
+            self.assertIs(provider.client(), provider.client())
+
+
+class ConcurrentToolTests(APITestCase):
+    def setUp(self):
+        TOOL_CACHE.clear()
+
+    def test_calls_overlap_and_keep_call_order(self):
+        def slow(name, args):
+            time.sleep(0.2 if name == "first" else 0.05)
+            return {"tool": name}
+
+        calls = [("first", {}), ("second", {}), ("third", {})]
+        with mock.patch("consults.services._execute_tool", side_effect=slow):
+            started = time.monotonic()
+            runs = run_tool_calls(calls)
+            elapsed = time.monotonic() - started
+        self.assertLess(elapsed, 0.29)
+        self.assertEqual([r["result"]["tool"] for r in runs], ["first", "second", "third"])
+        self.assertGreaterEqual(runs[0]["ms"], 190)
+
+    @override_settings(LLM_TOOL_WORKERS=1)
+    def test_single_worker_runs_inline(self):
+        with mock.patch("consults.services._tool_executor") as pool:
+            runs = run_tool_calls([("generate_meal_plan", {"days": 1}), ("generate_meal_plan", {"days": 2})])
+        pool.assert_not_called()
+        self.assertEqual([len(r["result"]["days"]) for r in runs], [1, 2])
+
+
+class MalformedToolStub(StubProvider):
+    """StubProvider whose tool calls carry truncated JSON arguments."""
+
+    name = "malformed-stub"
+
+    def _message(self, messages, tools):
+        message = super()._message(messages, tools)
+        for call in message.get("tool_calls") or []:
+            call["function"]["arguments"] = call["function"]["arguments"][:-1]
+        return message
+
+
+@override_settings(LLM_PROVIDER="consults.tests.MalformedToolStub", LLM_RESPONSE_CACHE_TTL=0)
+class ToolErrorTests(APITestCase):
+    def setUp(self):
+        TOOL_CACHE.clear()
+
+    def test_malformed_arguments_go_back_to_the_model(self):
+        result = ai_respond([{"role": "user", "content": "meal plan please"}])
+        self.assertEqual(result["text"], "Stub reply: ran generate_meal_plan.")
+        [run] = result["tool_runs"]
+        self.assertIn("not a JSON object", run["result"]["error"])
+
+    def test_malformed_arguments_keep_the_stream_going(self):
+        from .services import ai_respond_stream
+
+        events = list(ai_respond_stream([{"role": "user", "content": "meal plan please"}]))
+        self.assertEqual([e["type"] for e in events][:2], ["tool_start", "tool_finish"])
+        self.assertEqual(events[-1]["type"], "done")
+        self.assertIn("error", events[-1]["tool_runs"][0]["result"])
+
+    def test_failing_tool_becomes_an_error_result(self):
+        with mock.patch("consults.services._execute_tool", side_effect=RuntimeError("boom")):
+            runs = run_tool_calls([("generate_meal_plan", {"days": 1}), ("generate_meal_plan", {"days": 2})])
+        self.assertEqual([r["result"] for r in runs], [{"error": "Tool generate_meal_plan failed: boom"}] * 2)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FaultyProvider(StubProvider):
+    """StubProvider that first raises the queued ``faults`` (None passes), one per call."""
+
+    name = "faulty"
+    faults: list = []
+    calls = 0
+
+    def _fault(self):
+        type(self).calls += 1
+        fault = self.faults.pop(0) if self.faults else None
+        if fault is not None:
+            raise fault
+
+    def chat(self, *args, **kwargs):
+        self._fault()
+        return super().chat(*args, **kwargs)
+
+    def transcribe(self, *args, **kwargs):
+        self._fault()
+        return super().transcribe(*args, **kwargs)
+
+
+@override_settings(LLM_PROVIDER="consults.tests.FaultyProvider", LLM_RESPONSE_CACHE_TTL=0, LLM_RETRIES=2,
+                   LLM_RETRY_BACKOFF_S=0, LLM_BREAKER_THRESHOLD=3, LLM_BREAKER_COOLDOWN_S=30)
+class ResilienceTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # throttle counters and breaker state
+        FaultyProvider.faults, FaultyProvider.calls = [], 0
+        self.user = get_user_model().objects.create_user(username="flaky", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Flaky")
+
+    def test_transient_errors_are_retried(self):
+        FaultyProvider.faults = [UpstreamError(503), TimeoutError("slow")]
+        result = ai_respond([{"role": "user", "content": "hello"}])
+        self.assertTrue(result["text"].startswith("Stub reply"))
+        self.assertEqual(FaultyProvider.calls, 3)
+        self.assertEqual(breaker_for("faulty").state(), "closed")
+
+    def test_client_errors_are_not_retried(self):
+        FaultyProvider.faults = [UpstreamError(400)]
+        with self.assertRaises(UpstreamError):
+            ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(FaultyProvider.calls, 1)
+
+    def test_breaker_opens_and_fails_fast_with_503(self):
+        FaultyProvider.faults = [UpstreamError(502)] * 3
+        url = reverse("consults-list-messages", args=[self.consult.pk])
+        res = self.client.post(url, {"text": "hi"}, format="json")
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(FaultyProvider.calls, 3)
+        self.assertEqual(breaker_for("faulty").state(), "open")
+
+        res = self.client.post(url, {"text": "hi"}, format="json")
+        self.assertEqual(res.status_code, 503)
+        self.assertGreaterEqual(int(res["Retry-After"]), 1)
+        self.assertEqual(FaultyProvider.calls, 3)  # no upstream call while open
+        self.assertFalse(Message.objects.exists())
+        stream = self.client.post(reverse("consults-post-message-stream", args=[self.consult.pk]), {"text": "hi"},
+                                  format="json", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(stream.status_code, 503)
+
+    def test_half_open_admits_one_probe(self):
+        breaker = breaker_for("faulty")
+        breaker._trip(-1)  # cooldown already over
+        self.assertEqual(breaker.state(), "half-open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # another worker waits for the probe
+        breaker.record_failure()
+        self.assertEqual(breaker.state(), "open")
+        breaker._trip(-1)
+        ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(breaker.state(), "closed")
+
+    def test_breaker_state_is_shared_through_the_cache_backend(self):
+        from django.core.cache import caches
+        from django.core.cache.backends.filebased import FileBasedCache
+
+        with tempfile.TemporaryDirectory() as location:
+            backend = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}
+            with override_settings(CACHES={"default": backend}):
+                self.assertIsInstance(caches["default"], FileBasedCache)
+                FaultyProvider.faults = [UpstreamError(502)] * 3
+                with self.assertRaises(LLMDegraded):
+                    ai_respond([{"role": "user", "content": "hello"}])
+                # Another worker has its own cache client on the same backend and sees the trip
+                other_worker = FileBasedCache(location, {})
+                self.assertIsNotNone(other_worker.get("llm-breaker:faulty:open_until"))
+                other_worker.delete("llm-breaker:faulty:open_until")
+                self.assertEqual(breaker_for("faulty").state(), "closed")
+
+    def test_success_on_closed_breaker_does_not_write(self):
+        breaker = breaker_for("faulty")
+        with mock.patch("consults.resilience.cache.delete_many") as delete_many:
+            breaker.record_success()
+        delete_many.assert_not_called()
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertIsNone(cache.get("llm-breaker:faulty:failures"))
+
+    def test_cache_url(self):
+        from coachapp.settings import cache_from_url
+
+        self.assertEqual(cache_from_url("redis://cache:6379/0")["BACKEND"], "django.core.cache.backends.redis.RedisCache")
+        self.assertEqual(cache_from_url("db://llm_cache")["LOCATION"], "llm_cache")
+        self.assertEqual(cache_from_url("file:///var/tmp/cache")["LOCATION"], "/var/tmp/cache")
+        self.assertEqual(cache_from_url("")["BACKEND"], "django.core.cache.backends.locmem.LocMemCache")
+        with self.assertRaises(ValueError):
+            cache_from_url("memcache://cache:11211")
+
+    def test_voice_transcription_degraded(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        FaultyProvider.faults = [ConnectionError("reset")] * 3
+        res = self.client.post(
+            reverse("consults-voice", args=[self.consult.pk]),
+            {"audio": SimpleUploadedFile("a.webm", b"\x00" * 64, content_type="audio/webm")},
+            format="multipart",
+        )
+        self.assertEqual(res.status_code, 503)
+        self.assertFalse(Message.objects.exists())
+
+    @override_settings(LLM_PROVIDER="stub", LLM_STUB_LATENCY_MS=500, LLM_TIMEOUT_S=0.05, LLM_DEADLINE_S=0.2, LLM_RETRIES=5)
+    def test_deadline_bounds_slow_calls(self):
+        started = time.monotonic()
+        with self.assertRaises(LLMDegraded):
+            ai_respond([{"role": "user", "content": "hello"}])
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    @override_settings(LLM_PROVIDER="stub", LLM_STUB_LATENCY_MS=150, LLM_TIMEOUT_S=1, LLM_DEADLINE_S=1,
+                       LLM_REQUEST_DEADLINE_S=0.25)
+    def test_turn_shares_one_deadline_across_tool_loops(self):
+        # Each completion fits LLM_DEADLINE_S, but the tool call and the follow-up do not fit the turn
+        started = time.monotonic()
+        with self.assertRaises(LLMDegraded):
+            ai_respond([{"role": "user", "content": "Plan a workout"}])
+        self.assertLess(time.monotonic() - started, 0.4)
+        with override_settings(LLM_REQUEST_DEADLINE_S=1):
+            self.assertIn("ran generate_training_session", ai_respond([{"role": "user", "content": "Plan a workout"}])["text"])
+
+    def test_expired_request_deadline_fails_without_calling(self):
+        from .resilience import call
+
+        with self.assertRaises(LLMDegraded):
+            call("faulty", lambda timeout: self.fail("called"), op="chat", deadline=time.monotonic() - 1)
+        self.assertEqual(breaker_for("faulty").state(), "closed")
+
+    @skipUnless(importlib.util.find_spec("openai"), "openai SDK not installed")
+    def test_fault_injecting_server(self):
+        server = FakeLLMServer(faults=[503, 429])
+        self.addCleanup(server.close)
+        with override_settings(LLM_PROVIDER="openai", OPENAI_API_KEY="test", OPENAI_BASE_URL=server.url):
+            result = ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(result["text"], "Plain reply.")
+        self.assertEqual(len(server.requests), 3)  # the SDK's own retries are off
+
+
+class FastStub(StubProvider):
+    name = "fast-stub"
+    latency_ms = 20
+    calls = 0
+
+    def _latency_ms(self):
+        type(self).calls += 1
+        return self.latency_ms
+
+
+class SlowStub(FastStub):
+    name = "slow-stub"
+    latency_ms = 400
+    calls = 0
+
+
+FAST, SLOW = "consults.tests.FastStub:fast-model", "consults.tests.SlowStub:slow-model"
+
+
+@override_settings(LLM_RESPONSE_CACHE_TTL=0, LLM_ROUTE_MIN_SAMPLES=3, LLM_HEDGE_DELAY_MS=60)
+class RoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        LATENCY.clear()
+        HEDGES.reset()
+        FastStub.calls = SlowStub.calls = 0
+
+    def test_histogram_quantiles_and_window(self):
+        for ms in (10, 30, 30, 90, 700):
+            LATENCY.record("a:m", ms)
+        self.assertEqual(LATENCY.quantile("a:m", 0.5), 50)
+        self.assertEqual(LATENCY.quantile("a:m", 0.95), 800)
+        self.assertIsNone(LATENCY.quantile("b:m", 0.5))
+        later = time.monotonic() + 301
+        with mock.patch("consults.routing.time.monotonic", return_value=later):
+            self.assertIsNone(LATENCY.quantile("a:m", 0.5))  # rolled out of the window
+
+    def test_rank_prefers_measured_fast_route(self):
+        slow, fast = Target(*SLOW.split(":")), Target(*FAST.split(":"))
+        self.assertEqual(rank([slow, fast]), [slow, fast])  # configured order until measured
+        for _ in range(3):
+            LATENCY.record(slow.key, 400)
+            LATENCY.record(fast.key, 20)
+        self.assertEqual(rank([slow, fast]), [fast, slow])
+
+    @override_settings(LLM_ROUTES=[SLOW, FAST], LLM_HEDGE=True)
+    def test_hedge_beats_slow_primary(self):
+        started = time.monotonic()
+        result = ai_respond([{"role": "user", "content": "hello"}])
+        elapsed = time.monotonic() - started
+        self.assertEqual((result["provider"], result["model"]), ("fast-stub", "fast-model"))
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual((SlowStub.calls, FastStub.calls), (1, 1))
+
+    @override_settings(LLM_ROUTES=[FAST, SLOW], LLM_HEDGE=True)
+    def test_no_hedge_when_primary_answers_in_time(self):
+        result = ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(result["provider"], "fast-stub")
+        self.assertEqual(SlowStub.calls, 0)
+        self.assertEqual(LATENCY.snapshot()["consults.tests.FastStub:fast-model"]["samples"], 1)
+
+    @override_settings(LLM_ROUTES=[SLOW, FAST], LLM_HEDGE=True, LLM_HEDGE_BURST=1, LLM_HEDGE_MAX_RATIO=0,
+                       LLM_HEDGE_LEG_TIMEOUT_S=5)
+    def test_hedge_budget_caps_backup_requests(self):
+        from . import routing
+
+        with mock.patch("consults.routing._leg", wraps=routing._leg) as leg:
+            started = time.monotonic()
+            self.assertEqual(ai_respond([{"role": "user", "content": "one"}])["provider"], "fast-stub")
+            self.assertEqual(ai_respond([{"role": "user", "content": "two"}])["provider"], "slow-stub")
+        self.assertEqual((SlowStub.calls, FastStub.calls), (2, 1))  # the budget allowed one hedge
+        backup_deadline = leg.call_args_list[1].args[4]
+        self.assertLessEqual(backup_deadline, started + 5.5)
+
+    @override_settings(LLM_ROUTES=[SLOW, FAST], LLM_HEDGE=True)
+    def test_busy_pool_runs_primary_inline(self):
+        with mock.patch("consults.routing._pool_free", return_value=False), \
+                mock.patch("consults.routing._executor") as pool:
+            result = ai_respond([{"role": "user", "content": "hello"}])
+        pool.assert_not_called()
+        self.assertEqual(result["provider"], "slow-stub")
+        self.assertEqual(FastStub.calls, 0)
+
+    def test_abandoned_leg_is_not_retried(self):
+        from .resilience import call
+
+        settled = threading.Event()
+        settled.set()
+        attempts = []
+
+        def slow(timeout):
+            attempts.append(timeout)
+            raise TimeoutError("slow")
+
+        with override_settings(LLM_RETRIES=3, LLM_RETRY_BACKOFF_S=0), self.assertRaises(LLMDegraded):
+            call("slow-stub", slow, op="chat", cancelled=settled)
+        self.assertEqual(len(attempts), 1)
+
+    @override_settings(LLM_ROUTES=[SLOW, FAST])
+    def test_without_hedging_routes_to_fastest(self):
+        for _ in range(3):
+            LATENCY.record(SLOW, 400)
+            LATENCY.record(FAST, 20)
+        result = ai_respond([{"role": "user", "content": "hello"}])
+        self.assertEqual(result["provider"], "fast-stub")
+        self.assertEqual(SlowStub.calls, 0)
+
+
+REPLY = "Great work today. Keep your knees soft on the hinge. Drink water. Sleep eight hours. See you Friday."
+
+
+@override_settings(LLM_PROVIDER="stub", LLM_RESPONSE_CACHE_TTL=0, LLM_TTS_SEGMENT_MAX_CHARS=40)
+class PipelinedTTSTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="voice", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Voice")
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+    def _voice(self, mode):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        with mock.patch("consults.views.ai_respond", return_value={"text": REPLY, "tool_runs": []}):
+            res = self.client.post(
+                reverse("consults-voice", args=[self.consult.pk]) + f"?tts={mode}",
+                {"audio": SimpleUploadedFile("a.webm", b"\x00" * 64, content_type="audio/webm")},
+                format="multipart",
+            )
+        self.assertEqual(res.status_code, 201)
+        return res
+
+    def _expected_audio(self):
+        stub = get_provider("stub")
+        return [stub.speech(s, model="m", voice="alloy") for s in split_segments(REPLY)]
+
+    def test_split_segments(self):
+        self.assertEqual(split_segments(REPLY), [
+            "Great work today.",
+            "Keep your knees soft on the hinge.",
+            "Drink water. Sleep eight hours.",
+            "See you Friday.",
+        ])
+        self.assertTrue(all(len(s) <= 40 for s in split_segments("word " * 30)))
+
+    def test_segments_yield_in_order_while_running_concurrently(self):
+        delays = {"a": 0.15, "b": 0.05, "c": 0.1}
+
+        def slow(provider, text, deadline=None):
+            time.sleep(delays[text])
+            return text.encode()
+
+        with mock.patch("consults.tts.synthesize", side_effect=slow):
+            started = time.monotonic()
+            parts = list(iter_audio(get_provider(), ["a", "b", "c"]))
+        self.assertEqual(parts, [(0, b"a"), (1, b"b"), (2, b"c")])
+        self.assertLess(time.monotonic() - started, 0.25)
+
+    @override_settings(LLM_TTS_REQUEST_SEGMENTS=2)
+    def test_reply_keeps_bounded_segments_in_flight(self):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def slow(provider, text, deadline=None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.03)
+            with lock:
+                running[0] -= 1
+            return text.encode()
+
+        segments = [f"s{i}" for i in range(6)]
+        with mock.patch("consults.tts.synthesize", side_effect=slow):
+            parts = list(iter_audio(get_provider(), segments))
+        self.assertEqual(parts, [(i, s.encode()) for i, s in enumerate(segments)])
+        self.assertEqual(peak[0], 2)  # the rest of the pool stays free for other replies
+
+    def test_chunked_stream(self):
+        url = self._voice("stream").data["audio_stream_url"]
+        res = self.client.get(url, HTTP_ACCEPT="audio/mpeg")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "audio/mpeg")
+        self.assertEqual(list(res.streaming_content), self._expected_audio())
+        self.assertEqual(self.client.get(url.replace("s=", "s=0")).status_code, 404)
+
+    def test_hls_playlist(self):
+        url = self._voice("hls").data["playlist_url"]
+        for _ in range(100):
+            body = self.client.get(url).content.decode()
+            if "#EXT-X-ENDLIST" in body:
+                break
+            time.sleep(0.02)
+        segments = [line for line in body.splitlines() if line and not line.startswith("#")]
+        self.assertEqual(len(segments), 4)
+        audio = []
+        for segment in segments:
+            res = self.client.get(segment)
+            self.assertEqual(res.status_code, 200)
+            audio.append(b"".join(res.streaming_content))
+        self.assertEqual(audio, self._expected_audio())
+
+    def test_failed_segment_ends_playlist_for_every_worker(self):
+        provider = get_provider()
+        segments = split_segments(REPLY)
+        cached_speech(provider, segments[0])
+        with mock.patch("consults.tts.synthesize", side_effect=ValueError("boom")):
+            _hls_segment(provider, 7, segments[1])
+        # The marker is a file, so a worker that never saw the failure still ends the playlist
+        body = playlist(provider, 7, REPLY, lambda name: name)
+        self.assertTrue(body.rstrip().endswith("#EXT-X-ENDLIST"))
+        self.assertEqual([line for line in body.splitlines() if line.endswith(".mp3")],
+                         [speech_name(provider, segments[0])])
+
+        with mock.patch("consults.tts._executor"):
+            start_segments(provider, 7, REPLY)
+        self.assertNotIn("#EXT-X-ENDLIST", playlist(provider, 7, REPLY, lambda name: name))
+
+
+@override_settings(LLM_PROVIDER="stub", LLM_TTS_URL_TTL_S=900, LLM_TTS_CACHE_SWEEP_S=3600)
+class TTSCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.user = get_user_model().objects.create_user(username="cached", password="pass1234")
+        self.client.force_authenticate(self.user)
+
+    def _aged(self, name, size, age_s):
+        path = cache_dir() / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\x00" * size)
+        then = time.time() - age_s
+        os.utime(path, (then, then))
+        return path
+
+    def test_identical_text_is_synthesized_once(self):
+        provider = get_provider()
+        with mock.patch.object(StubProvider, "speech", autospec=True, side_effect=StubProvider.speech) as speech:
+            first = cached_speech(provider, "Welcome back!")
+            second = cached_speech(provider, "Welcome back!")
+            other = cached_speech(provider, "See you Friday.")
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(speech.call_count, 2)
+        with override_settings(LLM_TTS_VOICE="verse"):
+            self.assertNotEqual(cached_speech(provider, "Welcome back!"), first)
+
+    def test_signed_url_serves_cached_file_and_refreshes_lru(self):
+        from .views import ConsultViewSet
+
+        old = self._aged("a" * 64 + ".mp3", 10, age_s=5000)
+        res = self.client.get(ConsultViewSet._signed_tts_url(old.name))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b"".join(res.streaming_content), b"\x00" * 10)
+        self.assertGreater(old.stat().st_mtime, time.time() - 60)
+
+    def test_playlist_protects_listed_segments_from_eviction(self):
+        provider = get_provider()
+        name = speech_name(provider, "Welcome back!")
+        greeting = self._aged(name, 400, age_s=5000)  # cached long ago, e.g. a stock greeting
+        body = playlist(provider, 1, "Welcome back!", lambda n: n)
+        self.assertIn(name, body)
+        enforce_quota(quota_bytes=0)
+        self.assertTrue(greeting.exists())
+
+    def test_quota_evicts_least_recently_used(self):
+        oldest = self._aged("old.mp3", 400, age_s=5000)
+        older = self._aged("older.mp3", 400, age_s=4000)
+        recent = self._aged("recent.mp3", 400, age_s=2000)
+        in_use = self._aged("in-use.mp3", 400, age_s=10)  # a signed URL may still point here
+        result = enforce_quota(quota_bytes=500)
+        self.assertEqual((result["evicted"], result["freed_bytes"]), (3, 1200))
+        self.assertEqual([p.exists() for p in (oldest, older, recent, in_use)], [False, False, False, True])
+
+        self._aged("new.mp3", 400, age_s=3000)
+        self.assertEqual(enforce_quota(quota_bytes=1000)["evicted"], 0)
+
+    def test_purge_command(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        stale = self._aged("stale.mp3", 2048, age_s=5000)
+        out = StringIO()
+        call_command("purge_tts_cache", "--quota-mb", "0", "--dry-run", stdout=out)
+        self.assertIn("Would evict 1 of 1 file(s)", out.getvalue())
+        self.assertTrue(stale.exists())
+        call_command("purge_tts_cache", "--quota-mb", "0", stdout=StringIO())
+        self.assertFalse(stale.exists())
+
+
+@override_settings(LLM_PROVIDER="stub", LLM_RESPONSE_CACHE_TTL=0)
+class VoiceUploadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="upload", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.consult = Consult.objects.create(user=self.user, title="Upload")
+        self.url = reverse("consults-voice", args=[self.consult.pk])
+
+    def _post(self, content, name="a.webm", **extra):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        return self.client.post(self.url, {"audio": SimpleUploadedFile(name, content, content_type="audio/webm"), **extra},
+                                format="multipart")
+
+    @staticmethod
+    def _wav(seconds):
+        import io
+
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(b"\x00\x00" * int(8000 * seconds))
+        return buf.getvalue()
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=16)
+    def test_spooled_upload_is_passed_through_without_copy(self):
+        seen = {}
+
+        def transcribe(provider, audio, *, model, timeout=None):
+            seen["path"] = audio.temporary_file_path()
+            seen["pos"] = audio.tell()
+            return "hello"
+
+        with mock.patch.object(StubProvider, "transcribe", autospec=True, side_effect=transcribe), \
+                mock.patch("tempfile.NamedTemporaryFile", wraps=tempfile.NamedTemporaryFile) as tmp:
+            res = self._post(b"\x00" * 64)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(seen["pos"], 0)
+        self.assertTrue(seen["path"])
+        tmp.assert_not_called()  # no second copy of Django's spool file
+
+    @override_settings(LLM_VOICE_MAX_BYTES=32)
+    def test_size_cap(self):
+        with mock.patch.object(StubProvider, "transcribe") as transcribe:
+            res = self._post(b"\x00" * 64)
+        self.assertEqual(res.status_code, 413)
+        transcribe.assert_not_called()
+
+    @override_settings(LLM_VOICE_MAX_BYTES=32)
+    def test_oversized_body_refused_before_parsing(self):
+        with mock.patch("django.http.request.HttpRequest._load_post_and_files") as parse:
+            res = self._post(b"\x00" * (_MULTIPART_OVERHEAD + 64))
+        self.assertEqual(res.status_code, 413)
+        parse.assert_not_called()
+
+    @override_settings(LLM_VOICE_MAX_SECONDS=1)
+    def test_duration_cap(self):
+        self.assertEqual(self._post(self._wav(2), name="a.wav").status_code, 413)
+        self.assertEqual(self._post(b"\x00" * 64, duration_s="90").status_code, 413)
+        res = self._post(self._wav(0.5), name="a.wav")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["transcript"], f"Stub transcript of {len(self._wav(0.5))} bytes.")
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .providers import LLMProvider, tts_model, tts_voice
+from .resilience import call as llm_call
+
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_BREAK_RE = re.compile(r"(?<=[,;:])\s+|\s+")
+
+
+def _max_chars() -> int:
+    return int(getattr(settings, "LLM_TTS_SEGMENT_MAX_CHARS", 400))
+
+
+def _split_long(sentence: str, limit: int) -> List[str]:
+    """Break an over-long sentence at clause boundaries, then words."""
+    out, current = [], ""
+    for piece in _BREAK_RE.split(sentence):
+        if current and len(current) + 1 + len(piece) > limit:
+            out.append(current)
+            current = piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current:
+        out.append(current)
+    return out
+
+
+def split_segments(text: str) -> List[str]:
+    """
+    Speech segments for pipelined TTS. The first sentence is its own segment so playback can
+    start as early as possible; later sentences are packed up to LLM_TTS_SEGMENT_MAX_CHARS to
+    keep the number of upstream calls down.
+    """
+    limit = _max_chars()
+    sentences: List[str] = []
+    for s in _SENTENCE_RE.split(text or ""):
+        s = s.strip()
+        if s:
+            sentences.extend(_split_long(s, limit) if len(s) > limit else [s])
+    if not sentences:
+        return []
+    segments = [sentences[0]]
+    current = ""
+    for s in sentences[1:]:
+        if current and len(current) + 1 + len(s) > limit:
+            segments.append(current)
+            current = s
+        else:
+            current = f"{current} {s}" if current else s
+    if current:
+        segments.append(current)
+    return segments
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(getattr(settings, "LLM_TTS_WORKERS", 4)),
+                                       thread_name_prefix="consult-tts")
+        return _pool
+
+
+def _relay(inner: Future, outer: Future) -> None:
+    if inner.exception() is not None:
+        outer.set_exception(inner.exception())
+    else:
+        outer.set_result(inner.result())
+
+
+def _submit_windowed(fn: Callable[[str], Any], segments: List[str]) -> List[Future]:
+    """
+    Run ``fn(segment)`` for every segment on the shared pool, in order, with at most
+    LLM_TTS_REQUEST_SEGMENTS of them queued or running at once; the next is submitted as one
+    finishes. One long reply then can't fill the pool queue ahead of another reply's first
+    sentence. Returns one future per segment; cancelling one that has not started skips it.
+    """
+    pool = _executor()
+    window = max(1, int(getattr(settings, "LLM_TTS_REQUEST_SEGMENTS", 2)))
+    futures: List[Future] = [Future() for _ in segments]
+    upcoming = iter(range(len(segments)))
+    lock = threading.Lock()
+
+    def start_next() -> None:
+        while True:
+            with lock:
+                i = next(upcoming, None)
+            if i is None:
+                return
+            if futures[i].set_running_or_notify_cancel():
+                break
+        inner = pool.submit(fn, segments[i])
+        inner.add_done_callback(lambda done: (_relay(done, futures[i]), start_next()))
+
+    for _ in range(min(window, len(segments))):
+        start_next()
+    return futures
+
+
+def synthesize(provider: LLMProvider, text: str, deadline: Optional[float] = None) -> bytes:
+    return llm_call(
+        provider.name,
+        lambda timeout: provider.speech(text, model=tts_model(), voice=tts_voice(), timeout=timeout),
+        op="speech",
+        deadline=deadline,
+    )
+
+
+def cache_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / "tts"
+
+
+def speech_name(provider: LLMProvider, text: str) -> str:
+    """Content address of the speech for ``text``: sha256 of (provider, voice, model, text)."""
+    key = json.dumps([provider.name, tts_voice(), tts_model(), text], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".mp3"
+
+
+def _touch(path: Path) -> bool:
+    """Mark a cached file as used (its mtime is the LRU clock). False if it is gone."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def touch(name: str) -> bool:
+    return _touch(cache_dir() / name)
+
+
+def cached_speech(provider: LLMProvider, text: str, deadline: Optional[float] = None) -> str:
+    """
+    File name under MEDIA_ROOT/tts holding the speech for ``text``, synthesizing it only when
+    it is not cached yet. Identical texts (greetings, standard cues) are synthesized once.
+    ``deadline`` is the calling request's resilience deadline, if any.
+    """
+    name = speech_name(provider, text)
+    path = cache_dir() / name
+    if _touch(path):
+        return name
+    audio = synthesize(provider, text, deadline)
+    if not audio:
+        raise ValueError("TTS returned no audio")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{name}.{threading.get_ident()}.part")
+    tmp.write_bytes(audio)
+    tmp.replace(path)  # atomic; concurrent writers of the same name write identical bytes
+    _maybe_sweep()
+    return name
+
+
+def cache_usage() -> Tuple[int, int]:
+    """(files, bytes) of cached speech."""
+    files = total = 0
+    for entry in _entries():
+        files += 1
+        total += entry[2]
+    return files, total
+
+
+def _entries() -> List[Tuple[float, str, int]]:
+    """(mtime, name, size) of every cached MP3, including legacy uuid-named replies."""
+    out = []
+    try:
+        with os.scandir(cache_dir()) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".mp3"):
+                    st = entry.stat()
+                    out.append((st.st_mtime, entry.name, st.st_size))
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def enforce_quota(quota_bytes: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Evict least recently used files until the cache fits LLM_TTS_CACHE_QUOTA_MB. Files used
+    within LLM_TTS_URL_TTL_S are kept even over quota, so signed URLs handed out for them
+    keep working until they expire. Stale .part files from crashed writers and old HLS
+    failure markers are removed too.
+    """
+    if quota_bytes is None:
+        quota_bytes = int(float(getattr(settings, "LLM_TTS_CACHE_QUOTA_MB", 512)) * 1024 * 1024)
+    protect_after = time.time() - float(getattr(settings, "LLM_TTS_URL_TTL_S", 900))
+    entries = sorted(_entries())
+    total = sum(size for _, _, size in entries)
+    evicted = freed = 0
+    for mtime, name, size in entries:
+        if total <= quota_bytes or mtime >= protect_after:
+            break
+        if not dry_run:
+            try:
+                (cache_dir() / name).unlink()
+            except FileNotFoundError:
+                continue
+        total -= size
+        evicted += 1
+        freed += size
+    if not dry_run:
+        for pattern in ("*.part", "*.hls-failed"):
+            for leftover in cache_dir().glob(pattern):
+                try:
+                    if leftover.stat().st_mtime < protect_after:
+                        leftover.unlink()
+                except FileNotFoundError:
+                    pass
+    return {"evicted": evicted, "freed_bytes": freed, "remaining_bytes": total}
+
+
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+def _maybe_sweep() -> None:
+    """Enforce the quota from the write path at most every LLM_TTS_CACHE_SWEEP_S per process."""
+    global _last_sweep
+    interval = float(getattr(settings, "LLM_TTS_CACHE_SWEEP_S", 300))
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < interval:
+            return
+        _last_sweep = time.monotonic()
+    try:
+        enforce_quota()
+    except OSError as e:  # pragma: no cover
+        logger.warning("TTS cache sweep failed: %s", e)
+
+
+def _segment_audio(provider: LLMProvider, text: str) -> bytes:
+    return (cache_dir() / cached_speech(provider, text)).read_bytes()
+
+
+def iter_audio(provider: LLMProvider, segments: List[str]) -> Iterator[Tuple[int, bytes]]:
+    """
+    Synthesize (or load from the cache) the segments concurrently on the shared pool
+    (LLM_TTS_WORKERS, at most LLM_TTS_REQUEST_SEGMENTS per reply) and yield (index, mp3 bytes)
+    in segment order, each as soon as it and its predecessors are done. MP3 frames are
+    self-contained, so the parts concatenate into one playable stream.
+    """
+    futures = _submit_windowed(lambda segment: _segment_audio(provider, segment), segments)
+    try:
+        for i, future in enumerate(futures):
+            yield i, future.result()
+    finally:
+        # Client went away or a segment failed: drop work that has not started
+        for future in futures:
+            future.cancel()
+
+
+def estimate_seconds(text: str) -> float:
+    """Rough spoken duration (~15 characters per second) for playlist EXTINF values."""
+    return max(1.0, round(len(text) / 15.0, 1))
+
+
+def _failed_marker(message_id: int) -> Path:
+    """Set when HLS synthesis for a message fails; on disk so every worker's playlist sees it."""
+    return cache_dir() / f"{message_id}.hls-failed"
+
+
+def _hls_segment(provider: LLMProvider, message_id: int, text: str) -> None:
+    try:
+        cached_speech(provider, text)
+    except Exception as e:
+        logger.warning("Pipelined TTS for message %s failed: %s", message_id, e)
+        marker = _failed_marker(message_id)
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+
+
+def start_segments(provider: LLMProvider, message_id: int, text: str) -> int:
+    """Queue the segments of ``text`` on the TTS pool for the HLS-style mode; returns the count."""
+    segments = split_segments(text)
+    _failed_marker(message_id).unlink(missing_ok=True)
+    _submit_windowed(lambda segment: _hls_segment(provider, message_id, segment), segments)
+    return len(segments)
+
+
+def playlist(provider: LLMProvider, message_id: int, text: str, segment_url) -> str:
+    """
+    HLS (EVENT) playlist of the leading segments already in the cache, ending with
+    EXT-X-ENDLIST once all of them are (or synthesis failed). Players re-fetch an open playlist
+    until it ends. ``segment_url(name)`` maps a cached file name to its URL; listed files are
+    touched first, so eviction keeps them for as long as the URL is valid.
+    """
+    segments = split_segments(text)
+    durations = [estimate_seconds(s) for s in segments]
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+             f"#EXT-X-TARGETDURATION:{math.ceil(max(durations or [1]))}", "#EXT-X-MEDIA-SEQUENCE:0"]
+    ready = 0
+    for segment, duration in zip(segments, durations):
+        name = speech_name(provider, segment)
+        if not _touch(cache_dir() / name):
+            break
+        lines += [f"#EXTINF:{duration:.1f},", segment_url(name)]
+        ready += 1
+    if ready == len(segments) or _failed_marker(message_id).exists():
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
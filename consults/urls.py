@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ConsultViewSet, TTSDownloadView
+from .views import ConsultViewSet, TTSDownloadView, TTSPlaylistView, TTSStreamView
 
 
 router = DefaultRouter()
@@ -9,4 +9,6 @@ router.register(r'', ConsultViewSet, basename='consults')
 urlpatterns = [
     path('', include(router.urls)),
     path('tts/<str:name>/', TTSDownloadView.as_view(), name='consults-tts'),
+    path('tts/stream/<int:message_id>/', TTSStreamView.as_view(), name='consults-tts-stream'),
+    path('tts/hls/<int:message_id>/playlist.m3u8', TTSPlaylistView.as_view(), name='consults-tts-playlist'),
 ]
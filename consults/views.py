@@ -1,33 +1,90 @@
 from __future__ import annotations
 
+import json
 from typing import Any, Dict
 
 from django.utils.timezone import now
-from rest_framework import viewsets, permissions, status, parsers, throttling
+from django.db import transaction
+from rest_framework import viewsets, permissions, status, parsers, throttling, negotiation
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from coachapp.pagination import ChronologicalKeysetPagination
+from .context import build_context
+from .llm_cache import cache_stats
+from .routing import LATENCY
+from .providers import ProviderUnavailable, chat_model, get_provider, transcribe_model
 from .models import Consult, Message, Assessment
 from .serializers import ConsultSerializer, MessageSerializer
-from .services import ai_respond
+from .services import ai_respond, ai_respond_stream
+from .resilience import LLMDegraded, breaker_for, call as llm_call, request_deadline
+from .tts import cached_speech, iter_audio, playlist, split_segments, start_segments, touch
 from django.conf import settings
 import logging
 import base64
-import tempfile
+import wave
 from typing import Optional
 import os
-import uuid
 from pathlib import Path
 import hmac
 import hashlib
 import time
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework.views import APIView
 from clients.services.profile_normalizer import normalize_client_profile
+from clients.services.profile_context import client_profile_context
 from clients.services.generator import generate_week_plan
 from types import SimpleNamespace
 
 
+class StreamNegotiation(negotiation.DefaultContentNegotiation):
+    """SSE actions answer Accept: text/event-stream with a raw StreamingHttpResponse; skip renderer matching."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _degraded_response(e: LLMDegraded) -> Response:
+    resp = Response({"detail": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if e.retry_after:
+        resp["Retry-After"] = str(e.retry_after)
+    return resp
+
+
+# Allowance for multipart boundaries and other form fields on top of the audio itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _too_large(detail: str) -> Response:
+    return Response({"detail": detail}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+def _audio_duration(audio, declared=None) -> Optional[float]:
+    """
+    Seconds of audio when known without decoding: read from the header of WAV uploads, else
+    the client-declared ``duration_s``. Compressed formats without a declared duration are
+    bounded by the byte cap only.
+    """
+    try:
+        audio.seek(0)
+        with wave.open(audio.file if hasattr(audio, "file") else audio, "rb") as w:
+            rate = w.getframerate()
+            return w.getnframes() / float(rate) if rate else None
+    except (wave.Error, EOFError, OSError):
+        pass
+    finally:
+        audio.seek(0)
+    try:
+        return float(declared) if declared not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return getattr(obj, "user_id", None) == getattr(request.user, "id", None)
@@ -63,47 +120,29 @@ class ConsultViewSet(viewsets.ModelViewSet):
             qs = qs.filter(client_id=client_id)
         return qs
 
+    def get_throttles(self):
+        if self.action == "post_message":
+            self.throttle_scope = 'llm'
+        return super().get_throttles()
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    @action(detail=True, methods=["get"], url_path="messages")
-    def list_messages(self, request, pk=None):
-        consult = self.get_object()
-        qs = consult.messages.all().order_by("created_at")
-        return Response(MessageSerializer(qs, many=True).data)
-
-    @action(detail=True, methods=["post"], url_path="messages", throttle_classes=[throttling.ScopedRateThrottle], throttle_scope='llm')
-    def post_message(self, request, pk=None):
-        consult = self.get_object()
-        text = (request.data or {}).get("text")
-        if not text:
-            return Response({"detail": "Provide text."}, status=status.HTTP_400_BAD_REQUEST)
-
-        user_msg = Message.objects.create(consult=consult, role="user", text=text)
-
-        # Build chat history for the AI, with optional client profile context
-        history = []
-        if getattr(consult, "client_id", None):
-            try:
-                prof = normalize_client_profile(consult.client)
-                history.append({"role": "system", "content": f"Client profile context: {prof}"})
-            except Exception as e:
-                logging.getLogger(__name__).warning("Profile context inject failed: %s", e)
-        history.extend(
-            {"role": m.role, "content": m.text}
-            for m in consult.messages.all().order_by("created_at")
-        )
-        result = ai_respond(history)
-
-        # Persist assistant reply
-        assistant = Message.objects.create(
-            consult=consult,
-            role="assistant",
-            text=result.get("text", ""),
-            metadata={"tool_runs": result.get("tool_runs")},
-        )
+    @staticmethod
+    def _profile_prefix(consult):
+        """System message with the linked client's stored profile, rendered and cached per fingerprint."""
+        if not getattr(consult, "client_id", None):
+            return []
+        try:
+            text = client_profile_context(consult.client_id)
+        except Exception as e:
+            logging.getLogger(__name__).warning("Profile context inject failed: %s", e)
+            return []
+        return [{"role": "system", "content": text}] if text else []
 
-        # Optional: if the assistant produced a recognizable plan JSON, store it
+    @staticmethod
+    def _store_plan_assessment(consult, assistant, result):
+        """If the assistant produced a recognizable plan JSON, store it as the consult's assessment."""
         plan_payload: Dict[str, Any] | None = None
         try:
             # Heuristic: if reply contains a fenced JSON block, attempt to parse
@@ -111,7 +150,7 @@ class ConsultViewSet(viewsets.ModelViewSet):
             if "{" in txt and "}" in txt:
                 start = txt.index("{")
                 end = txt.rindex("}") + 1
-                plan_payload = __import__("json").loads(txt[start:end])
+                plan_payload = json.loads(txt[start:end])
         except Exception as e:
             logging.getLogger(__name__).debug("Assistant JSON parse failed: %s", e)
             plan_payload = None
@@ -124,13 +163,47 @@ class ConsultViewSet(viewsets.ModelViewSet):
                     "plan": plan_payload.get("plan"),
                     "assistant_message": assistant.text,
                     "generated_at": now(),
-                    "llm_provider": "openai",
-                    "llm_model": "gpt-4o-mini",
+                    "llm_provider": result.get("provider") or "",
+                    "llm_model": result.get("model") or "",
                     "llm_response": result.get("raw"),
                     "used_llm": True,
                 },
             )
 
+    @action(detail=True, methods=["get"], url_path="messages")
+    def list_messages(self, request, pk=None):
+        consult = self.get_object()
+        paginator = ChronologicalKeysetPagination()
+        page = paginator.paginate_queryset(consult.messages.all(), request, view=self)
+        return paginator.get_paginated_response(MessageSerializer(page, many=True).data)
+
+    # Same URL as list_messages: a second @action on "messages" would never be routed for POST
+    @list_messages.mapping.post
+    def post_message(self, request, pk=None):
+        consult = self.get_object()
+        text = (request.data or {}).get("text")
+        if not text:
+            return Response({"detail": "Provide text."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_msg = Message.objects.create(consult=consult, role="user", text=text)
+
+        # Build chat history for the AI, with optional client profile context
+        try:
+            result = ai_respond(build_context(consult, prefix=self._profile_prefix(consult)))
+        except LLMDegraded as e:
+            user_msg.delete()  # the client retries the whole turn
+            return _degraded_response(e)
+
+        # Persist assistant reply
+        assistant = Message.objects.create(
+            consult=consult,
+            role="assistant",
+            text=result.get("text", ""),
+            metadata={"tool_runs": result.get("tool_runs"), "cached": result.get("cached", False)},
+        )
+
+        self._store_plan_assessment(consult, assistant, result)
+
         return Response(
             {
                 "message": MessageSerializer(assistant).data,
@@ -139,6 +212,70 @@ class ConsultViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED,
         )
 
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="messages/stream",
+        throttle_classes=[throttling.ScopedRateThrottle],
+        throttle_scope='llm',
+        content_negotiation_class=StreamNegotiation,
+    )
+    def post_message_stream(self, request, pk=None):
+        """
+        Same turn as post_message, streamed as server-sent events: ``delta`` (text fragment),
+        ``tool_start`` / ``tool_finish``, then ``message`` with the saved ids, or ``error``.
+        Both messages are written only once the reply is complete; a dropped connection saves nothing.
+        """
+        consult = self.get_object()
+        text = (request.data or {}).get("text")
+        if not text:
+            return Response({"detail": "Provide text."}, status=status.HTTP_400_BAD_REQUEST)
+
+        breaker = breaker_for(get_provider().name)
+        if breaker.is_open():
+            # Fail before committing to a 200 event stream
+            return _degraded_response(LLMDegraded("AI service is temporarily unavailable; please retry shortly.",
+                                                  retry_after=breaker.retry_after()))
+
+        history = build_context(consult, prefix=self._profile_prefix(consult))
+        history.append({"role": "user", "content": text})
+
+        def events():
+            final = None
+            for event in ai_respond_stream(history):
+                kind = event.pop("type")
+                if kind == "done":
+                    final = event
+                    break
+                yield _sse(kind, event)
+                if kind == "error":
+                    return
+            if final is None:
+                return
+            with transaction.atomic():
+                user_msg = Message.objects.create(consult=consult, role="user", text=text)
+                assistant = Message.objects.create(
+                    consult=consult,
+                    role="assistant",
+                    text=final.get("text", ""),
+                    metadata={"tool_runs": final.get("tool_runs"), "streamed": True, "cached": final.get("cached", False)},
+                )
+                self._store_plan_assessment(consult, assistant, final)
+            yield _sse("message", {"id": assistant.id, "user_message_id": user_msg.id, "text": assistant.text})
+
+        resp = StreamingHttpResponse(events(), content_type="text/event-stream")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"  # keep nginx from buffering the event stream
+        return resp
+
+    @action(detail=False, methods=["get"], url_path="llm-cache", permission_classes=[permissions.IsAdminUser])
+    def llm_cache(self, request):
+        """
+        Response and tool cache hit rates, entries and estimated savings, plus rolling chat latency
+        per route, for this worker process.
+        """
+        return Response({**cache_stats(), "latency": LATENCY.snapshot()})
+
     @action(detail=True, methods=["post"], url_path="generate")
     def generate(self, request, pk=None):
         """
@@ -255,8 +392,8 @@ class ConsultViewSet(viewsets.ModelViewSet):
                 "summary": summary,
                 "plan": {"plan": plan_map},
                 "generated_at": now(),
-                "llm_provider": "openai" if use_llm else "",
-                "llm_model": "gpt-4o-mini" if use_llm else "",
+                "llm_provider": get_provider().name if use_llm else "",
+                "llm_model": chat_model() if use_llm else "",
                 "llm_response": None,
                 "used_llm": use_llm,
             },
@@ -274,44 +411,41 @@ class ConsultViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"], url_path="voice", throttle_classes=[throttling.ScopedRateThrottle], throttle_scope='llm')
     def voice(self, request, pk=None):
         consult = self.get_object()
+        max_bytes = int(getattr(settings, "LLM_VOICE_MAX_BYTES", 25 * 1024 * 1024))
+        # Refuse oversized bodies before the multipart parser reads (and spools) them
+        declared = request.META.get("CONTENT_LENGTH")
+        if declared and declared.isdigit() and int(declared) > max_bytes + _MULTIPART_OVERHEAD:
+            return _too_large(f"Audio exceeds {max_bytes} bytes.")
         audio = request.FILES.get("audio")
         if not audio:
             return Response({"detail": "Provide 'audio' file."}, status=status.HTTP_400_BAD_REQUEST)
+        if audio.size > max_bytes:
+            return _too_large(f"Audio exceeds {max_bytes} bytes.")
+        max_seconds = float(getattr(settings, "LLM_VOICE_MAX_SECONDS", 300))
+        duration = _audio_duration(audio, request.data.get("duration_s"))
+        if duration is not None and duration > max_seconds:
+            return _too_large(f"Audio exceeds {max_seconds:g} seconds.")
 
         transcript_text: Optional[str] = None
         err: Optional[str] = None
-        api_key = getattr(settings, "OPENAI_API_KEY", None)
-        if not api_key:
-            return Response({"detail": "OpenAI API key not configured."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        provider = get_provider()
+        # Transcription, the reply and ?tts=1 speech share one budget (LLM_REQUEST_DEADLINE_S)
+        deadline = request_deadline()
+        try:
+            provider.ensure_ready()
+        except ProviderUnavailable as e:
+            return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        def transcribe(timeout):
+            audio.seek(0)  # rewind for retries
+            return provider.transcribe(audio, model=transcribe_model(), timeout=timeout)
 
+        # The upload goes to the client as is: Django's spooled temp file for large uploads,
+        # the in-memory buffer for small ones. No extra copy.
         try:
-            with tempfile.NamedTemporaryFile(delete=True, suffix=".bin") as tmp:
-                for chunk in audio.chunks():
-                    tmp.write(chunk)
-                tmp.flush()
-                tmp.seek(0)
-
-                try:
-                    from openai import OpenAI  # new SDK
-                    client = OpenAI(api_key=api_key)
-                    resp = client.audio.transcriptions.create(
-                        model="gpt-4o-transcribe",
-                        file=tmp,
-                    )
-                    transcript_text = getattr(resp, "text", None) or (resp.get("text") if isinstance(resp, dict) else None)
-                except Exception as e1:
-                    # Legacy SDK fallback
-                    try:
-                        import openai as openai_legacy  # type: ignore
-                        openai_legacy.api_key = api_key
-                        tmp.seek(0)
-                        resp2 = openai_legacy.Audio.transcribe("whisper-1", tmp)
-                        transcript_text = resp2.get("text") if isinstance(resp2, dict) else None
-                    except Exception as e2:
-                        err = str(e2)
-                        logging.getLogger(__name__).warning("Legacy transcription failed: %s", e2)
-                if not transcript_text:
-                    logging.getLogger(__name__).warning("Transcription via OpenAI SDK failed: %s", e1)
+            transcript_text = llm_call(provider.name, transcribe, op="transcription", deadline=deadline)
+        except LLMDegraded as e:
+            return _degraded_response(e)
         except Exception as e:
             err = str(e)
             logging.getLogger(__name__).warning("Voice transcript processing error: %s", e)
@@ -320,18 +454,14 @@ class ConsultViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Transcription failed.", "error": err}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Persist user message from transcript
-        Message.objects.create(consult=consult, role="user", text=transcript_text, metadata={"source": "voice"})
+        user_msg = Message.objects.create(consult=consult, role="user", text=transcript_text, metadata={"source": "voice"})
 
         # Build chat history and get assistant reply (inject profile if present)
-        history = []
-        if getattr(consult, "client_id", None):
-            try:
-                prof = normalize_client_profile(consult.client)
-                history.append({"role": "system", "content": f"Client profile context: {prof}"})
-            except Exception as e:
-                logging.getLogger(__name__).warning("Profile context inject failed: %s", e)
-        history.extend({"role": m.role, "content": m.text} for m in consult.messages.all().order_by("created_at"))
-        result = ai_respond(history)
+        try:
+            result = ai_respond(build_context(consult, prefix=self._profile_prefix(consult)), deadline=deadline)
+        except LLMDegraded as e:
+            user_msg.delete()
+            return _degraded_response(e)
 
         assistant = Message.objects.create(
             consult=consult,
@@ -340,31 +470,23 @@ class ConsultViewSet(viewsets.ModelViewSet):
             metadata={"tool_runs": result.get("tool_runs"), "from": "voice"},
         )
 
-        # Optional TTS
-        audio_url = None
-        tts = str(request.query_params.get("tts", "false")).lower() in ("1", "true", "yes")
-        if tts and assistant.text:
+        # Optional TTS: ?tts=1 synthesizes the whole reply up front; ?tts=stream returns a URL
+        # for chunked MP3 and ?tts=hls a playlist URL, both synthesized sentence by sentence
+        audio = {}
+        tts = str(request.query_params.get("tts", "false")).lower()
+        url_ttl = int(getattr(settings, "LLM_TTS_URL_TTL_S", 900))
+        if tts == "stream" and assistant.text:
+            audio["audio_stream_url"] = self._signed(
+                reverse("consults-tts-stream", args=[assistant.id]), f"stream/{assistant.id}", expires_in=url_ttl)
+        elif tts == "hls" and assistant.text:
+            if start_segments(provider, assistant.id, assistant.text):
+                audio["playlist_url"] = self._signed(
+                    reverse("consults-tts-playlist", args=[assistant.id]), f"hls/{assistant.id}", expires_in=url_ttl)
+        elif tts in ("1", "true", "yes") and assistant.text:
             try:
-                from openai import OpenAI  # type: ignore
-                client = OpenAI(api_key=api_key)
-                speech = client.audio.speech.create(
-                    model="gpt-4o-mini-tts",
-                    voice="alloy",
-                    input=assistant.text,
-                    format="mp3",
-                )
-                audio_bytes = getattr(speech, "content", None)
-                if not audio_bytes and hasattr(speech, "to_bytes"):
-                    audio_bytes = speech.to_bytes()  # type: ignore
-                if isinstance(audio_bytes, (bytes, bytearray)):
-                    # Persist and return signed URL
-                    name = f"{uuid.uuid4().hex}.mp3"
-                    out_dir = Path(settings.MEDIA_ROOT) / "tts"
-                    out_dir.mkdir(parents=True, exist_ok=True)
-                    out_path = out_dir / name
-                    with open(out_path, "wb") as f:
-                        f.write(audio_bytes)
-                    audio_url = self._signed_tts_url(name, expires_in=300)
+                # Content-addressed: a repeated reply reuses the file (and URL path) from last time
+                name = cached_speech(provider, assistant.text, deadline)
+                audio["audio_url"] = self._signed_tts_url(name, expires_in=300)
             except Exception as e:
                 # TTS failure is non-fatal
                 logging.getLogger(__name__).warning("TTS generation failed: %s", e)
@@ -374,7 +496,7 @@ class ConsultViewSet(viewsets.ModelViewSet):
                 "transcript": transcript_text,
                 "message": MessageSerializer(assistant).data,
                 "tool_runs": result.get("tool_runs"),
-                **({"audio_url": audio_url} if audio_url else {}),
+                **audio,
             },
             status=status.HTTP_201_CREATED,
         )
@@ -385,27 +507,93 @@ class ConsultViewSet(viewsets.ModelViewSet):
         key = str(settings.SECRET_KEY).encode("utf-8")
         return hmac.new(key, msg, hashlib.sha256).hexdigest()
 
-    def _signed_tts_url(self, name: str, expires_in: int = 300) -> str:
+    @staticmethod
+    def _signed(path: str, name: str, expires_in: int = 300) -> str:
         exp = int(time.time()) + int(expires_in)
-        sig = self._sign(name, exp)
-        base = "/api/consults/tts/" + name
-        return f"{base}?e={exp}&s={sig}"
+        return f"{path}?e={exp}&s={ConsultViewSet._sign(name, exp)}"
+
+    @staticmethod
+    def _signed_tts_url(name: str, expires_in: int = 300) -> str:
+        return ConsultViewSet._signed(reverse("consults-tts", args=[name]), name, expires_in)
+
+
+def _verify_signed(request, name: str) -> str:
+    """Raise Http404 unless ?e&s is an unexpired signature for ``name``; returns the query string."""
+    exp = int(request.query_params.get("e", "0") or 0)
+    sig = request.query_params.get("s") or ""
+    if not exp or not sig:
+        raise Http404
+    if exp < int(time.time()):
+        raise Http404
+    expected = ConsultViewSet._sign(name, exp)
+    if not hmac.compare_digest(expected, sig):
+        raise Http404
+    return f"e={exp}&s={sig}"
+
+
+def _own_message(request, message_id: int) -> Message:
+    message = Message.objects.filter(pk=message_id, consult__user=request.user, role="assistant").first()
+    if message is None:
+        raise Http404
+    return message
 
 
 class TTSDownloadView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsPremium]
 
     def get(self, request, name: str):
-        exp = int(request.query_params.get("e", "0") or 0)
-        sig = request.query_params.get("s") or ""
-        if not exp or not sig:
-            raise Http404
-        if exp < int(time.time()):
-            raise Http404
-        expected = ConsultViewSet._sign(name, exp)
-        if not hmac.compare_digest(expected, sig):
-            raise Http404
+        _verify_signed(request, name)
         path = Path(settings.MEDIA_ROOT) / "tts" / name
-        if not path.exists():
+        # Serving a cached file counts as a use for the cache's LRU eviction
+        if not name.endswith(".mp3") or not touch(name):
             raise Http404
         return FileResponse(open(path, "rb"), content_type="audio/mpeg")
+
+
+class TTSStreamView(APIView):
+    """
+    Chunked MP3 of an assistant reply. Sentences are synthesized concurrently and written in
+    order, so playback can start once the first sentence is ready.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsPremium]
+    content_negotiation_class = StreamNegotiation
+
+    def get(self, request, message_id: int):
+        _verify_signed(request, f"stream/{message_id}")
+        message = _own_message(request, message_id)
+        provider = get_provider()
+        segments = split_segments(message.text)
+
+        def body():
+            try:
+                for _, audio in iter_audio(provider, segments):
+                    yield audio
+            except Exception as e:
+                # Headers are gone; the player sees a short stream
+                logging.getLogger(__name__).warning("Streamed TTS for message %s failed: %s", message_id, e)
+
+        resp = StreamingHttpResponse(body(), content_type="audio/mpeg")
+        resp["Cache-Control"] = "no-store"
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+
+class TTSPlaylistView(APIView):
+    """
+    HLS-style EVENT playlist over the segments queued by tts.start_segments. Segments are
+    cached speech files, linked through signed download URLs.
+    """
+
+    permission_classes = [permissions.IsAuthenticated, IsPremium]
+    content_negotiation_class = StreamNegotiation
+
+    def get(self, request, message_id: int):
+        _verify_signed(request, f"hls/{message_id}")
+        message = _own_message(request, message_id)
+        ttl = int(getattr(settings, "LLM_TTS_URL_TTL_S", 900))
+        body = playlist(get_provider(), message_id, message.text,
+                        lambda name: ConsultViewSet._signed_tts_url(name, expires_in=ttl))
+        resp = HttpResponse(body, content_type="application/vnd.apple.mpegurl")
+        resp["Cache-Control"] = "no-cache"
+        return resp
@@ -10,6 +10,8 @@ echo "DJANGO_SETTINGS_MODULE=$DJANGO_SETTINGS_MODULE"
 if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
   echo "Running migrations..."
   python manage.py migrate --noinput
+  # Table for the database cache; a no-op when CACHE_URL points at Redis
+  python manage.py createcachetable
 fi
 
 # Collect static
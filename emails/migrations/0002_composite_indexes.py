@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emails', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['created_at', 'status'], name='emaillog_created_status_idx'),
+        ),
+    ]
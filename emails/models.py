@@ -21,6 +21,10 @@ class EmailLog(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            # Log list: ORDER BY created_at DESC, optionally filtered by status
+            models.Index(fields=["created_at", "status"], name="emaillog_created_status_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.to_email} - {self.subject} ({self.status})"
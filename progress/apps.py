@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ProgressConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "progress"
+
+    def ready(self):
+        # Import signals to register handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CoachCounters
+
+KINDS = ("clients", "consults", "blocks", "assessments")
+
+_local = threading.local()
+
+
+def _deleting() -> dict:
+    """(kind, pk) of parent rows whose cascade is in progress -> (db alias, the delete's atomic block)."""
+    if not hasattr(_local, "deleting"):
+        _local.deleting = {}
+    return _local.deleting
+
+
+def mark_deleting(kind: str, pk, using: str) -> None:
+    """
+    Child handlers skip ``(kind, pk)`` and the parent recomputes. The mark lives only as long as
+    the atomic block the delete runs in, so a delete that raises or rolls back can't leave it set.
+    """
+    blocks = connections[using].atomic_blocks
+    if blocks:  # Collector.delete always runs in one
+        _deleting()[(kind, pk)] = (using, blocks[-1])
+
+
+def unmark_deleting(kind: str, pk) -> None:
+    _deleting().pop((kind, pk), None)
+
+
+def is_deleting(kind: str, pk) -> bool:
+    mark = _deleting().get((kind, pk))
+    if mark is None:
+        return False
+    using, block = mark
+    if any(b is block for b in connections[using].atomic_blocks):
+        return True
+    unmark_deleting(kind, pk)  # the delete ended without post_delete: it failed
+    return False
+
+
+def recompute(user_id) -> Optional[CoachCounters]:
+    """Rebuild one coach's counters from the raw tables (the queries ProgressView used to run)."""
+    from clients.models import Client, ClientBlock
+    from consults.models import Assessment, Consult
+
+    if user_id is None or is_deleting("user", user_id):
+        return None
+    clients_qs = Client.objects.filter(user_id=user_id, archived=False)
+    consults_qs = Consult.objects.filter(user_id=user_id)
+    blocks_qs = ClientBlock.objects.filter(client__user_id=user_id, client__archived=False)
+    assessments_qs = Assessment.objects.filter(consult__user_id=user_id)
+
+    def latest(qs, field):
+        return qs.order_by(f"-{field}").values_list(field, flat=True).first()
+
+    obj, _ = CoachCounters.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            "clients": clients_qs.count(),
+            "clients_updated_at": latest(clients_qs, "updated_at"),
+            "consults": consults_qs.count(),
+            "consults_updated_at": latest(consults_qs, "updated_at"),
+            "blocks": blocks_qs.count(),
+            "blocks_updated_at": latest(blocks_qs, "updated_at"),
+            "assessments": assessments_qs.count(),
+            "assessments_updated_at": latest(assessments_qs, "created_at"),
+            "reconciled_at": timezone.now(),
+        },
+    )
+    return obj
+
+
+def apply(user_id, at=None, **deltas) -> None:
+    """
+    Add ``deltas`` (e.g. clients=1, blocks=-3) to a coach's counters in one UPDATE and stamp
+    the touched kinds with ``at``. A coach without a counters row is recomputed instead.
+    """
+    if user_id is None or is_deleting("user", user_id):
+        return
+    at = at or timezone.now()
+    changes = {}
+    for kind, delta in deltas.items():
+        if kind not in KINDS:
+            raise ValueError(f"Unknown counter {kind}")
+        if delta:
+            changes[kind] = F(kind) + delta
+        changes[f"{kind}_updated_at"] = at
+    if changes and not CoachCounters.objects.filter(user_id=user_id).update(**changes):
+        recompute(user_id)
+
+
+def record_blocks_created(client, blocks) -> None:
+    """Counter and rollup hook for ClientBlock.objects.bulk_create, which sends no post_save."""
+    from .rollups import record_many
+
+    if blocks and not client.archived:
+        apply(client.user_id, at=max(b.updated_at for b in blocks), blocks=len(blocks))
+    record_many(client.user_id, "blocks", (b.created_at for b in blocks))
+
+
+def record_clients_created(user_id, clients) -> None:
+    """Counter and rollup hook for Client.objects.bulk_create."""
+    from .rollups import record_many
+
+    active = [c for c in clients if not c.archived]
+    if active:
+        apply(user_id, at=max(c.updated_at for c in active), clients=len(active))
+    record_many(user_id, "clients", (c.created_at for c in clients))
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from progress.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild daily progress rollups (clients, consults, blocks, assessments created per day) "
+        "from the raw tables. Existing rollups for the selected coaches are replaced; rows that were "
+        "deleted since they were created are not recoverable and drop out of the history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="Only this coach (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rollup rows per insert batch")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = backfill(options.get("user_ids"), batch_size=int(options["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} daily rollup row(s)."))
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from progress.counters import KINDS, recompute
+from progress.models import CoachCounters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute per-coach progress counters from the clients, consults, blocks and assessments tables. "
+        "Reports coaches whose stored counts had drifted. Run after queryset .update()/.delete() calls "
+        "or raw SQL that bypass the signal handlers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="Only this coach (repeatable)")
+
+    def handle(self, *args, **options):
+        user_ids = options.get("user_ids") or list(get_user_model().objects.values_list("pk", flat=True))
+        before = {
+            row["user_id"]: row
+            for row in CoachCounters.objects.filter(user_id__in=user_ids).values("user_id", *KINDS)
+        }
+        drifted = 0
+        for uid in user_ids:
+            fresh = recompute(uid)
+            old = before.get(uid)
+            diffs = {k: (old[k] if old else None, getattr(fresh, k)) for k in KINDS if not old or old[k] != getattr(fresh, k)}
+            if old and diffs:
+                drifted += 1
+                detail = ", ".join(f"{k} {a} -> {b}" for k, (a, b) in diffs.items())
+                self.stdout.write(self.style.WARNING(f"user {uid}: {detail}"))
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(user_ids)} coach(es); {drifted} had drifted."))
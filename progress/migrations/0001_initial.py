@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 06:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoachCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='progress_counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('clients', models.IntegerField(default=0)),
+                ('clients_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('consults', models.IntegerField(default=0)),
+                ('consults_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('blocks', models.IntegerField(default=0)),
+                ('blocks_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('assessments', models.IntegerField(default=0)),
+                ('assessments_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import models
+
+
+class CoachCounters(models.Model):
+    """
+    Materialized ProgressView totals for one coach, kept current by progress.signals.
+    Counts mirror ProgressView's filters (active clients, blocks of active clients).
+    The *_updated_at columns record the latest write seen for that kind.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="progress_counters")
+    clients = models.IntegerField(default=0)
+    clients_updated_at = models.DateTimeField(null=True, blank=True)
+    consults = models.IntegerField(default=0)
+    consults_updated_at = models.DateTimeField(null=True, blank=True)
+    blocks = models.IntegerField(default=0)
+    blocks_updated_at = models.DateTimeField(null=True, blank=True)
+    assessments = models.IntegerField(default=0)
+    assessments_updated_at = models.DateTimeField(null=True, blank=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Counters for user {self.user_id}"
+
+
+class DailyRollup(models.Model):
+    """
+    Rows created per coach per day (in TIME_ZONE), for progress charts. Append-only history:
+    later deletes and archives do not rewrite past days. Maintained by progress.signals and
+    rebuilt from the surviving rows by ``manage.py backfill_progress_rollups``.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="progress_rollups")
+    day = models.DateField()
+    clients = models.IntegerField(default=0)
+    consults = models.IntegerField(default=0)
+    blocks = models.IntegerField(default=0)
+    assessments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind /api/progress/series/: WHERE user_id = ? AND day BETWEEN ? AND ?
+            models.UniqueConstraint(fields=["user", "day"], name="dailyrollup_user_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.user_id} {self.day}"
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import datetime as dt
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .counters import KINDS, is_deleting
+from .models import DailyRollup
+
+BUCKETS = ("day", "week", "month")
+
+
+def record(user_id, at: Optional[dt.datetime] = None, **deltas) -> None:
+    """Add ``deltas`` (e.g. blocks=3) to the coach's bucket for the day of ``at``."""
+    deltas = {k: v for k, v in deltas.items() if v}
+    if user_id is None or not deltas or is_deleting("user", user_id):
+        return
+    for kind in deltas:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown counter {kind}")
+    day = timezone.localdate(at or timezone.now())
+    changes = {k: F(k) + v for k, v in deltas.items()}
+    if DailyRollup.objects.filter(user_id=user_id, day=day).update(**changes):
+        return
+    _, created = DailyRollup.objects.get_or_create(user_id=user_id, day=day, defaults=deltas)
+    if not created:
+        # Lost a race with a concurrent first write for this day
+        DailyRollup.objects.filter(user_id=user_id, day=day).update(**changes)
+
+
+def record_many(user_id, kind: str, timestamps: Iterable[dt.datetime]) -> None:
+    """One ``record`` per distinct day, for bulk_create paths."""
+    per_day: Dict[dt.date, int] = defaultdict(int)
+    last: Dict[dt.date, dt.datetime] = {}
+    for ts in timestamps:
+        day = timezone.localdate(ts)
+        per_day[day] += 1
+        last[day] = ts
+    for day, n in per_day.items():
+        record(user_id, at=last[day], **{kind: n})
+
+
+def _sources():
+    from clients.models import Client, ClientBlock
+    from consults.models import Assessment, Consult
+
+    # kind: (queryset, owner lookup)
+    return {
+        "clients": (Client.objects.all(), "user_id"),
+        "consults": (Consult.objects.all(), "user_id"),
+        "blocks": (ClientBlock.objects.all(), "client__user_id"),
+        "assessments": (Assessment.objects.all(), "consult__user_id"),
+    }
+
+
+def backfill(user_ids: Optional[List[int]] = None, batch_size: int = 1000) -> int:
+    """Replace rollups with per-day counts grouped from the raw tables. Returns rows written."""
+    buckets: Dict[tuple, Dict[str, int]] = defaultdict(dict)
+    for kind, (qs, owner) in _sources().items():
+        qs = qs.filter(**{f"{owner}__isnull": False})
+        if user_ids is not None:
+            qs = qs.filter(**{f"{owner}__in": user_ids})
+        rows = (
+            qs.annotate(day=TruncDate("created_at"))
+            .values(owner, "day")
+            .annotate(n=Count("pk"))
+            .order_by()
+        )
+        for row in rows:
+            buckets[(row[owner], row["day"])][kind] = row["n"]
+
+    existing = DailyRollup.objects.all()
+    if user_ids is not None:
+        existing = existing.filter(user_id__in=user_ids)
+    existing.delete()
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(user_id=uid, day=day, **counts) for (uid, day), counts in buckets.items()],
+        batch_size=batch_size,
+    )
+    return len(buckets)
+
+
+def bucket_start(day: dt.date, bucket: str) -> dt.date:
+    if bucket == "week":
+        return day - dt.timedelta(days=day.weekday())  # ISO weeks start on Monday
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_start(start: dt.date, bucket: str) -> dt.date:
+    if bucket == "week":
+        return start + dt.timedelta(days=7)
+    if bucket == "month":
+        return (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+    return start + dt.timedelta(days=1)
+
+
+def series(user_id, bucket: str, start: dt.date, end: dt.date) -> List[Dict[str, object]]:
+    """
+    Sum daily rollups into ``bucket`` periods covering [start, end], oldest first. Empty periods
+    are included with zero counts so charts need no gap filling.
+    """
+    first = bucket_start(start, bucket)
+    totals: Dict[dt.date, Dict[str, int]] = {}
+    cursor = first
+    while cursor <= end:
+        totals[cursor] = dict.fromkeys(KINDS, 0)
+        cursor = _next_start(cursor, bucket)
+    rows = DailyRollup.objects.filter(user_id=user_id, day__gte=first, day__lte=end).values_list("day", *KINDS)
+    for day, *counts in rows:
+        period = totals[bucket_start(day, bucket)]
+        for kind, n in zip(KINDS, counts):
+            period[kind] += n
+    return [{"start": start_day, **counts} for start_day, counts in totals.items()]
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from clients.models import Client, ClientBlock
+from consults.models import Assessment, Consult
+
+from .counters import apply, is_deleting, mark_deleting, recompute, unmark_deleting
+from .rollups import record
+
+
+# Deleting a coach cascades to everything below; skip them so no counters row is recreated mid-delete.
+# Marks end with the delete's transaction (see mark_deleting) even when post_delete never comes.
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def mark_user_deleting(sender, instance, using, **kwargs):
+    mark_deleting("user", instance.pk, using)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unmark_user_deleting(sender, instance, **kwargs):
+    unmark_deleting("user", instance.pk)
+
+
+# Clients: archive/owner changes move the client's blocks too, so those rare transitions recompute.
+# Saves that change neither leave the counters row alone.
+
+def _client_state(instance: Client):
+    return instance.__dict__.get("user_id"), instance.__dict__.get("archived")
+
+
+@receiver(post_init, sender=Client)
+def snapshot_client_state(sender, instance: Client, **kwargs):
+    # Loaded rows carry their (owner, archived) from the SELECT; deferred fields fall back to pre_save
+    if not {"user_id", "archived"} & instance.get_deferred_fields():
+        instance._counter_prev = _client_state(instance)
+
+
+@receiver(pre_save, sender=Client)
+def remember_client_state(sender, instance: Client, raw: bool = False, **kwargs):
+    if raw or instance._state.adding or getattr(instance, "_counter_prev", None) is not None:
+        return
+    instance._counter_prev = Client.objects.filter(pk=instance.pk).values_list("user_id", "archived").first()
+
+
+@receiver(post_save, sender=Client)
+def count_client_save(sender, instance: Client, created: bool, raw: bool = False, **kwargs):
+    if raw:
+        return
+    prev = None if created else getattr(instance, "_counter_prev", None)
+    current = (instance.user_id, instance.archived)
+    instance._counter_prev = current  # baseline for the instance's next save
+    if created:
+        record(instance.user_id, at=instance.created_at, clients=1)
+    if created or prev is None:
+        if not instance.archived:
+            apply(instance.user_id, at=instance.updated_at, clients=1)
+    elif prev == current:
+        return
+    else:
+        recompute(prev[0])
+        if instance.user_id != prev[0]:
+            recompute(instance.user_id)
+
+
+@receiver(pre_delete, sender=Client)
+def mark_client_deleting(sender, instance: Client, using, **kwargs):
+    mark_deleting("client", instance.pk, using)
+
+
+@receiver(post_delete, sender=Client)
+def count_client_delete(sender, instance: Client, **kwargs):
+    unmark_deleting("client", instance.pk)
+    recompute(instance.user_id)
+
+
+# Blocks
+
+def _block_owner(block: ClientBlock):
+    """(user_id, active) for the block's client."""
+    if ClientBlock.client.is_cached(block):
+        return block.client.user_id, not block.client.archived
+    row = Client.objects.filter(pk=block.client_id).values_list("user_id", "archived").first()
+    return (row[0], not row[1]) if row else (None, False)
+
+
+@receiver(post_save, sender=ClientBlock)
+def count_block_save(sender, instance: ClientBlock, created: bool, raw: bool = False, **kwargs):
+    if raw or not created:
+        return  # edits don't move the count
+    user_id, active = _block_owner(instance)
+    record(user_id, at=instance.created_at, blocks=1)
+    if active:
+        apply(user_id, at=instance.updated_at, blocks=1)
+
+
+@receiver(post_delete, sender=ClientBlock)
+def count_block_delete(sender, instance: ClientBlock, **kwargs):
+    if is_deleting("client", instance.client_id):
+        return
+    user_id, active = _block_owner(instance)
+    if active:
+        apply(user_id, blocks=-1)
+
+
+# Consults and assessments
+
+@receiver(post_save, sender=Consult)
+def count_consult_save(sender, instance: Consult, created: bool, raw: bool = False, **kwargs):
+    if raw:
+        return
+    if created:
+        record(instance.user_id, at=instance.created_at, consults=1)
+    apply(instance.user_id, at=instance.updated_at, consults=1 if created else 0)
+
+
+@receiver(pre_delete, sender=Consult)
+def mark_consult_deleting(sender, instance: Consult, using, **kwargs):
+    mark_deleting("consult", instance.pk, using)
+
+
+@receiver(post_delete, sender=Consult)
+def count_consult_delete(sender, instance: Consult, **kwargs):
+    unmark_deleting("consult", instance.pk)
+    recompute(instance.user_id)
+
+
+@receiver(post_save, sender=Assessment)
+def count_assessment_save(sender, instance: Assessment, created: bool, raw: bool = False, **kwargs):
+    # Only creation moves the count or the latest created_at
+    if raw or not created:
+        return
+    user_id = Consult.objects.filter(pk=instance.consult_id).values_list("user_id", flat=True).first()
+    record(user_id, at=instance.created_at, assessments=1)
+    apply(user_id, at=instance.created_at, assessments=1)
+
+
+@receiver(post_delete, sender=Assessment)
+def count_assessment_delete(sender, instance: Assessment, **kwargs):
+    if is_deleting("consult", instance.consult_id):
+        return
+    user_id = Consult.objects.filter(pk=instance.consult_id).values_list("user_id", flat=True).first()
+    apply(user_id, assessments=-1)
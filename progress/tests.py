@@ -0,0 +1,156 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from clients.models import Client, ClientBlock
+from consults.models import Assessment, Consult
+
+from .models import CoachCounters, DailyRollup
+
+
+class CoachCountersTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="cora", password="pass1234")
+        self.other = User.objects.create_user(username="dex", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.c1 = Client.objects.create(user=self.user, first_name="A", last_name="One", age_group="25-34")
+        self.c2 = Client.objects.create(user=self.user, first_name="B", last_name="Two", age_group="25-34")
+        self.c1.blocks.create(name="B1", block={"Day 1": [{"name": "Squat", "sets": 3}]})
+        self.c2.blocks.create(name="B2", block={"Day 1": [{"name": "Row", "sets": 3}]})
+        consult = Consult.objects.create(user=self.user, client=self.c1)
+        Assessment.objects.create(consult=consult, summary="ok")
+
+    def _counts(self, user=None):
+        row = CoachCounters.objects.get(user=user or self.user)
+        return (row.clients, row.consults, row.blocks, row.assessments)
+
+    def test_progress_is_single_row_read(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("progress"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(res.data["clients"]["count"], 2)
+        self.assertEqual(res.data["blocks"]["count"], 2)
+        self.assertEqual(res.data["consults"]["count"], 1)
+        self.assertEqual(res.data["assessments"]["count"], 1)
+        self.assertIsNotNone(res.data["blocks"]["last_updated"])
+
+    def test_archive_reassign_and_delete_stay_exact(self):
+        self.c2.archived = True
+        self.c2.save()
+        self.assertEqual(self._counts(), (1, 1, 1, 1))
+        self.c1.user = self.other
+        self.c1.save()
+        self.assertEqual(self._counts(), (0, 1, 0, 1))
+        self.assertEqual(self._counts(self.other), (1, 0, 1, 0))
+        self.c1.delete()
+        self.assertEqual(self._counts(self.other), (0, 0, 0, 0))
+        Consult.objects.get(user=self.user).delete()
+        self.assertEqual(self._counts(), (0, 0, 0, 0))
+
+    def test_bulk_progress_and_import_hooks(self):
+        block = self.c1.blocks.get()
+        res = self.client.post(reverse("clients-block-progress", args=[self.c1.pk, block.pk]) + "?steps=3", {}, format="json")
+        self.assertEqual(res.status_code, 201)
+        res = self.client.post(reverse("clients-bulk-import"), [
+            {"first_name": "I", "last_name": "One", "age_group": "25-34"},
+        ], format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self._counts(), (3, 1, 5, 1))
+
+    def test_reconcile_repairs_drift(self):
+        CoachCounters.objects.filter(user=self.user).update(clients=99, blocks=0)
+        call_command("reconcile_progress_counters", "--user-id", str(self.user.pk), stdout=io.StringIO())
+        self.assertEqual(self._counts(), (2, 1, 2, 1))
+
+    def test_progress_while_coach_is_being_deleted(self):
+        from unittest import mock
+
+        CoachCounters.objects.filter(user=self.user).delete()
+        with mock.patch("coachapp.views_progress.recompute", return_value=None):
+            res = self.client.get(reverse("progress"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["clients"], {"count": 0, "last_updated": None})
+
+    def test_edits_that_move_no_count_leave_counters_alone(self):
+        client = Client.objects.get(pk=self.c1.pk)
+        block = client.blocks.get()
+        with CaptureQueriesContext(connection) as ctx:
+            client.first_name = "Renamed"
+            client.save()
+            block.name = "Renamed"
+            block.save()
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse([q for q in sql if "progress_coachcounters" in q or "progress_dailyrollup" in q])
+        self.assertFalse([q for q in sql if q.startswith('SELECT "clients_client"."user_id"')])  # no pre_save read
+        client.archived = True
+        client.save()
+        self.assertEqual(self._counts(), (1, 1, 1, 1))
+
+    def test_deleting_coach_does_not_recreate_row(self):
+        self.user.delete()
+        self.assertFalse(CoachCounters.objects.filter(user_id=self.user.pk).exists())
+
+    def test_failed_delete_does_not_leave_counters_frozen(self):
+        from django.db import transaction
+        from django.db.models.signals import post_delete
+
+        def fail(sender, **kwargs):
+            raise RuntimeError("delete failed mid-cascade")
+
+        post_delete.connect(fail, sender=ClientBlock)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.user.delete()
+        finally:
+            post_delete.disconnect(fail, sender=ClientBlock)
+        Client.objects.create(user=self.user, first_name="C", last_name="Three", age_group="25-34")
+        self.c1.blocks.create(name="B3", block={})
+        self.assertEqual(self._counts(), (3, 1, 3, 1))
+        self.assertEqual(DailyRollup.objects.get(user=self.user).clients, 3)
+
+
+class ProgressSeriesTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="remy", password="pass1234")
+        self.client.force_authenticate(self.user)
+        self.obj = Client.objects.create(user=self.user, first_name="S", last_name="Eries", age_group="25-34")
+        self.obj.blocks.create(name="B1", block={"Day 1": []})
+        self.obj.blocks.create(name="B2", block={"Day 1": []})
+
+    def test_rollups_are_maintained_on_write(self):
+        row = DailyRollup.objects.get(user=self.user)
+        self.assertEqual(row.day, timezone.localdate())
+        self.assertEqual((row.clients, row.blocks, row.consults), (1, 2, 0))
+
+    def test_weekly_series_from_backfill(self):
+        old = timezone.now() - timedelta(days=21)
+        ClientBlock.objects.filter(name="B1").update(created_at=old)
+        call_command("backfill_progress_rollups", stdout=io.StringIO())
+        self.assertEqual(DailyRollup.objects.filter(user=self.user).count(), 2)
+
+        start = (timezone.localdate() - timedelta(days=28)).isoformat()
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(reverse("progress-series"), {"bucket": "week", "from": start})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        series = res.data["series"]
+        self.assertEqual(len(series), 5)
+        self.assertTrue(all(p["start"].weekday() == 0 for p in series))
+        self.assertEqual(sum(p["blocks"] for p in series), 2)
+        self.assertEqual(series[-1]["clients"], 1)
+        self.assertEqual(series[-1]["blocks"], 1)
+
+    def test_rejects_bad_params(self):
+        url = reverse("progress-series")
+        self.assertEqual(self.client.get(url, {"bucket": "hour"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"from": "2024-13-01"}).status_code, 400)